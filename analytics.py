@@ -0,0 +1,242 @@
+import argparse
+import fnmatch
+import json
+import numpy as np
+from graph_snapshot import build_snapshot, load_snapshot
+
+##whole graph questions over a GraphSnapshot: dead code, fan-in/out, centrality, file coupling
+##everything is numpy over the CALLS CSR arrays -> no per edge python loop
+
+#functions called from outside the graph: scripts, tests, dunder methods python calls itself
+DEFAULT_ENTRY_POINTS = ['main', 'test_*', '__*__']
+
+
+def matching_strings(snapshot, patterns):
+    ##-> bool per string id, glob matched once per distinct string instead of once per node
+    matches = np.zeros(snapshot.meta['strings'] + 1, dtype=bool)
+    if patterns:
+        for string_id in range(snapshot.meta['strings']):
+            text = snapshot.string(string_id)
+            if any(fnmatch.fnmatchcase(text, pattern) for pattern in patterns):
+                matches[string_id] = True
+    #last slot = no string (id -1)
+    return matches
+
+def function_mask(snapshot):
+    return np.asarray(snapshot.arrays['node_label']) == snapshot.meta['labels'].index('Function')
+
+def expand(offsets, targets, frontier):
+    ##all neighbours of the frontier nodes in one gather
+    starts = offsets[frontier]
+    counts = offsets[frontier + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=targets.dtype)
+    #index of every edge: start of its node + position inside the node's run
+    run_starts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return targets[run_starts + np.arange(total)]
+
+def reachable_mask(snapshot, start_ids, rel_type='CALLS'):
+    ##BFS level by level on the CSR arrays -> bool per node
+    offsets, targets = snapshot.csr(rel_type)
+    offsets, targets = np.asarray(offsets), np.asarray(targets)
+    seen = np.zeros(snapshot.node_count, dtype=bool)
+    frontier = np.unique(np.asarray(start_ids, dtype=np.int64))
+    seen[frontier] = True
+    while frontier.size:
+        found = expand(offsets, targets, frontier)
+        found = np.unique(found[~seen[found]])
+        seen[found] = True
+        frontier = found.astype(np.int64)
+    return seen
+
+def entry_point_ids(snapshot, entry_points=DEFAULT_ENTRY_POINTS, entry_files=()):
+    ##functions whose name matches entry_points, or that live in a file matching entry_files
+    names = np.asarray(snapshot.arrays['node_name'])
+    files = np.asarray(snapshot.arrays['node_file'])
+    mask = matching_strings(snapshot, entry_points)[names]
+    if entry_files:
+        mask |= matching_strings(snapshot, entry_files)[files]
+    return np.flatnonzero(mask & function_mask(snapshot))
+
+def reachability(snapshot, entry_points=DEFAULT_ENTRY_POINTS, entry_files=()):
+    ##-> (reached, possibly reached) bool per node
+    ##reached: entry points + everything they reach through CALLS
+    ##possibly reached: + functions named like an unresolved call made by a (possibly) reached function
+    ##(obj.x(), ambiguous names: calls the resolver could not pin down) + what those reach
+    reached = reachable_mask(snapshot, entry_point_ids(snapshot, entry_points, entry_files))
+    possible = reached.copy()
+    if 'CALLS_UNRESOLVED' not in snapshot.meta.get('relations', []):
+        #snapshot saved before unresolved calls were kept -> nothing to match names on
+        return reached, possible
+    offsets, targets = snapshot.csr('CALLS_UNRESOLVED')
+    offsets, targets = np.asarray(offsets), np.asarray(targets)
+    names = np.asarray(snapshot.arrays['node_name'])
+    functions = function_mask(snapshot)
+    frontier = np.flatnonzero(reached)
+    while frontier.size:
+        #names of the unresolved calls made from the frontier -> every function with one of those names
+        called = np.zeros(snapshot.meta['strings'] + 1, dtype=bool)
+        called[names[expand(offsets, targets, frontier)]] = True
+        called[-1] = False
+        matched = np.flatnonzero(functions & called[names] & ~possible)
+        if matched.size == 0:
+            break
+        found = reachable_mask(snapshot, matched) & ~possible
+        possible |= found
+        frontier = np.flatnonzero(found)
+    return reached, possible
+
+def unreachable_functions(snapshot, entry_points=DEFAULT_ENTRY_POINTS, entry_files=()):
+    ##dead code -> (unreachable, reached by name only) as [(name, file, line)]
+    ##unreachable: no path from an entry point, not even through an unresolved call of the same name
+    ##reached by name only: lower confidence, alive if those unresolved calls really land on them
+    #methods are reached through their calls, a class being used is not enough
+    reached, possible = reachability(snapshot, entry_points, entry_files)
+    functions = function_mask(snapshot)
+    dead = np.flatnonzero(functions & ~possible)
+    by_name = np.flatnonzero(functions & possible & ~reached)
+    return (
+        sorted(snapshot.node(node_id)[1:] for node_id in dead),
+        sorted(snapshot.node(node_id)[1:] for node_id in by_name)
+    )
+
+def fan_in_out(snapshot):
+    ##-> (fan_in, fan_out) per node: distinct functions calling it / it calls
+    return snapshot.degrees('CALLS', incoming=True), snapshot.degrees('CALLS')
+
+def pagerank(snapshot, damping=0.85, tolerance=1e-6, max_iterations=100):
+    ##power iteration over CALLS restricted to functions -> score per node (0 for non functions)
+    #a function scores high when called by functions that score high -> central utilities
+    functions = function_mask(snapshot)
+    count = int(functions.sum())
+    scores = np.zeros(snapshot.node_count)
+    if count == 0:
+        return scores
+    offsets, targets = snapshot.csr('CALLS')
+    offsets, targets = np.asarray(offsets), np.asarray(targets)
+    out_degree = np.diff(offsets)
+    #source node of every edge, same order as targets
+    sources = np.repeat(np.arange(snapshot.node_count), out_degree)
+    dangling = functions & (out_degree == 0)
+    inverse_degree = np.divide(1.0, out_degree, out=np.zeros(snapshot.node_count), where=out_degree > 0)
+
+    scores[functions] = 1.0 / count
+    for _ in range(max_iterations):
+        #functions calling nothing spread their score evenly, like a random jump
+        spread = (1.0 - damping + damping * scores[dangling].sum()) / count
+        new_scores = damping * np.bincount(
+            targets, weights=(scores * inverse_degree)[sources], minlength=snapshot.node_count
+        )
+        new_scores[functions] += spread
+        new_scores[~functions] = 0.0
+        converged = np.abs(new_scores - scores).sum() < tolerance
+        scores = new_scores
+        if converged:
+            break
+    return scores
+
+def top_functions(snapshot, values, top=20):
+    ##highest values among functions -> [(name, file, line, value)]
+    candidates = np.flatnonzero(function_mask(snapshot))
+    if candidates.size == 0:
+        return []
+    order = candidates[np.argsort(-values[candidates], kind='stable')[:top]]
+    return [snapshot.node(node_id)[1:] + (values[node_id].item(),) for node_id in order]
+
+def file_coupling(snapshot, top=20):
+    ##calls that cross files, counted per (caller file, callee file) and per file
+    #-> (pairs [(caller file, callee file, calls)], files [(file, outgoing, incoming, instability)])
+    offsets, targets = snapshot.csr('CALLS')
+    offsets, targets = np.asarray(offsets), np.asarray(targets)
+    sources = np.repeat(np.arange(snapshot.node_count), np.diff(offsets))
+    node_file = np.asarray(snapshot.arrays['node_file']).astype(np.int64)
+    caller_files, callee_files = node_file[sources], node_file[targets]
+    crossing = caller_files != callee_files
+    caller_files, callee_files = caller_files[crossing], callee_files[crossing]
+
+    file_count = snapshot.meta['strings']
+    pairs, counts = np.unique(caller_files * file_count + callee_files, return_counts=True)
+    order = np.argsort(-counts, kind='stable')[:top]
+    top_pairs = [
+        (snapshot.string(int(pairs[i] // file_count)), snapshot.string(int(pairs[i] % file_count)), int(counts[i]))
+        for i in order
+    ]
+
+    #efferent (calls out of the file) / afferent (calls into it), instability = out / (in + out)
+    outgoing = np.bincount(caller_files, minlength=file_count)
+    incoming = np.bincount(callee_files, minlength=file_count)
+    total = outgoing + incoming
+    coupled = np.flatnonzero(total)
+    order = coupled[np.argsort(-total[coupled], kind='stable')[:top]]
+    files = [
+        (snapshot.string(int(f)), int(outgoing[f]), int(incoming[f]), round(float(outgoing[f] / total[f]), 3))
+        for f in order
+    ]
+    return top_pairs, files
+
+def report(snapshot, entry_points=DEFAULT_ENTRY_POINTS, entry_files=(), top=20):
+    ##every analysis -> json friendly dict
+    fan_in, fan_out = fan_in_out(snapshot)
+    pairs, files = file_coupling(snapshot, top)
+    unreachable, reached_by_name = unreachable_functions(snapshot, entry_points, entry_files)
+    return {
+        'graph_version': snapshot.meta.get('graph_version'),
+        'unreachable': unreachable,
+        'reached_by_name_only': reached_by_name,
+        'fan_in': top_functions(snapshot, fan_in, top),
+        'fan_out': top_functions(snapshot, fan_out, top),
+        'pagerank': [row[:3] + (round(row[3], 6),) for row in top_functions(snapshot, pagerank(snapshot), top)],
+        'coupled_file_pairs': pairs,
+        'coupled_files': files
+    }
+
+def print_report(result):
+    print(f"\nUnreachable functions: {len(result['unreachable'])}")
+    for name, file, line in result['unreachable']:
+        print(f"   - {name} (in {file}, line {line})")
+    print(f"\nPossibly unreachable, only called through unresolved calls of the same name: {len(result['reached_by_name_only'])}")
+    for name, file, line in result['reached_by_name_only']:
+        print(f"   ? {name} (in {file}, line {line})")
+    for key, title in [('fan_in', 'Highest fan-in'), ('fan_out', 'Highest fan-out'), ('pagerank', 'Most central')]:
+        print(f"\n{title}:")
+        for name, file, line, value in result[key]:
+            print(f"   {value}  {name} (in {file}, line {line})")
+    print("\nMost coupled file pairs:")
+    for caller_file, callee_file, calls in result['coupled_file_pairs']:
+        print(f"   {calls}  {caller_file} -> {callee_file}")
+    print("\nMost coupled files (calls out, calls in, instability):")
+    for file, outgoing, incoming, instability in result['coupled_files']:
+        print(f"   {outgoing} {incoming} {instability}  {file}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Dead code + hotspot analytics on the call graph")
+    arg_parser.add_argument("--snapshot", metavar="DIR", help="snapshot saved by graph_snapshot.py (memory mapped)")
+    arg_parser.add_argument("--sqlite", metavar="PATH", help="graph saved by main.py --sqlite, default is neo4j")
+    arg_parser.add_argument("--entry", action="append", help="glob of entry point function names (repeatable)")
+    arg_parser.add_argument("--entry-file", action="append", default=[], help="glob of files whose functions are entry points")
+    arg_parser.add_argument("--top", type=int, default=20)
+    arg_parser.add_argument("--json", metavar="PATH", help="also write the report as json")
+    args = arg_parser.parse_args()
+
+    if args.snapshot:
+        snapshot = load_snapshot(args.snapshot)
+    else:
+        if args.sqlite:
+            from memory_store import MemoryStore
+            store = MemoryStore(args.sqlite)
+        else:
+            from neo4j_client import Neo4jClient
+            store = Neo4jClient()
+        snapshot = build_snapshot(store)
+        store.close()
+
+    result = report(snapshot, args.entry or DEFAULT_ENTRY_POINTS, args.entry_file, args.top)
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
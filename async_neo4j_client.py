@@ -0,0 +1,193 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from neo4j import AsyncGraphDatabase
+from call_resolver import CallResolver, PendingCalls
+from metrics import metrics
+from graph_store import (
+    ENTITY_KEYS, GRAPH_VERSION, IMPORT_NODES, FILE_IMPORTS, CALLS, UNRESOLVED_CALL_NODES, UNRESOLVED_CALLS, op_name,
+    file_writes, import_node_rows, file_import_rows, call_rows, unresolved_call_node_rows, unresolved_call_rows
+)
+
+##async ingestion -> several batched write transactions at once from one process
+##same queries / graph shape as Neo4jClient
+class AsyncNeo4jClient:
+    def __init__(self, batch_size=1000, concurrency=4, queue_size=256):
+        ##init connection
+        NEO4J_URI = "bolt://localhost:7687"
+        NEO4J_USER = "neo4j"
+        NEO4J_PASSWORD = "sample123"
+        self.driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+        #rows sent per UNWIND query / write transaction
+        self.batch_size = batch_size
+        #sessions writing at the same time
+        self.concurrency = concurrency
+        #parsed files allowed to wait for a writer -> parser blocks when full
+        self.queue_size = queue_size
+        print(f"**Connected to Neo4j (async)**")
+
+    async def close(self):
+        await self.driver.close()
+
+    async def write_batches(self, query, rows, sessions, **params):
+        ##rows of one query split in batches, written in parallel (at most concurrency sessions)
+        async def write(batch):
+            async with sessions:
+                async with self.driver.session() as session:
+                    await timed_write(session, query, batch, params)
+
+        await asyncio.gather(*(
+            write(rows[start:start + self.batch_size]) for start in range(0, len(rows), self.batch_size)
+        ))
+
+    async def write_file_batch(self, batch, sessions):
+        ##nodes of a group of whole files, queries in dependency order in one session
+        try:
+            async with self.driver.session() as session:
+                for query, rows in file_writes(batch):
+                    for start in range(0, len(rows), self.batch_size):
+                        await timed_write(session, query, rows[start:start + self.batch_size], {})
+        finally:
+            sessions.release()
+
+    async def write_stream(self, file_results, resolver=None):
+        ##sink for CodeParser.iter_parse_codebase, parser runs in a thread feeding a bounded queue
+        ##1. per file nodes: file batches written concurrently (different files never share a node)
+        ##2. shared nodes + edges once all files are in: imports, then calls
+        #-> totals of what was written, all_data keys
+        resolver = resolver or CallResolver({})
+        pending_calls = PendingCalls()
+        imports = []
+        sessions = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        results = asyncio.Queue(maxsize=self.queue_size)
+        #set when this side gives up -> producer thread stops instead of waiting on a full queue forever
+        stop = threading.Event()
+        producer = loop.run_in_executor(None, _produce, file_results, results, loop, stop)
+
+        totals = {key: 0 for key in ENTITY_KEYS}
+        batch = {key: [] for key in ENTITY_KEYS}
+        batch_rows = 0
+        in_flight = set()
+        #errors of finished file batches, a task leaves in_flight as soon as it is done
+        failures = []
+
+        def done(task):
+            in_flight.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                failures.append(task.exception())
+
+        async def flush(batch):
+            #wait for a free session before taking more from the queue -> back-pressure on the parser
+            await sessions.acquire()
+            #a failed batch stops the run, nothing more is written on top of a partial graph
+            if failures:
+                sessions.release()
+                raise failures[0]
+            resolver.add_symbols(batch, slim=True)
+            pending_calls.add(batch['calls'])
+            imports.extend(batch['imports'])
+            task = asyncio.create_task(self.write_file_batch(batch, sessions))
+            in_flight.add(task)
+            task.add_done_callback(done)
+
+        try:
+            while True:
+                result = await results.get()
+                if result is _DONE:
+                    break
+                for key in ENTITY_KEYS:
+                    values = result.get(key, [])
+                    batch[key].extend(values)
+                    totals[key] += len(values)
+                    batch_rows += len(values)
+                #whole files per batch -> class + its methods always flushed together
+                if batch_rows >= self.batch_size:
+                    await flush(batch)
+                    batch = {key: [] for key in ENTITY_KEYS}
+                    batch_rows = 0
+            await flush(batch)
+        except BaseException:
+            stop.set()
+            #let the batches already sent finish / fail, their errors are not the first one
+            await asyncio.gather(*in_flight, return_exceptions=True)
+            await asyncio.gather(producer, return_exceptions=True)
+            raise
+
+        #parser errors surface here, node writes must be done before any edge between files
+        await producer
+        await asyncio.gather(*in_flight)
+        if failures:
+            raise failures[0]
+
+        await self.write_batches(IMPORT_NODES, import_node_rows(imports), sessions)
+        await self.write_batches(FILE_IMPORTS, file_import_rows(imports), sessions)
+        for resolved, unresolved in pending_calls.resolve(resolver):
+            await self.write_batches(CALLS, call_rows(resolved), sessions)
+            await self.write_batches(UNRESOLVED_CALL_NODES, unresolved_call_node_rows(unresolved), sessions)
+            await self.write_batches(UNRESOLVED_CALLS, unresolved_call_rows(unresolved), sessions)
+        #graph changed -> GraphQuery caches drop what they hold
+        await self.write_batches(GRAPH_VERSION, [{}], sessions)
+        return totals
+
+    async def build_graph(self, parsed_data):
+        #create nodes + relationships from a full all_data dict
+        return await self.write_stream(split_by_file(parsed_data))
+
+
+#end of parser output
+_DONE = object()
+
+#seconds between stop checks while the queue is full
+PUT_WAIT = 0.5
+
+def _produce(file_results, results, loop, stop):
+    ##runs in a worker thread: push parser output into the asyncio queue, blocks while it is full
+    ##stop set -> consumer failed, nobody reads the queue any more -> leave without waiting
+    try:
+        for result in file_results:
+            if not _put(result, results, loop, stop):
+                return
+    finally:
+        if stop.is_set():
+            #parser generator cleans up (worker pool, prefetch thread) now, not at garbage collection
+            close = getattr(file_results, 'close', None)
+            if close is not None:
+                close()
+        else:
+            _put(_DONE, results, loop, stop)
+
+def _put(item, results, loop, stop):
+    #-> False when stopped before the item got into the queue
+    future = asyncio.run_coroutine_threadsafe(results.put(item), loop)
+    while True:
+        try:
+            future.result(timeout=PUT_WAIT)
+            return True
+        except concurrent.futures.TimeoutError:
+            if stop.is_set():
+                future.cancel()
+                return False
+
+def split_by_file(parsed_data):
+    ##all_data dict -> one all_data shaped dict per file, in file order
+    per_file = {file['path']: {key: [] for key in ENTITY_KEYS} for file in parsed_data['files']}
+    for key in ENTITY_KEYS:
+        for record in parsed_data[key]:
+            file_path = record['path'] if key == 'files' else record['file_path']
+            if file_path in per_file:
+                per_file[file_path][key].append(record)
+    return iter(per_file.values())
+
+async def timed_write(session, query, rows, params):
+    #one batch in its own write transaction, round trip recorded when metrics are on
+    began = time.perf_counter()
+    await session.execute_write(_run_batch, query, rows, params)
+    if metrics.enabled:
+        metrics.record_query(op_name(query), len(rows), time.perf_counter() - began)
+
+async def _run_batch(tx, query, rows, params):
+    ##one batch inside a managed write transaction (retried by driver on transient errors / deadlocks)
+    result = await tx.run(query, rows=rows, **params)
+    await result.consume()
@@ -0,0 +1,256 @@
+import argparse
+import contextlib
+import gc
+import hashlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import tempfile
+import time
+from code_parser import CodeParser
+from neo4j_client import Neo4jClient
+from memory_store import MemoryStore
+from synthetic_repo import generate_repo
+
+##parse + ingest throughput on a synthetic repo -> json report, compare with an earlier report
+
+#entities that become nodes
+NODE_KEYS = ['files', 'functions', 'classes', 'variables', 'imports']
+#rss allowed to grow between the second and the last parse run
+MAX_RSS_GROWTH_MB = 5.0
+
+
+class CountingDriver:
+    ##stand-in for the neo4j driver: runs nothing, counts transactions + rows
+    ##-> measures client side cost of build_graph (row building, call resolution, batching)
+    def __init__(self):
+        self.transactions = 0
+        self.rows = 0
+
+    def session(self, **kwargs):
+        return _CountingSession(self)
+
+    def close(self):
+        pass
+
+class _CountingSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_write(self, work, *args):
+        self.driver.transactions += 1
+        return work(self, *args)
+
+    def run(self, query, **params):
+        self.driver.rows += len(params.get('rows', ()))
+        return _EmptyResult()
+
+class _EmptyResult:
+    def consume(self):
+        pass
+
+    def data(self):
+        return []
+
+    def __iter__(self):
+        return iter(())
+
+
+def current_rss_mb():
+    #resident set size now (linux), peak rss elsewhere
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def bench_parse(repo_dir, workers, repeat):
+    ##best of repeat runs of parse_codebase
+    ##rss after every run -> parsing the same files again must not grow memory (leak check)
+    parser = CodeParser()
+    best, parsed_data = None, None
+    rss = []
+    for _ in range(repeat):
+        parsed_data = None
+        gc.collect()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            parsed_data = parser.parse_codebase(repo_dir, workers=workers)
+            seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+        rss.append(round(current_rss_mb(), 1))
+    files = len(parsed_data['files'])
+    nodes = sum(len(parsed_data[key]) for key in NODE_KEYS)
+    return parsed_data, {
+        'seconds': round(best, 4),
+        'files': files,
+        'nodes': nodes,
+        'calls': len(parsed_data['calls']),
+        'files_per_sec': round(files / best, 1),
+        'nodes_per_sec': round(nodes / best, 1),
+        'rss_mb': rss,
+        #first run fills process wide tables (queries, string table) -> growth counted from the second
+        'rss_growth_mb': round(rss[-1] - rss[min(1, len(rss) - 1)], 1)
+    }
+
+def bench_ingest(parsed_data, batch_size, repeat, use_neo4j, use_memory=False):
+    ##best of repeat runs of build_graph, stand-in driver unless use_neo4j / use_memory
+    best, driver = None, None
+    for _ in range(repeat):
+        driver = None if use_neo4j or use_memory else CountingDriver()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if use_memory:
+                client = MemoryStore(batch_size=batch_size)
+            else:
+                client = Neo4jClient(batch_size=batch_size, driver=driver)
+            if use_neo4j:
+                client.clear_database()
+                client.create_indexes()
+            start = time.perf_counter()
+            client.build_graph(parsed_data)
+            seconds = time.perf_counter() - start
+            client.close()
+        best = seconds if best is None else min(best, seconds)
+    entities = sum(len(parsed_data[key]) for key in NODE_KEYS) + len(parsed_data['calls'])
+    result = {
+        'backend': 'neo4j' if use_neo4j else 'memory' if use_memory else 'stand-in',
+        'seconds': round(best, 4),
+        'entities_per_sec': round(entities / best, 1)
+    }
+    if driver is not None:
+        result['transactions'] = driver.transactions
+        result['rows'] = driver.rows
+    return result
+
+def corpus_hash(repo_dir):
+    ##sha256 over relative path + content of every file -> same number only for the same corpus
+    digest = hashlib.sha256()
+    for dir_path, dir_names, file_names in os.walk(repo_dir):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            path = os.path.join(dir_path, file_name)
+            digest.update(os.path.relpath(path, repo_dir).encode('utf-8') + b'\0')
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+def mismatches(report, baseline):
+    ##-> (errors, warnings) when the two reports did not measure the same thing
+    ##errors: different corpus / backend / flags -> numbers not comparable
+    ##warnings: different machine / python, or a baseline written before a field existed
+    errors, warnings = [], []
+    old_config, new_config = baseline.get('config', {}), report.get('config', {})
+    for key in sorted(set(old_config) | set(new_config)):
+        if key not in old_config:
+            warnings.append(f"config.{key}: not in baseline, now {new_config[key]!r}")
+        elif old_config[key] != new_config.get(key):
+            errors.append(f"config.{key}: {old_config[key]!r} -> {new_config.get(key)!r}")
+    if 'corpus_hash' not in baseline:
+        warnings.append("corpus_hash: not in baseline")
+    elif baseline['corpus_hash'] != report.get('corpus_hash'):
+        errors.append("corpus_hash: generated repo differs from the baseline's")
+    old_env, new_env = baseline.get('environment', {}), report.get('environment', {})
+    for key in sorted(set(old_env) | set(new_env)):
+        if old_env.get(key) != new_env.get(key):
+            warnings.append(f"environment.{key}: {old_env.get(key)!r} -> {new_env.get(key)!r}")
+    return errors, warnings
+
+def compare(report, baseline, threshold, max_rss_growth=MAX_RSS_GROWTH_MB):
+    ##throughput drops bigger than threshold (fraction) vs baseline report -> list of messages
+    ##+ memory still growing over repeated parses of the same files
+    regressions = []
+    for stage, metric in [('parse', 'files_per_sec'), ('parse', 'nodes_per_sec'), ('ingest', 'entities_per_sec')]:
+        old = baseline.get(stage, {}).get(metric)
+        new = report.get(stage, {}).get(metric)
+        if old and new and new < old * (1 - threshold):
+            regressions.append(f"{stage}.{metric}: {old} -> {new} ({(new - old) / old:+.1%})")
+    growth = report.get('parse', {}).get('rss_growth_mb')
+    if growth is not None and growth > max_rss_growth:
+        regressions.append(f"parse.rss_growth_mb: {growth} MB over repeated runs (limit {max_rss_growth} MB), memory leak")
+    return regressions
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark parse + ingest on a synthetic repo")
+    arg_parser.add_argument("--files", type=int, default=200)
+    arg_parser.add_argument("--classes", type=int, default=3, help="classes per file")
+    arg_parser.add_argument("--methods", type=int, default=4, help="methods per class")
+    arg_parser.add_argument("--functions", type=int, default=4, help="top level functions per file")
+    arg_parser.add_argument("--calls", type=int, default=4, help="calls per function")
+    arg_parser.add_argument("--depth", type=int, default=2, help="nesting depth of blocks in function bodies")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--workers", type=int, default=1)
+    arg_parser.add_argument("--batch-size", type=int, default=1000)
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per stage, best is kept")
+    arg_parser.add_argument("--neo4j", action="store_true", help="ingest into the local neo4j (clears it!)")
+    arg_parser.add_argument("--memory", action="store_true", help="ingest into the in process MemoryStore")
+    arg_parser.add_argument("--output", default="bench.json")
+    arg_parser.add_argument("--compare", metavar="BASELINE_JSON", help="fail on throughput regressions vs this report")
+    arg_parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown for --compare")
+    arg_parser.add_argument("--allow-mismatch", action="store_true", help="--compare even when corpus, backend or flags differ from the baseline")
+    arg_parser.add_argument("--max-rss-growth", type=float, default=MAX_RSS_GROWTH_MB, metavar="MB", help="allowed rss growth over repeated parse runs for --compare")
+    args = arg_parser.parse_args()
+
+    config = {
+        'files': args.files, 'classes_per_file': args.classes, 'methods_per_class': args.methods,
+        'functions_per_file': args.functions, 'calls_per_function': args.calls, 'nesting_depth': args.depth,
+        'seed': args.seed, 'workers': args.workers, 'batch_size': args.batch_size, 'repeat': args.repeat,
+        'backend': 'neo4j' if args.neo4j else 'memory' if args.memory else 'stand-in'
+    }
+    repo_dir = tempfile.mkdtemp(prefix="kg_bench_")
+    try:
+        generated = generate_repo(
+            repo_dir, files=args.files, classes_per_file=args.classes, methods_per_class=args.methods,
+            functions_per_file=args.functions, calls_per_function=args.calls, nesting_depth=args.depth,
+            seed=args.seed
+        )
+        corpus = corpus_hash(repo_dir)
+        parsed_data, parse_result = bench_parse(repo_dir, args.workers, args.repeat)
+        ingest_result = bench_ingest(parsed_data, args.batch_size, args.repeat, args.neo4j, args.memory)
+    finally:
+        shutil.rmtree(repo_dir, ignore_errors=True)
+
+    report = {
+        'config': config,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()
+        },
+        'generated': generated,
+        'corpus_hash': corpus,
+        'parse': parse_result,
+        'ingest': ingest_result
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        errors, warnings = mismatches(report, baseline)
+        for message in warnings:
+            print(f"WARNING {message}")
+        for message in errors:
+            print(f"MISMATCH {message}")
+        if errors and not args.allow_mismatch:
+            print(f"Not comparing with {args.compare}: it measured a different corpus / backend / flags (--allow-mismatch to compare anyway)")
+            raise SystemExit(2)
+        regressions = compare(report, baseline, args.threshold, args.max_rss_growth)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+##call graph traversals shared by every GraphStore backend
+##a function is its node key (name, file_path, line_number)
+##neighbours(keys, incoming) -> {key: [keys it calls / is called by]}, one store round trip per BFS level
+##-> every walk is bounded by max_depth and expands each function once, no variable length cypher
+
+def reachable(neighbours, start_keys, max_depth=None, incoming=False):
+    ##BFS out of start_keys -> {key: depth first reached}, start keys themselves not included
+    #visited set -> O(functions + calls) whatever the depth, recursion cycles end the walk
+    depths = {}
+    seen = set(start_keys)
+    frontier = list(start_keys)
+    depth = 0
+    while frontier and (max_depth is None or depth < max_depth):
+        depth += 1
+        next_frontier = []
+        for found in neighbours(frontier, incoming).values():
+            for key in found:
+                if key not in seen:
+                    seen.add(key)
+                    depths[key] = depth
+                    next_frontier.append(key)
+        frontier = next_frontier
+    return depths
+
+def reach_rows(depths):
+    #{key: depth} -> [(name, file, line, depth)] nearest first
+    return [key + (depth,) for key, depth in sorted(depths.items(), key=lambda item: (item[1], item[0]))]
+
+def shortest_path(neighbours, sources, targets, max_depth=None):
+    ##bidirectional BFS, grows the smaller frontier each level -> [source key, .., target key] or None
+    sources, targets = list(sources), list(targets)
+    for key in sources:
+        if key in targets:
+            return [key]
+    #key -> (next key towards the start of that side, distance from it)
+    forward = {key: (None, 0) for key in sources}
+    backward = {key: (None, 0) for key in targets}
+    forward_frontier, backward_frontier = sources, targets
+    length = 0
+    while forward_frontier and backward_frontier and (max_depth is None or length < max_depth):
+        length += 1
+        grow_forward = len(forward_frontier) <= len(backward_frontier)
+        if grow_forward:
+            side, other, frontier = forward, backward, forward_frontier
+        else:
+            side, other, frontier = backward, forward, backward_frontier
+        next_frontier = []
+        meetings = []
+        for key, found in neighbours(frontier, not grow_forward).items():
+            distance = side[key][1] + 1
+            for neighbour in found:
+                if neighbour in side:
+                    continue
+                side[neighbour] = (key, distance)
+                next_frontier.append(neighbour)
+                if neighbour in other:
+                    meetings.append(neighbour)
+        if meetings:
+            #whole level expanded -> meeting closest to the other side is the shortest path
+            meet = min(meetings, key=lambda key: (other[key][1], key))
+            return walk_back(forward, meet)[::-1] + walk_back(backward, meet)[1:]
+        if grow_forward:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+    return None
+
+def walk_back(parents, key):
+    #key -> start of its BFS side
+    path = []
+    while key is not None:
+        path.append(key)
+        key = parents[key][0]
+    return path
+
+def strongly_connected_components(edges):
+    ##Tarjan over (caller, callee) pairs -> recursion cycles
+    #components of 2+ functions, or one function calling itself
+    #iterative -> long call chains do not hit the recursion limit
+    graph = {}
+    for caller, callee in edges:
+        graph.setdefault(caller, []).append(callee)
+        graph.setdefault(callee, [])
+
+    index, low = {}, {}
+    stack, on_stack = [], set()
+    components = []
+    for root in graph:
+        if root in index:
+            continue
+        #(function, next child to visit) -> explicit call stack
+        work = [(root, 0)]
+        while work:
+            node, i = work.pop()
+            if i == 0:
+                index[node] = low[node] = len(index)
+                stack.append(node)
+                on_stack.add(node)
+            children = graph[node]
+            descended = False
+            while i < len(children):
+                child = children[i]
+                i += 1
+                if child not in index:
+                    work.append((node, i))
+                    work.append((child, 0))
+                    descended = True
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            if descended:
+                continue
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1 or node in children:
+                    components.append(sorted(component))
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+    return sorted(components, key=lambda component: (-len(component), component))
+
+
+##transitive callers / callees of hot functions computed ahead of time
+##-> repeated impact questions answered without touching the store, dropped when the graph version moves
+class ReachabilityIndex:
+    def __init__(self):
+        #(function name, incoming) -> (max depth it was built with, {key: depth})
+        self.entries = {}
+        self.version = None
+
+    def build(self, store, func_names, max_depth=None):
+        ##both directions for every name
+        version = store.graph_version()
+        if version != self.version:
+            self.entries = {}
+            self.version = version
+        for func_name in func_names:
+            start_keys = store.function_keys(func_name)
+            for incoming in (True, False):
+                depths = reachable(store.call_neighbours, start_keys, max_depth, incoming)
+                self.entries[(func_name, incoming)] = (max_depth, depths)
+
+    def lookup(self, func_name, max_depth, incoming, version):
+        ##-> rows like GraphStore.transitive_callers or None when not indexed deep enough / stale
+        if version != self.version:
+            return None
+        entry = self.entries.get((func_name, incoming))
+        if entry is None:
+            return None
+        built_depth, depths = entry
+        if built_depth is not None and (max_depth is None or max_depth > built_depth):
+            return None
+        return reach_rows({
+            key: depth for key, depth in depths.items() if max_depth is None or depth <= max_depth
+        })
+
+    def stats(self):
+        return {'indexed': len(self.entries), 'reachable': sum(len(d) for _, d in self.entries.values())}
@@ -0,0 +1,210 @@
+import json
+import os
+import tempfile
+import time
+from metrics import metrics
+
+##resolve call records to the function they actually call, before anything is written
+##symbol table keyed on (file, class, name) + the calling file's imports
+class CallResolver:
+    def __init__(self, parsed_data):
+        #(file_path, parent_class, name) -> function record, the last definition (the one python binds)
+        self.functions = {}
+        #(file_path, parent_class, name, line_number) -> function record, every definition -> callers
+        self.definitions = {}
+        #(file_path, class name) of every class, used for Foo() -> Foo.__init__
+        self.classes = set()
+        #dotted module name -> files it could be, e.g. utils -> [pkg/utils.py]
+        self.modules = {}
+        self.files = set()
+        #file path -> [(module_name, import_type)]
+        self.imports = {}
+        self.add_symbols(parsed_data)
+
+    def add_symbols(self, parsed_data, slim=False):
+        ##add functions/classes/files/imports -> also used for symbols already in the graph
+        #slim -> keep only the fields resolution needs, not the whole parsed record
+        for func in parsed_data.get('functions', []):
+            key = (func['file_path'], func.get('parent_class'), func['name'])
+            definition = key + (func['line_number'],)
+            if definition in self.definitions:
+                continue
+            if slim:
+                func = {
+                    'name': func['name'],
+                    'file_path': func['file_path'],
+                    'parent_class': func.get('parent_class'),
+                    'line_number': func['line_number']
+                }
+            self.definitions[definition] = func
+            last = self.functions.get(key)
+            if last is None or last['line_number'] < func['line_number']:
+                self.functions[key] = func
+        for c in parsed_data.get('classes', []):
+            self.classes.add((c['file_path'], c['name']))
+        for file in parsed_data.get('files', []):
+            if file['path'] in self.files:
+                continue
+            self.files.add(file['path'])
+            for module_name in module_names(file['path']):
+                self.modules.setdefault(module_name, []).append(file['path'])
+        for imp in parsed_data.get('imports', []):
+            self.imports.setdefault(imp['file_path'], []).append((imp['module_name'], imp['import_type']))
+
+    def imported_files(self, imports):
+        ##files import records can point to -> only their symbols are needed to resolve calls
+        files = set()
+        for imp in imports:
+            files.update(self.module_files(imp['module_name'], imp['file_path']))
+        return files
+
+    def resolve(self, calls):
+        ##-> (resolved [(caller, callee)], unresolved [(caller, callee name)]) without duplicates
+        start = time.perf_counter()
+        resolved, unresolved = {}, {}
+        for call in calls:
+            #caller = the def the call sits in, callee lookups below bind to the last def
+            caller = self.definitions.get((call['file_path'], call.get('caller_class'), call['caller'], call.get('caller_line')))
+            if caller is None:
+                caller = self.functions.get((call['file_path'], call.get('caller_class'), call['caller']))
+            if caller is None:
+                continue
+            targets = self.resolve_targets(call)
+            if len(targets) == 1:
+                callee = targets[0]
+                resolved[(id(caller), id(callee))] = (caller, callee)
+            else:
+                #not found or ambiguous -> keep name only
+                unresolved[(id(caller), call['callee'])] = (caller, call['callee'])
+        metrics.count('stage_seconds_total', time.perf_counter() - start, stage='resolve')
+        return list(resolved.values()), list(unresolved.values())
+
+    def resolve_targets(self, call):
+        ##candidate functions for one call
+        file_path = call['file_path']
+        name = call['callee']
+        receiver = call.get('receiver')
+
+        #f() -> function/class in same file, else in a module imported with from x import ...
+        if receiver is None:
+            local = self.callables(file_path, name)
+            if local:
+                return local
+            targets = []
+            for module_name, import_type in self.imports.get(file_path, []):
+                if import_type == 'from_import':
+                    for module_file in self.module_files(module_name, file_path):
+                        targets.extend(self.callables(module_file, name))
+            return unique(targets)
+
+        #self.f() / cls.f() -> method of the class the caller belongs to
+        if receiver in ('self', 'cls'):
+            method = self.functions.get((file_path, call.get('caller_class'), name))
+            return [method] if method else []
+
+        #module.f() -> function in the imported module
+        targets = []
+        for module_name, import_type in self.imports.get(file_path, []):
+            if import_type == 'import' and module_name == receiver:
+                for module_file in self.module_files(module_name, file_path):
+                    targets.extend(self.callables(module_file, name))
+        if targets:
+            return unique(targets)
+
+        #ClassName.f() -> method of a class in the same file
+        method = self.functions.get((file_path, receiver, name))
+        return [method] if method else []
+
+    def callables(self, file_path, name):
+        ##top level function name, or class name -> its __init__
+        func = self.functions.get((file_path, None, name))
+        if func:
+            return [func]
+        if (file_path, name) in self.classes:
+            init = self.functions.get((file_path, name, '__init__'))
+            if init:
+                return [init]
+        return []
+
+    def module_files(self, module_name, importer):
+        ##files an import can point to
+        if module_name.startswith('.'):
+            return [f for f in relative_targets(module_name, importer) if f in self.files]
+
+        files = self.modules.get(module_name, [])
+        if len(files) > 1:
+            #same module name in many places -> prefer the one next to the importer
+            same_dir = [f for f in files if os.path.dirname(f) == os.path.dirname(importer)]
+            if same_dir:
+                return same_dir
+        return files
+
+
+##calls can only be resolved once every file's symbols are known
+##streaming writers park them in a temp file instead of a list that grows with the repo
+class PendingCalls:
+    def __init__(self):
+        self.handle = tempfile.TemporaryFile('w+', encoding='utf-8')
+
+    def add(self, calls):
+        for call in calls:
+            #records -> plain dicts on disk
+            self.handle.write(json.dumps(dict(call)) + '\n')
+
+    def resolve(self, resolver, chunk_size=10000):
+        ##-> (resolved, unresolved) per chunk of parked calls, temp file gone afterwards
+        self.handle.seek(0)
+        chunk = []
+        for line in self.handle:
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield resolver.resolve(chunk)
+                chunk = []
+        if chunk:
+            yield resolver.resolve(chunk)
+        self.handle.close()
+
+
+def relative_targets(module_name, importer):
+    #relative import: .utils -> utils.py next to importer, ..utils -> one dir up
+    rest = module_name.lstrip('.')
+    base = os.path.dirname(importer)
+    for _ in range(len(module_name) - len(rest) - 1):
+        base = os.path.dirname(base)
+    target = os.path.join(base, *rest.split('.')) if rest else base
+    return [target + '.py', os.path.join(target, '__init__.py')]
+
+def module_suffixes(module_name):
+    #absolute import -> endings of the paths of files it can be: a.b -> a/b.py, a/b/__init__.py
+    target = os.path.join(*module_name.split('.'))
+    return [target + '.py', os.path.join(target, '__init__.py')]
+
+def import_targets(imports):
+    ##import records -> (exact paths of relative imports, dotted names of absolute imports)
+    ##enough to look up the imported files in a store without listing every file
+    paths, names = set(), set()
+    for imp in imports:
+        if imp['module_name'].startswith('.'):
+            paths.update(relative_targets(imp['module_name'], imp['file_path']))
+        elif imp['module_name']:
+            names.add(imp['module_name'])
+    return paths, names
+
+def module_names(file_path):
+    ##every dotted name a file could be imported as
+    #a/b/c.py -> c, b.c, a.b.c ; a/b/__init__.py -> b, a.b
+    parts = [p for p in os.path.normpath(file_path).split(os.sep) if p not in ('', '.', '..')]
+    if not parts:
+        return []
+    parts[-1] = os.path.splitext(parts[-1])[0]
+    if parts[-1] == '__init__':
+        parts = parts[:-1]
+    return ['.'.join(parts[i:]) for i in range(len(parts))]
+
+
+def unique(functions):
+    #same function found through 2 imports counts once
+    seen = {}
+    for func in functions:
+        seen[id(func)] = func
+    return list(seen.values())
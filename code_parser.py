@@ -1,219 +1,457 @@
+import mmap
 import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
 from tree_sitter_languages import get_language, get_parser
+from extractor import get_extractor, reset_texts
+#EXCLUDED_DIRS, SOURCE_EXTENSIONS, is_source_file live in discovery now, still importable from here
+from discovery import EXCLUDED_DIRS, SOURCE_EXTENSIONS, FileDiscovery, is_source_file
+from records import RecordTable, record_type, intern
+from metrics import metrics
+
+#files whose last tree is kept for incremental reparsing (watch mode)
+TREE_CACHE_SIZE = 256
+#files from this size on are mmap'd -> bytes served from the page cache, no copy on the python heap
+MMAP_MIN_BYTES = 1 << 20
+##large file policy, for files over large_file_size or marked as generated (vendored / generated code)
+##  full -> parsed like any other file, shallow -> definitions + imports only (no call sites), skip -> left out
+LARGE_FILE_POLICIES = ['full', 'shallow', 'skip']
+DEFAULT_LARGE_FILE_SIZE = 10 << 20
+SHALLOW_KINDS = ['classes', 'functions', 'imports', 'variables']
+#generated file markers, looked for (lowercased) in the # comment lines above the first statement
+#within the first GENERATED_HEAD_BYTES -> a docstring / string / later comment mentioning them does not count
+GENERATED_MARKERS = [b'@generated', b'do not edit', b'generated by', b'auto-generated', b'autogenerated', b'automatically generated']
+GENERATED_HEAD_BYTES = 1024
 
 class CodeParser:
-    def __init__(self) :
+    def __init__(self, cache=None, large_files='full', large_file_size=DEFAULT_LARGE_FILE_SIZE, discovery=None) :
         self.PY_LANGUAGE = get_language('python')
         self.parser = get_parser('python')
+        #queries compiled once per process
+        self.extractor = get_extractor(self.PY_LANGUAGE)
+        #file path -> (tree, source) of recently reparsed files, least recently used first
+        self.trees = OrderedDict()
+        #ParseCache -> files whose content was extracted before are not parsed again
+        self.cache = cache
+        self.cache_hits = 0
+        self.cache_misses = 0
+        #what happens to large / generated files + how many got each treatment
+        self.large_files = large_files
+        self.large_file_size = large_file_size
+        self.large_counts = {policy: 0 for policy in LARGE_FILE_POLICIES}
+        #which files make up the codebase (gitignore, include / exclude globs, git ls-files)
+        self.discovery = discovery or FileDiscovery()
+        #(tree, file path, entities) of the last fetch_* extraction
+        self.last_extracted = None
     
     def parse_file(self, file_path):
         ##parse py file -> return AST
-        #read file in binary
+        #read file in binary -> plain bytes, the caller keeps the source for extraction and nothing closes it later
+        #(an mmap here would hold a file descriptor until garbage collected), parse_entities is the mmap path
         with open(file_path, 'rb') as f:
             source_code = f.read()
         #convert code to syntax tree
         tree = self.parser.parse(source_code) 
         return tree, source_code
+
+    def large_file_handling(self, source_code):
+        #-> None for ordinary files, else the policy applied to this one
+        if len(source_code) < self.large_file_size and not is_generated(source_code):
+            return None
+        return self.large_files
+
+    def parse_entities(self, file_path, pack=False):
+        ##read + parse + extract one file, parse + extract only on a parse cache miss
+        #-> (entities, from cache, {stage: seconds}, large file handling), pack -> entities in _pack_entities form
+        #entities None -> file skipped by the large file policy
+        start = time.perf_counter()
+        with opened_source(file_path) as source_code:
+            handling = self.large_file_handling(source_code)
+            timings = {'read': time.perf_counter() - start}
+            if handling == 'skip':
+                return None, False, timings, handling
+            entities, cached = self._parse_source(source_code, file_path, handling == 'shallow', pack, timings)
+            return entities, cached, timings, handling
+
+    def _parse_source(self, source_code, file_path, shallow, pack, timings):
+        stage_start = time.perf_counter()
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(source_code, shallow)
+            packed = self.cache.get(key)
+            now = time.perf_counter()
+            timings['cache'] = now - stage_start
+            stage_start = now
+            if packed is not None:
+                return (packed if pack else _unpack_entities(packed, file_path)), True
+        tree = self.parser.parse(source_code)
+        parsed = time.perf_counter()
+        with metrics.profiled():
+            entities = self.extract_entities(tree, source_code, file_path, shallow)
+        timings['parse'] = parsed - stage_start
+        timings['extract'] = time.perf_counter() - parsed
+        if key is None and not pack:
+            return entities, False
+        packed = _pack_entities(entities)
+        if key is not None:
+            self.cache.put(key, packed)
+        return (packed if pack else entities), False
+
+    def reparse_file(self, file_path):
+        ##parse_file for files that keep changing -> old tree reused when cached
+        ##old tree edited to the new byte range, tree-sitter only re-parses around the edit
+        #-> (tree, source_code, incremental), None when the content did not change
+        with open(file_path, 'rb') as f:
+            source_code = f.read()
+        cached = self.trees.pop(file_path, None)
+        incremental = cached is not None
+        if cached is None:
+            tree = self.parser.parse(source_code)
+        else:
+            old_tree, old_source = cached
+            if old_source == source_code:
+                self.trees[file_path] = cached
+                return None
+            old_tree.edit(**source_edit(old_source, source_code))
+            tree = self.parser.parse(source_code, old_tree)
+        self.trees[file_path] = (tree, source_code)
+        while len(self.trees) > TREE_CACHE_SIZE:
+            self.trees.popitem(last=False)
+        return tree, source_code, incremental
+
+    def forget_file(self, file_path):
+        #deleted file -> drop its cached tree
+        self.trees.pop(file_path, None)
     
     ##extract entities 1. functions 2. classes 3. variables
+    ##extract relationships 1.calls 2.imports
+    ##what gets extracted lives in queries/*.scm, one file per entity kind
+
+    def extract_entities(self, tree, source_code, file_path, shallow=False):
+        ##run the compiled queries once over the tree -> {kind: [records]}
+        #shallow -> only SHALLOW_KINDS queries run, other kinds come out empty
+        if shallow:
+            return get_extractor(self.PY_LANGUAGE, kinds=SHALLOW_KINDS).extract(tree, source_code, file_path)
+        return self.extractor.extract(tree, source_code, file_path)
+
+    ##single entity getters, kept for callers that only need one kind
+    ##one extraction per tree: fetch_functions then fetch_classes on the same tree reuse the first result
+
+    def fetch_entities(self, tree, source_code, file_path, kind):
+        #last tree extracted is kept (held, so `is` cannot match a new tree at a reused address)
+        last = self.last_extracted
+        if last is None or last[0] is not tree or last[1] != file_path:
+            last = self.last_extracted = (tree, file_path, self.extract_entities(tree, source_code, file_path))
+        #fresh list per call, like the separate extractions gave
+        return list(last[2][kind])
 
     def fetch_functions(self, tree, source_code, file_path):
-        ##get all functions from ast
-        functions = []
-
-        def traverse(node, parent_class=None):
-            ##if node is a function -> get function name -> extract params,func_name..
-            if node.type == "function_definition":
-                name_node = node.child_by_field_name('name') ##get function name
-                ##convert byte positions into func name string
-                if name_node:
-                    func_name = source_code[name_node.start_byte:name_node.end_byte].decode('utf-8')
-                    params = []
-                    ## get params from function -> loop throught params -> get identifiers
-                    params_node = node.child_by_field_name('parameters') ##get params
-                    if params_node:
-                        for child  in params_node.children:
-                            if child.type == 'identifier':
-                                param_name = source_code[child.start_byte:child.end_byte].decode('utf-8') ##convert to string
-                                params.append(param_name)
-                    
-                    functions.append({
-                        'name': func_name,
-                        'line_number': node.start_point[0] + 1,#line numbers start at 0
-                        'file_path': file_path,
-                        'parameters': params,
-                        'parent_class': parent_class ##which class func belongs to
-                    })
-            
-            ##if class, pass name to children
-            elif node.type == "class_definition":
-                name_node = node.child_by_field_name('name')
-                if name_node:
-                    class_name = source_code[name_node.start_byte:name_node.end_byte].decode('utf-8')
-                    #traverse children witht this class name
-                    for child in node.children:
-                        traverse(child, parent_class=class_name)
-                    return 
-            
-            for child in node.children:
-                traverse(child, parent_class)
-        traverse(tree.root_node) ##top of ast->file
-        return functions
+        return self.fetch_entities(tree, source_code, file_path, 'functions')
 
     def fetch_classes(self, tree, source_code, file_path):
-        classes = []
-        ##parent class in case of nested classes 
-        def traverse(node, parent_class=None):
-            if node.type == "class_definition":
-                name_node = node.child_by_field_name('name')#get name of class 
-                if name_node:
-                    class_name = source_code[name_node.start_byte:name_node.end_byte].decode('utf-8')
-
-                    classes.append({
-                        'name': class_name,
-                        'line_number': node.start_point[0] + 1,#line numbers start at 0
-                        'file_path': file_path,
-                        'parent_class': parent_class
-                    })
-            
-            for child in node.children:
-                traverse(child,parent_class)
-        traverse(tree.root_node)
-        return classes
-    
+        return self.fetch_entities(tree, source_code, file_path, 'classes')
+
     def fetch_variables(self, tree, source_code, file_path):
         ##handles only top level variables
         ##neeed to work on extracting tuples, attributes, type annotations
-        variables=[]
-        def traverse(node, depth=0):
-            ##check if cur__node is of type assignment and depth=1 to ensure only top level vars and should be direclty  under module
-            if node.type == 'assignment' and depth == 1:
-                left_node = node.child_by_field_name('left')
-                if left_node and left_node.type == 'identifier':
-                    var_name = source_code[left_node.start_byte:left_node.end_byte].decode('utf-8')
-                    variables.append({
-                        'name': var_name,
-                        'line_number': node.start_point[0] + 1,
-                        'file_path': file_path
-                    })
-            
-            for child in node.children:
-                traverse(child, depth +1)
-        
-        traverse(tree.root_node)
-        return variables
-
-    ##extract relationships 1.calls 2.imports 3.inheritance
+        return self.fetch_entities(tree, source_code, file_path, 'variables')
 
     def fetch_function_calls(self, tree, source_code, file_path):
-        ##functions -> nodes ; calls-> edges
-        calls=[]
-        ##get name of function we are currently inside
-        def traverse(node, in_function=None):
-            if node.type == 'function_definition':
-                name_node = node.child_by_field_name('name')
-                if name_node:
-                    func_name = source_code[name_node.start_byte:name_node.end_byte].decode('utf-8')
-                ##traverse function body pass funcname return so that no double traversa,
-                    for child in node.children:
-                        traverse(child, in_function=func_name)
-                return 
-            ##if curr node is a call
-            if node.type == 'call':
-                called_func = None 
-                function_node = node.child_by_field_name('function')
-                #only if we are in a function store relation
-                if function_node and in_function:
-                    if function_node.type == 'identifier':
-                        called_func = source_code[function_node.start_byte:function_node.end_byte].decode('utf-8')
-                
-                    ##handle method calks
-                    elif function_node.type == 'attribute':
-                        attr_node = function_node.child_by_field_name('attribute')
-                        if attr_node:
-                            called_func = source_code[attr_node.start_byte:attr_node.end_byte].decode('utf-8')
-
-                    if called_func:
-                        calls.append({
-                            'caller': in_function,
-                            'callee': called_func,
-                            'file_path': file_path
-                        })
-
-            for child in node.children:
-                traverse(child, in_function)
-
-        traverse(tree.root_node)
-        return calls
+        return self.fetch_entities(tree, source_code, file_path, 'calls')
 
     def fetch_imports(self, tree, source_code, file_path):
-        ##extract import relationships
-        imports = []
-        
-        def traverse(node):
-            ##handle import for module name, dotted names like os.join
-            if node.type == 'import_statement':
-                for child in node.children:
-                    if child.type == 'dotted_name':
-                        module_name = source_code[child.start_byte:child.end_byte].decode('utf-8')
-                        imports.append({
-                            'module_name': module_name,
-                            'file_path': file_path,
-                            'import_type': 'import'
-                        })
-            ##from module import x
-            elif node.type == 'import_from_statement':
-                module_node = node.child_by_field_name('module_name')
-                if module_node:
-                    module_name = source_code[module_node.start_byte:module_node.end_byte].decode('utf-8')
-                    imports.append({
-                        'module_name': module_name,
-                        'file_path': file_path,
-                        'import_type': 'from_import'
-                    })
-            
-            for child in node.children:
-                traverse(child)
-        
-        traverse(tree.root_node)
-        return imports
+        return self.fetch_entities(tree, source_code, file_path, 'imports')
  
-    def parse_codebase(self, directory_path):
+    def iter_source_files(self, directory_path):
+        ##walk codebase -> yield (file path, file name) for every .py file discovery keeps
+        yield from self.discovery.iter_files(directory_path)
+
+    def parse_codebase(self, directory_path, workers=1, manifest=None):
         #parse through codebase, get node-relationships
+        #workers > 1 -> spread files over a process pool
+        #manifest -> only parse files whose content changed since last run
+        #whole codebase -> column stores, records only made when read
         all_data = {
-            'functions': [],
-            'classes': [],
-            'calls': [],
-            'imports': [],
-            'variables': [],
-            'files': []
+            'functions': RecordTable('functions'),
+            'classes': RecordTable('classes'),
+            'calls': RecordTable('calls'),
+            'imports': RecordTable('imports'),
+            'variables': RecordTable('variables'),
+            'files': RecordTable('files')
         }
-        
-        for root, dirs, files in os.walk(directory_path):
-            dirs[:] = [d for d in dirs if d not in ['venv','.git', 'node_modules', 'dist', 'build']]
-            
-            for file in files:
-                if any(file.endswith(ext) for ext in ['.py']):
-                    file_path = os.path.join(root, file)
-                    ##parse file ,get ast
-                    try:
-                        print(f"Parsing: {file_path}")
-                        tree, source_code = self.parse_file(file_path)
-                        
-                        #extract 
-                        all_data['functions'].extend(self.fetch_functions(tree, source_code, file_path))
-                        all_data['classes'].extend(self.fetch_classes(tree, source_code, file_path))
-                        all_data['calls'].extend(self.fetch_function_calls(tree, source_code, file_path))
-                        all_data['imports'].extend(self.fetch_imports(tree, source_code, file_path))
-                        all_data['variables'].extend(self.fetch_variables(tree, source_code, file_path))
-                        
-                        #store file path n name
-                        all_data['files'].append({
-                            'path': file_path,
-                            'name': file
-                        })
-                        
-                    except Exception as e:
-                        print(f"Error while parsing {file_path}: {e}")
-        
+
+        for result in self.iter_parse_codebase(directory_path, workers=workers, manifest=manifest):
+            for key, values in result.items():
+                #kinds from extra query files get their own key
+                if key not in all_data:
+                    all_data[key] = RecordTable(key)
+                all_data[key].extend(values)
+
         return all_data
+
+    def parse_files(self, file_paths):
+        ##just these files -> all_data dict of lists (GraphStore.update_files re-parsing files that import a change)
+        all_data = {key: [] for key in ('functions', 'classes', 'calls', 'imports', 'variables', 'files')}
+        for file_path, file, entities in self._parse_serial((path, os.path.basename(path)) for path in file_paths):
+            for key, values in _file_result(file_path, file, entities).items():
+                all_data.setdefault(key, []).extend(values)
+        return all_data
+
+    def iter_parse_codebase(self, directory_path, workers=1, manifest=None, prefetch=0):
+        ##streaming version of parse_codebase -> yield one all_data shaped dict per file
+        ##consumer can write while later files are still parsed, nothing is gathered for the whole repo
+        #prefetch > 0 -> parse in a background thread, at most prefetch files waiting for the consumer
+        reset_texts()
+        source_files = self.iter_source_files(directory_path)
+        if manifest is not None:
+            source_files = (s for s in source_files if not manifest.is_unchanged(s[0]))
+
+        if workers and workers > 1:
+            results = self._parse_parallel(list(source_files), workers)
+        else:
+            results = self._parse_serial(source_files)
+
+        results = (_file_result(file_path, file, entities) for file_path, file, entities in results)
+        if prefetch:
+            results = _prefetch(results, prefetch)
+        yield from results
+
+        if manifest is not None:
+            print(f"Skipped {manifest.unchanged} unchanged files")
+        if self.cache is not None:
+            self.report_cache_stats()
+        self.report_large_files()
+
+    def _parse_serial(self, source_files):
+        ##parse files one by one in this process
+        for file_path, file in source_files:
+            ##parse file ,get ast
+            try:
+                print(f"Parsing: {file_path}")
+                #extract all entities in one walk
+                entities, cached, timings, handling = self.parse_entities(file_path)
+                self.record_file(cached, timings, handling)
+            except Exception as e:
+                print(f"Error while parsing {file_path}: {e}")
+                continue
+            if entities is None:
+                print(f"Skipping large / generated file: {file_path}")
+                continue
+            yield file_path, file, entities
+
+    def _parse_parallel(self, source_files, workers):
+        ##parse files in a process pool, results come back in walk order -> same output as serial
+        ##only a few chunks in flight at a time -> results dont pile up when the consumer is slower
+        self.worker_stats = {}
+        chunksize = max(1, min(64, len(source_files) // (workers * 8)))
+        chunks = iter([source_files[i:i + chunksize] for i in range(0, len(source_files), chunksize)])
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.cache, self.large_files, self.large_file_size)) as pool:
+            in_flight = deque()
+            for chunk in islice(chunks, workers * 2):
+                in_flight.append((chunk, pool.submit(_parse_chunk_in_worker, [p for p, _ in chunk])))
+
+            while in_flight:
+                chunk, future = in_flight.popleft()
+                results = future.result()
+                next_chunk = next(chunks, None)
+                if next_chunk:
+                    in_flight.append((next_chunk, pool.submit(_parse_chunk_in_worker, [p for p, _ in next_chunk])))
+
+                for (file_path, file), (packed, error, pid, seconds, cached, timings, handling) in zip(chunk, results):
+                    #per worker files + busy time
+                    stats = self.worker_stats.setdefault(pid, {'files': 0, 'seconds': 0.0})
+                    stats['files'] += 1
+                    stats['seconds'] += seconds
+                    if error:
+                        print(f"Error while parsing {file_path}: {error}")
+                        continue
+                    self.record_file(cached, timings, handling)
+                    if packed is None:
+                        print(f"Skipping large / generated file: {file_path}")
+                        continue
+                    print(f"Parsing: {file_path}")
+                    yield file_path, file, _unpack_entities(packed, file_path)
+
+        self.report_worker_stats()
+
+    def record_file(self, cached, timings, handling=None):
+        ##cache hit / miss + stage timings + large file handling of one parsed file
+        if handling is not None:
+            self.large_counts[handling] += 1
+            metrics.count('large_files_total', policy=handling)
+        if self.cache is not None and handling != 'skip':
+            if cached:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+            metrics.count('parse_cache_total', result='hit' if cached else 'miss')
+        if metrics.enabled:
+            metrics.add_stages(timings)
+            metrics.observe('file_parse_seconds', sum(timings.values()))
+
+    def report_cache_stats(self):
+        ##hit rate of this run, then keep the cache dir under its size limit
+        total = self.cache_hits + self.cache_misses
+        rate = 100.0 * self.cache_hits / total if total else 0.0
+        print(f"Parse cache: {self.cache_hits} hits, {self.cache_misses} misses ({rate:.1f}% hit rate)")
+        if self.cache_misses:
+            removed, size = self.cache.prune()
+            if removed:
+                print(f"Parse cache: evicted {removed} entries, {size / (1 << 20):.1f} MB left")
+
+    def report_large_files(self):
+        ##what the large file policy left out -> operators know the graph is partial
+        if not any(self.large_counts.values()):
+            return
+        counts = ', '.join(f"{count} {policy}" for policy, count in self.large_counts.items() if count)
+        print(f"Large / generated files (>= {self.large_file_size / (1 << 20):g} MB or marked generated): {counts}")
+
+    def report_worker_stats(self):
+        ##files/sec per worker process -> size ci runners
+        for pid, stats in sorted(self.worker_stats.items()):
+            rate = stats['files'] / stats['seconds'] if stats['seconds'] else 0.0
+            print(f"Worker {pid}: {stats['files']} files in {stats['seconds']:.2f}s ({rate:.1f} files/sec)")
+
+
+def read_source(f):
+    #open binary file -> bytes, or a read only mmap from MMAP_MIN_BYTES on (slices to bytes, parses like bytes)
+    if os.fstat(f.fileno()).st_size < MMAP_MIN_BYTES:
+        return f.read()
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+@contextmanager
+def opened_source(file_path):
+    ##read_source, mmap closed on exit -> extracted records hold decoded copies, nothing points into it
+    with open(file_path, 'rb') as f:
+        source_code = read_source(f)
+    try:
+        yield source_code
+    finally:
+        if isinstance(source_code, mmap.mmap):
+            source_code.close()
+
+def is_generated(source_code):
+    ##leading comment header only (# Generated by the protocol buffer compiler.  DO NOT EDIT!, # @generated)
+    for line in bytes(source_code[:GENERATED_HEAD_BYTES]).splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith(b'#'):
+            #first statement reached
+            return False
+        line = line.lower()
+        if any(marker in line for marker in GENERATED_MARKERS):
+            return True
+    return False
+
+def source_edit(old_source, new_source):
+    ##one edit covering everything between the common prefix and common suffix -> Tree.edit kwargs
+    start = common_length(old_source, new_source)
+    #suffix may not overlap the prefix in either version
+    limit = min(len(old_source), len(new_source)) - start
+    suffix = common_length(old_source[::-1][:limit], new_source[::-1][:limit])
+    old_end, new_end = len(old_source) - suffix, len(new_source) - suffix
+    return {
+        'start_byte': start,
+        'old_end_byte': old_end,
+        'new_end_byte': new_end,
+        'start_point': byte_point(old_source, start),
+        'old_end_point': byte_point(old_source, old_end),
+        'new_end_point': byte_point(new_source, new_end)
+    }
+
+def common_length(a, b):
+    #length of the common prefix, binary search over slice compares (memcmp) instead of a byte loop
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def byte_point(source, offset):
+    #byte offset -> (row, column in bytes) like tree-sitter points
+    row = source.count(b'\n', 0, offset)
+    return (row, offset - (source.rfind(b'\n', 0, offset) + 1))
+
+
+##process pool helpers -> module level so they can be pickled
+#one parser per worker process, built once by _init_worker
+_worker_parser = None
+
+def _init_worker(cache=None, large_files='full', large_file_size=DEFAULT_LARGE_FILE_SIZE):
+    global _worker_parser
+    _worker_parser = CodeParser(cache, large_files, large_file_size)
+
+def _parse_chunk_in_worker(file_paths):
+    return [_parse_in_worker(file_path) for file_path in file_paths]
+
+def _parse_in_worker(file_path):
+    ##parse one file inside a worker -> return compact result + timing
+    start = time.perf_counter()
+    try:
+        #cache hit -> entry goes back to the main process as is
+        packed, cached, timings, handling = _worker_parser.parse_entities(file_path, pack=True)
+        error = None
+    except Exception as e:
+        packed, error, cached, timings, handling = None, str(e), False, {}, None
+    #stage timings + large file handling measured here, recorded by the main process (metrics live there)
+    return packed, error, os.getpid(), time.perf_counter() - start, cached, timings, handling
+
+def _pack_entities(entities):
+    ##records -> field names + value tuples without file_path, less to pickle between processes
+    packed = {}
+    for kind, records in entities.items():
+        fields = [field for field in records[0].keys() if field != 'file_path'] if records else []
+        packed[kind] = (fields, [tuple(record[field] for field in fields) for record in records])
+    return packed
+
+def _unpack_entities(packed, file_path):
+    ##tuples from worker / parse cache -> same records extract_entities returns
+    entities = {}
+    for kind, (fields, rows) in packed.items():
+        make = record_type(kind, list(fields) + ['file_path'])
+        entities[kind] = [make(*map(intern, row), file_path) for row in rows]
+    return entities
+
+
+def _file_result(file_path, file, entities):
+    ##one parsed file in all_data shape
+    result = dict(entities)
+    #store file path n name
+    result['files'] = [{'path': file_path, 'name': file}]
+    return result
+
+def _prefetch(results, max_items):
+    ##run a generator in a background thread, bounded queue -> producer waits when consumer is behind
+    items = queue.Queue(maxsize=max_items)
+    done = object()
+    errors = []
+
+    def produce():
+        try:
+            for item in results:
+                items.put(item)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            items.put(done)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    while True:
+        item = items.get()
+        if item is done:
+            break
+        yield item
+    thread.join()
+    if errors:
+        raise errors[0]
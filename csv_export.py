@@ -0,0 +1,193 @@
+import csv
+import os
+from call_resolver import CallResolver, PendingCalls
+
+##write parsed codebase as csv files for `neo4j-admin database import` (first time indexing)
+##same nodes / relationships as Neo4jClient.build_graph, no database needed
+
+#node csv -> header in neo4j-admin format
+NODE_FILES = {
+    'files': ['id:ID', 'path', 'name', ':LABEL'],
+    'functions': ['id:ID', 'name', 'file_path', 'line_number:int', 'parent_class', ':LABEL'],
+    'classes': ['id:ID', 'name', 'file_path', 'line_number:int', ':LABEL'],
+    'variables': ['id:ID', 'name', 'file_path', 'line_number:int', ':LABEL'],
+    'imports': ['id:ID', 'module_name', 'import_type', ':LABEL'],
+    'unresolved_calls': ['id:ID', 'name', ':LABEL']
+}
+#relationship csv -> one file per type
+RELATIONSHIP_FILES = {
+    'contains': 'CONTAINS',
+    'defines': 'DEFINES',
+    'file_imports': 'IMPORTS',
+    'has_method': 'HAS_METHOD',
+    'calls': 'CALLS',
+    'calls_unresolved': 'CALLS_UNRESOLVED'
+}
+RELATIONSHIP_HEADER = [':START_ID', ':END_ID', ':TYPE']
+
+
+##stable ids, same node key as the MERGEs in neo4j_client
+def file_id(path):
+    return f"File:{path}"
+
+def function_id(name, file_path, line_number):
+    return f"Function:{file_path}:{name}:{line_number}"
+
+def class_id(name, file_path):
+    return f"Class:{file_path}:{name}"
+
+def variable_id(name, file_path):
+    return f"Variable:{file_path}:{name}"
+
+def import_id(module_name):
+    return f"Import:{module_name}"
+
+def unresolved_call_id(name):
+    return f"UnresolvedCall:{name}"
+
+
+class CsvExporter:
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        #rows go straight to disk, only ids are kept to skip duplicates (MERGE semantics)
+        self.handles = {}
+        self.writers = {}
+        for name, header in NODE_FILES.items():
+            self.open_csv(name, header)
+        for name in RELATIONSHIP_FILES:
+            self.open_csv(name, RELATIONSHIP_HEADER)
+        #node ids / edges of the file being written -> every key below File is file scoped, so duplicates
+        #(a param shared by 2 functions, a class defined twice) can only come from the same file
+        #-> memory follows the largest file, not the whole codebase
+        self.file_nodes = set()
+        self.file_edges = set()
+        #shared nodes, one per module / call name -> written at finish(), last import_type wins like SET
+        self.import_types = {}
+        self.unresolved_names = set()
+        #kind -> [caller file, edges of it written so far]
+        self.call_edges = {'calls': [None, set()], 'calls_unresolved': [None, set()]}
+        #calls need the symbols of every file -> park them on disk until finish()
+        self.pending_calls = PendingCalls()
+        self.resolver = CallResolver({})
+
+    def open_csv(self, name, header):
+        handle = open(os.path.join(self.output_dir, name + '.csv'), 'w', newline='', encoding='utf-8')
+        self.handles[name] = handle
+        self.writers[name] = csv.writer(handle)
+        self.writers[name].writerow(header)
+
+    def write_node(self, kind, node_id, row):
+        ##write node once per id (within the current file)
+        if node_id in self.file_nodes:
+            return
+        self.file_nodes.add(node_id)
+        self.writers[kind].writerow([node_id] + row)
+
+    def write_edge(self, kind, start_id, end_id):
+        ##write relationship once per (start, type, end), every edge starts at a node of the current file
+        key = (start_id, kind, end_id)
+        if key in self.file_edges:
+            return
+        self.file_edges.add(key)
+        self.writers[kind].writerow([start_id, end_id, RELATIONSHIP_FILES[kind]])
+
+    def write_call(self, kind, caller, end_id):
+        #CALLS / CALLS_UNRESOLVED edge, seen edges reset when the caller file changes
+        seen = self.call_edges[kind]
+        if caller['file_path'] != seen[0]:
+            seen[0] = caller['file_path']
+            seen[1].clear()
+        key = (function_id(caller['name'], caller['file_path'], caller['line_number']), end_id)
+        if key in seen[1]:
+            return
+        seen[1].add(key)
+        self.writers[kind].writerow([key[0], end_id, RELATIONSHIP_FILES[kind]])
+
+    def add(self, parsed_data):
+        ##write nodes + file level relationships of parsed files (all_data dict, whole codebase or a part)
+        per_file = {}
+        for key in ('files', 'functions', 'classes', 'variables', 'imports'):
+            for record in parsed_data.get(key, []):
+                file_path = record['path'] if key == 'files' else record['file_path']
+                per_file.setdefault(file_path, {}).setdefault(key, []).append(record)
+        for file_data in per_file.values():
+            self.add_file(file_data)
+
+        self.pending_calls.add(parsed_data.get('calls', []))
+        self.resolver.add_symbols(parsed_data, slim=True)
+
+    def add_file(self, file_data):
+        ##one file's records, nodes written in the order the stores MERGE them
+        self.file_nodes.clear()
+        self.file_edges.clear()
+        for file in file_data.get('files', []):
+            self.write_node('files', file_id(file['path']), [file['path'], file['name'], 'File'])
+
+        #Variable node key is (name, file) -> a param and a top level variable can be the same node
+        #top level variable wins, its line_number is SET after the param MERGE in the stores
+        variables = {}
+        for func in file_data.get('functions', []):
+            func_id = function_id(func['name'], func['file_path'], func['line_number'])
+            self.write_node('functions', func_id, [
+                func['name'], func['file_path'], func['line_number'], func.get('parent_class') or '', 'Function'
+            ])
+            self.write_edge('contains', file_id(func['file_path']), func_id)
+            #params -> Variable nodes, func DEFINES param
+            for param in func.get('parameters', []):
+                var_id = variable_id(param, func['file_path'])
+                variables.setdefault(var_id, [param, func['file_path'], '', 'Variable'])
+                self.write_edge('defines', func_id, var_id)
+
+        #same class twice in a file -> one node, last definition's line like SET
+        classes = {}
+        for c in file_data.get('classes', []):
+            c_id = class_id(c['name'], c['file_path'])
+            classes[c_id] = [c['name'], c['file_path'], c['line_number'], 'Class']
+            self.write_edge('contains', file_id(c['file_path']), c_id)
+        for c_id, row in classes.items():
+            self.write_node('classes', c_id, row)
+
+        for var in file_data.get('variables', []):
+            var_id = variable_id(var['name'], var['file_path'])
+            variables[var_id] = [var['name'], var['file_path'], var['line_number'], 'Variable']
+            self.write_edge('contains', file_id(var['file_path']), var_id)
+        for var_id, row in variables.items():
+            self.write_node('variables', var_id, row)
+
+        #HAS_METHOD MATCHes the class -> no edge to a class not defined in the file
+        for func in file_data.get('functions', []):
+            c_id = func.get('parent_class') and class_id(func['parent_class'], func['file_path'])
+            if c_id in classes:
+                self.write_edge('has_method', c_id, function_id(func['name'], func['file_path'], func['line_number']))
+
+        for imp in file_data.get('imports', []):
+            self.import_types[imp['module_name']] = imp['import_type']
+            self.write_edge('file_imports', file_id(imp['file_path']), import_id(imp['module_name']))
+
+    def finish(self):
+        ##shared Import nodes, then parked calls resolved against full symbol table -> CALLS / CALLS_UNRESOLVED
+        for module_name, import_type in self.import_types.items():
+            self.writers['imports'].writerow([import_id(module_name), module_name, import_type, 'Import'])
+        #calls are parked file by file -> a caller file's edges come out together, deduped per caller file
+        for resolved, unresolved in self.pending_calls.resolve(self.resolver):
+            for caller, callee in resolved:
+                self.write_call('calls', caller, function_id(callee['name'], callee['file_path'], callee['line_number']))
+            for caller, callee in unresolved:
+                if callee not in self.unresolved_names:
+                    self.unresolved_names.add(callee)
+                    self.writers['unresolved_calls'].writerow([unresolved_call_id(callee), callee, 'UnresolvedCall'])
+                self.write_call('calls_unresolved', caller, unresolved_call_id(callee))
+        for handle in self.handles.values():
+            handle.close()
+
+    def export(self, parsed_data):
+        ##whole parse_codebase output -> csv files
+        self.add(parsed_data)
+        self.finish()
+
+    def import_command(self, database='neo4j'):
+        ##neo4j-admin command that loads the written files
+        args = [f"--nodes={os.path.join(self.output_dir, name + '.csv')}" for name in NODE_FILES]
+        args += [f"--relationships={os.path.join(self.output_dir, name + '.csv')}" for name in RELATIONSHIP_FILES]
+        return "neo4j-admin database import full " + " ".join(args) + f" {database}"
@@ -0,0 +1,294 @@
+import os
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+##find the source files of a codebase -> (file path, file name) in a fixed order
+##scandir walk, directory listings run in a thread pool (scandir waits on the filesystem, not the GIL)
+##-> on network filesystems discovery no longer waits on one directory listing at a time
+##filters: EXCLUDED_DIRS, .gitignore files (+ .git/info/exclude), exclude globs, include globs
+##git_files -> file list from `git ls-files` (tracked + untracked not ignored), no walk at all
+##globs use .gitignore syntax relative to the codebase root: *_pb2.py, tests/, /setup.py, src/**/gen_*.py
+
+#dirs never indexed
+EXCLUDED_DIRS = ['venv', '.git', 'node_modules', 'dist', 'build']
+SOURCE_EXTENSIONS = ['.py']
+DEFAULT_THREADS = 8
+
+
+def is_source_file(file_name):
+    return any(file_name.endswith(ext) for ext in SOURCE_EXTENSIONS)
+
+
+class FileDiscovery:
+    def __init__(self, include=(), exclude=(), gitignore=True, git_files=False, threads=DEFAULT_THREADS):
+        self.include = compile_patterns(include)
+        self.exclude = compile_patterns(exclude)
+        self.gitignore = gitignore
+        self.git_files = git_files
+        self.threads = threads
+
+    def iter_files(self, root):
+        if self.git_files:
+            try:
+                paths = self.git_ls_files(root)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"git ls-files failed ({e}), walking {root} instead")
+            else:
+                for path in paths:
+                    yield path, os.path.basename(path)
+                return
+        for _, files in self.walk(root):
+            for path in files:
+                yield path, os.path.basename(path)
+
+    ##directory walk
+    #rules = [(chars to strip, prefix to add, patterns)] -> turn a root relative path into one
+    #relative to the dir of each .gitignore, shallowest first
+
+    def walk(self, root, top=None):
+        ##-> (dir path, [source files in it]) for every dir not filtered out, top down, names sorted
+        #top -> only the tree under top (watcher, new dir), rules from above it still apply
+        top = top or root
+        rules = self.rules_above(root, top)
+        if self.threads <= 1:
+            yield from self.walk_tree(root, top, rules)
+            return
+        pool = ThreadPoolExecutor(max_workers=self.threads)
+
+        def listing(dir_path, rules):
+            #list one dir, queue its subdirs right away -> the pool never waits on the consumer
+            files, subdirs, subdir_rules = self.scan(root, dir_path, rules)
+            return files, [(subdir, pool.submit(listing, subdir, subdir_rules)) for subdir in subdirs]
+
+        try:
+            stack = [(top, pool.submit(listing, top, rules))]
+            while stack:
+                dir_path, listed = stack.pop()
+                files, subdirs = listed.result()
+                yield dir_path, files
+                #results still come out depth first
+                stack.extend(reversed(subdirs))
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def walk_tree(self, root, top, rules):
+        #serial walk, depth first like os.walk
+        stack = [(top, rules)]
+        while stack:
+            dir_path, rules = stack.pop()
+            files, subdirs, subdir_rules = self.scan(root, dir_path, rules)
+            yield dir_path, files
+            stack.extend((subdir, subdir_rules) for subdir in reversed(subdirs))
+
+    def scan(self, root, dir_path, rules):
+        ##one directory listing -> (source files, subdirs to walk, rules inside dir_path)
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            return [], [], rules
+        if self.gitignore and any(entry.name == '.gitignore' for entry in entries):
+            rules = rules + [rule_set(root, dir_path, os.path.join(dir_path, '.gitignore'))]
+        files, subdirs = [], []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                #symlinked dirs not followed, same as os.walk
+                if not entry.is_symlink() and self.accepts(root, entry.path, rules, True):
+                    subdirs.append(entry.path)
+            elif self.accepts(root, entry.path, rules, False):
+                files.append(entry.path)
+        return files, subdirs, rules
+
+    def rules_above(self, root, top):
+        ##rules of the dirs above top: .git/info/exclude, .gitignore files from the repo top
+        ##(root outside a repo) down to top's parent, top's own .gitignore is read by scan
+        if not self.gitignore:
+            return []
+        absolute_root = os.path.abspath(root)
+        repo_top = find_repo_top(absolute_root)
+        stop = repo_top or absolute_root
+        dirs = []
+        dir_path = os.path.abspath(top)
+        while dir_path != stop and dir_path != os.path.dirname(dir_path):
+            dir_path = os.path.dirname(dir_path)
+            dirs.append(dir_path)
+        rules = []
+        if repo_top is not None:
+            rules.append(rule_set(absolute_root, repo_top, os.path.join(repo_top, '.git', 'info', 'exclude')))
+        for dir_path in reversed(dirs):
+            rules.append(rule_set(absolute_root, dir_path, os.path.join(dir_path, '.gitignore')))
+        return [rule for rule in rules if rule[2]]
+
+    ##filters
+    def accepts(self, root, path, rules, is_dir):
+        name = os.path.basename(path)
+        if is_dir:
+            if name in EXCLUDED_DIRS:
+                return False
+        elif not is_source_file(name):
+            return False
+        if not rules and not self.exclude and not self.include:
+            return True
+        rel = relative(path, root)
+        #deepest .gitignore with a matching pattern decides
+        for strip, prefix, patterns in reversed(rules):
+            ignored = match(patterns, prefix + rel[strip:], is_dir)
+            if ignored is not None:
+                if ignored:
+                    return False
+                break
+        if match(self.exclude, rel, is_dir):
+            return False
+        if self.include and not is_dir:
+            return bool(match(self.include, rel, False))
+        return True
+
+    def is_included(self, root, path, is_dir=False):
+        ##single path check (watcher events) -> every dir from root down to path has to pass too
+        if not is_dir and not is_source_file(os.path.basename(path)):
+            return False
+        rules = self.rules_above(root, root)
+        parts = relative(path, root).split('/')
+        dir_path = root
+        for i, part in enumerate(parts):
+            if self.gitignore:
+                rules = rules + [rule_set(root, dir_path, os.path.join(dir_path, '.gitignore'))]
+            dir_path = os.path.join(dir_path, part)
+            if not self.accepts(root, dir_path, rules, is_dir if i == len(parts) - 1 else True):
+                return False
+        return True
+
+    ##git
+    def git_ls_files(self, root):
+        ##tracked (not deleted) + untracked not ignored files under root -> filtered like a walk, walk order
+        def ls_files(*options):
+            output = subprocess.run(['git', '-C', root, 'ls-files', '-z'] + list(options), capture_output=True, check=True).stdout
+            return [path for path in output.decode('utf-8', 'surrogateescape').split('\0') if path]
+        deleted = set(ls_files('--deleted'))
+        paths = sorted(set(ls_files('--cached', '--others', '--exclude-standard')) - deleted, key=walk_order)
+        result = []
+        for rel in paths:
+            parts = rel.split('/')
+            if any(part in EXCLUDED_DIRS for part in parts[:-1]):
+                continue
+            if any(match(self.exclude, '/'.join(parts[:i]), True) for i in range(1, len(parts))):
+                continue
+            path = os.path.join(root, *parts)
+            if self.accepts(root, path, [], False):
+                result.append(path)
+        return result
+
+
+##.gitignore patterns
+def compile_pattern(line):
+    ##one .gitignore line -> (regex, negated, dirs only), None for blank lines / comments
+    line = line.rstrip('\n')
+    if not line.endswith('\\ '):
+        line = line.rstrip(' ')
+    if not line or line.startswith('#'):
+        return None
+    negated = line.startswith('!')
+    if negated:
+        line = line[1:]
+    elif line.startswith(('\\!', '\\#')):
+        line = line[1:]
+    dirs_only = line.endswith('/')
+    line = line.rstrip('/')
+    #a slash anywhere but the end -> relative to the .gitignore dir, else matches at any depth
+    anchored = '/' in line
+    line = line.lstrip('/')
+    if not line:
+        return None
+    prefix = '' if anchored else '(?:.*/)?'
+    return re.compile(prefix + glob_regex(line) + '\\Z'), negated, dirs_only
+
+def glob_regex(glob):
+    parts = []
+    i = 0
+    while i < len(glob):
+        char = glob[i]
+        at_segment_start = i == 0 or glob[i - 1] == '/'
+        if at_segment_start and glob.startswith('**/', i):
+            #any number of dirs, none included
+            parts.append('(?:.*/)?')
+            i += 3
+            continue
+        if at_segment_start and glob.startswith('**', i) and i + 2 == len(glob):
+            #everything inside
+            parts.append('.*')
+            break
+        if char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '\\' and i + 1 < len(glob):
+            i += 1
+            parts.append(re.escape(glob[i]))
+        elif char == '[' and glob.find(']', i + 2) != -1:
+            end = glob.find(']', i + 2)
+            chars = glob[i + 1:end]
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            parts.append('[' + chars.replace('\\', '\\\\') + ']')
+            i = end
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return ''.join(parts)
+
+def compile_patterns(lines):
+    return [pattern for pattern in map(compile_pattern, lines) if pattern is not None]
+
+def read_patterns(path):
+    try:
+        with open(path, encoding='utf-8', errors='surrogateescape') as f:
+            return compile_patterns(f)
+    except OSError:
+        return []
+
+def rule_set(root, base, path):
+    ##patterns of the ignore file at path, relative to base -> rules entry for root relative paths
+    rel = os.path.relpath(base, root).replace(os.sep, '/')
+    if rel == '.':
+        return 0, '', read_patterns(path)
+    if rel == '..' or rel.startswith('../'):
+        #base above root -> prefix root's path inside base
+        return 0, os.path.relpath(root, base).replace(os.sep, '/') + '/', read_patterns(path)
+    return len(rel) + 1, '', read_patterns(path)
+
+def match(patterns, rel, is_dir):
+    #-> True ignored / False re-included (!) by the last matching pattern, None when none matches
+    for regex, negated, dirs_only in reversed(patterns):
+        if dirs_only and not is_dir:
+            continue
+        if regex.match(rel):
+            return not negated
+    return None
+
+
+def relative(path, root):
+    #path under root -> posix style relative path, patterns use /
+    prefix = os.path.join(root, '')
+    rel = path[len(prefix):] if path.startswith(prefix) else os.path.relpath(path, root)
+    return rel.replace(os.sep, '/')
+
+def find_repo_top(root):
+    #closest dir at or above root holding .git, None outside a repo
+    dir_path = os.path.abspath(root)
+    while True:
+        if os.path.exists(os.path.join(dir_path, '.git')):
+            return dir_path
+        parent = os.path.dirname(dir_path)
+        if parent == dir_path:
+            return None
+        dir_path = parent
+
+def walk_order(rel):
+    #git paths -> same order as the walk: a dir's files before its subdirs, names sorted
+    parts = rel.split('/')
+    return parts[:-1], parts[-1]
@@ -0,0 +1,230 @@
+import os
+import re
+import sys
+from records import record_type, intern
+
+##entity extraction driven by tree-sitter queries (queries/*.scm)
+##matching runs in C, python only touches matched nodes -> no per node type checks
+##new entity kind = new queries/<kind>.scm, no new traversal
+##
+##query file conventions, kind = file name (functions.scm -> 'functions'):
+##  @function                entity node, one record per node (matches on the same node are merged)
+##  @function.name           field = text of the captured node
+##  @function.parameters.item  list field, one item per match, in source order
+##  (#set! field "value")    constant field, a captured value wins over it
+##  (#set! scope "function" / "class")  entity opens a scope for the entities inside it
+##  (#set! context "class")  -> parent_class = name of the enclosing class (None at module level)
+##  (#set! context "caller") -> caller / caller_class / caller_line from the enclosing function, dropped outside functions
+##every record also gets file_path + line_number of its entity node
+##field captures sit on or inside their entity node
+##
+##run through Query.captures, not Query.matches: matches leaks ~56 bytes per capture in py-tree-sitter 0.21
+##(never freed, grows with every file parsed). captures does not say which pattern matched,
+##so every capture is renamed p<pattern index>.<name> when the query is compiled and a field capture
+##belongs to the closest entity node of the same pattern at or above it
+##records come out as compact records.Record objects, names interned, list fields as tuples
+##capture text looked up in a per run table -> each distinct identifier decoded once,
+##repeats (self, get, append ..) share one str instead of a fresh decode per captured node
+
+QUERY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'queries')
+
+CAPTURE_PATTERN = re.compile(r'@([\w.]+)')
+SET_PATTERN = re.compile(r'\(#set!\s+(\w+)\s+"([^"]*)"\s*\)')
+
+#decoded capture texts: utf-8 bytes -> interned str
+#looked up with the short bytes slice of the capture, a memoryview slice would do without the copy
+#but costs more to make + hash than copying a name
+#emptied at the start of every parse run (reset_texts) and whenever it reaches MAX_TABLE_ENTRIES
+#-> a long --watch session does not keep every name it ever saw
+_texts = {}
+#longer captures (expressions, string literals) rarely repeat -> decoded as they come, not kept
+MAX_TABLE_TEXT = 64
+MAX_TABLE_ENTRIES = 200000
+
+#compiled once per process and query dir, shared by every CodeParser (and pool worker)
+_extractors = {}
+
+def get_extractor(language, query_dir=QUERY_DIR, kinds=None):
+    key = (language.name, query_dir, tuple(kinds) if kinds else None)
+    if key not in _extractors:
+        _extractors[key] = QueryExtractor(language, query_dir, kinds)
+    return _extractors[key]
+
+
+class QueryExtractor:
+    def __init__(self, language, query_dir=QUERY_DIR, kinds=None):
+        #kinds -> only those query files are run (shallow extraction), the others come out empty
+        #output keys, in file name order
+        self.kinds = []
+        #kind -> {field: default}, from the capture names of its file
+        self.fields = {}
+        #pattern index in the compiled query -> (kind, {#set! key: value})
+        self.patterns = []
+        #capture name -> None for an entity capture, else (field, is list)
+        self.captures = {}
+        #renamed capture in the compiled query -> (pattern index, None or (field, is list))
+        self.tagged = {}
+        sources = []
+        for name in sorted(os.listdir(query_dir)):
+            if not name.endswith('.scm'):
+                continue
+            kind = name[:-len('.scm')]
+            with open(os.path.join(query_dir, name)) as f:
+                source = f.read()
+            self.kinds.append(kind)
+            fields = {}
+            for capture in CAPTURE_PATTERN.findall(strip_comments(source)):
+                parts = capture.split('.')
+                if len(parts) == 1:
+                    self.captures[capture] = None
+                else:
+                    is_list = parts[-1] == 'item'
+                    self.captures[capture] = (parts[1], is_list)
+                    fields[parts[1]] = [] if is_list else None
+            self.fields[kind] = fields
+            if kinds is not None and kind not in kinds:
+                continue
+            for pattern in split_patterns(source):
+                index = len(self.patterns)
+                self.patterns.append((kind, {key: sys.intern(value) for key, value in SET_PATTERN.findall(pattern)}))
+                for capture in CAPTURE_PATTERN.findall(pattern):
+                    self.tagged[f'p{index}.{capture}'] = (index, self.captures[capture])
+                sources.append(CAPTURE_PATTERN.sub(lambda m: f'@p{index}.{m.group(1)}', pattern))
+        #kind -> record every entity starts from (scalar fields unset)
+        self.scalars = {
+            kind: {field: None for field, default in fields.items() if default is None}
+            for kind, fields in self.fields.items()
+        }
+        #all kinds in one query -> one pass over the tree per file
+        self.query = language.query('\n'.join(sources))
+
+    def extract(self, tree, source_code, file_path):
+        ##tree -> {kind: [records]} for every query file
+        #entity node id -> [kind, node, record, settings, {list field: {node id: (start byte, text)}}]
+        entities = {}
+        #pattern index -> node ids of the entities it matched
+        matched = {}
+        field_captures = []
+        tagged = self.tagged
+        for node, name in self.query.captures(tree.root_node):
+            pattern_index, field = tagged[name]
+            if field is not None:
+                field_captures.append((node, pattern_index, field))
+                continue
+            kind, settings = self.patterns[pattern_index]
+            entity = entities.get(node.id)
+            if entity is None:
+                entity = entities[node.id] = [kind, node, dict(self.scalars[kind]), {}, {}]
+            matched.setdefault(pattern_index, set()).add(node.id)
+            record, entity_settings = entity[2], entity[3]
+            for key, value in settings.items():
+                if key in ('scope', 'context'):
+                    entity_settings[key] = value
+                elif record.get(key) is None:
+                    record[key] = value
+
+        texts = _texts
+        for captured, pattern_index, field in field_captures:
+            #closest entity of the same pattern at or above the captured node
+            owners = matched.get(pattern_index, ())
+            owner = captured
+            while owner is not None and owner.id not in owners:
+                owner = owner.parent
+            if owner is None:
+                continue
+            entity = entities[owner.id]
+            piece = source_code[captured.start_byte:captured.end_byte]
+            text = texts.get(piece)
+            if text is None:
+                text = add_text(piece)
+            if field[1]:
+                entity[4].setdefault(field[0], {})[captured.id] = (captured.start_byte, text)
+            else:
+                entity[2][field[0]] = text
+
+        result = {kind: [] for kind in self.kinds}
+        #source order, outer node before inner one starting at the same byte -> scope stack sweep
+        ordered = sorted(entities.values(), key=lambda entity: (entity[1].start_byte, -entity[1].end_byte))
+        #(end byte, scope kind, record) of scopes we are inside
+        scopes = []
+        for kind, node, record, settings, items in ordered:
+            while scopes and scopes[-1][0] <= node.start_byte:
+                scopes.pop()
+            for field, default in self.fields[kind].items():
+                if default is not None:
+                    record[field] = tuple(value for _, value in sorted(items.get(field, {}).values()))
+
+            context = settings.get('context')
+            if context == 'class':
+                record['parent_class'] = innermost(scopes, 'class', 'name')
+            elif context == 'caller':
+                function = innermost(scopes, 'function')
+                if function is None:
+                    continue
+                record['caller'] = function['name']
+                record['caller_class'] = function['parent_class']
+                #same name twice in a file (property getter / setter, redefinition) -> line tells them apart
+                record['caller_line'] = function['line_number']
+            record['file_path'] = file_path
+            record['line_number'] = intern(node.start_point[0] + 1)
+            result[kind].append(record_type(kind, record)(*record.values()))
+
+            if settings.get('scope'):
+                scopes.append((node.end_byte, settings['scope'], record))
+        return result
+
+
+def add_text(piece):
+    #first sighting of a capture text
+    if len(piece) > MAX_TABLE_TEXT:
+        return piece.decode('utf-8')
+    if len(_texts) >= MAX_TABLE_ENTRIES:
+        #full -> start over, names still in use stay shared through sys.intern
+        _texts.clear()
+    text = _texts[piece] = sys.intern(piece.decode('utf-8'))
+    return text
+
+def reset_texts():
+    #new parse run -> decode table starts empty
+    _texts.clear()
+
+def innermost(scopes, scope_kind, field=None):
+    #record (or one of its fields) of the closest enclosing scope of that kind
+    for _, kind, record in reversed(scopes):
+        if kind == scope_kind:
+            return record[field] if field else record
+    return None
+
+def strip_comments(source):
+    return re.sub(r';[^\n]*', '', source)
+
+def split_patterns(source):
+    ##query source -> text of each top level pattern, same order tree-sitter numbers them
+    patterns = []
+    depth = 0
+    in_string = False
+    for line in source.splitlines():
+        i = 0
+        while i < len(line):
+            char = line[i]
+            if in_string:
+                if char == '\\':
+                    i += 1
+                elif char == '"':
+                    in_string = False
+            elif char == ';':
+                break
+            elif char == '"':
+                in_string = True
+            elif char in '([':
+                if depth == 0:
+                    patterns.append('')
+                depth += 1
+            elif char in ')]':
+                depth -= 1
+            if patterns:
+                patterns[-1] += char
+            i += 1
+        if patterns:
+            patterns[-1] += '\n'
+    return patterns
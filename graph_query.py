@@ -1,180 +1,219 @@
+import argparse
+import re
+import time
 from neo4j_client import Neo4jClient
+from graph_store import GRAPH_VERSION
+from memory_store import MemoryStore
+from query_cache import QueryCache
+from call_graph import ReachabilityIndex
+
+#cypher clauses that change the graph (CALL -> procedures may write too), a false match only costs a cache flush
+WRITE_CLAUSES = re.compile(r'\b(CREATE|MERGE|DELETE|SET|REMOVE|DROP|FOREACH|LOAD\s+CSV|CALL)\b', re.IGNORECASE)
 
 class GraphQuery:
-    def __init__(self):
-        self.neo4j = Neo4jClient()
+    def __init__(self, store=None, cache_size=256, cache_ttl=60.0, version_interval=1.0):
+        #any GraphStore backend, neo4j unless told otherwise
+        self.store = store or Neo4jClient()
+        #same questions asked again and again -> results cached until the graph version moves
+        self.cache = QueryCache(cache_size, cache_ttl)
+        #hot impact targets precomputed by index_functions
+        self.reachability = ReachabilityIndex()
+        #graph version read from the store at most once per version_interval seconds
+        #-> a cache hit is not a database round trip, an ingest from elsewhere shows up within the interval
+        self.version_interval = version_interval
+        self.version = None
+        self.version_read = 0.0
+
+    def graph_version(self, refresh=False):
+        if self.store.version_is_local:
+            #in process store, reading the counter is a dict lookup
+            return self.store.graph_version()
+        now = time.monotonic()
+        if refresh or self.version is None or now - self.version_read >= self.version_interval:
+            self.version = self.store.graph_version()
+            self.version_read = now
+        return self.version
+
+    def cached(self, query_name, *params):
+        ##store.query_name(*params) through the cache -> fresh list every time, callers may change it
+        key = (query_name,) + params
+        hit, result = self.cache.get(key, self.graph_version())
+        if not hit:
+            result = getattr(self.store, query_name)(*params)
+            self.cache.put(key, result)
+        return list(result)
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def index_functions(self, func_names, max_depth=None):
+        ##precompute transitive callers + callees of hot functions (max_depth None -> whole reach)
+        self.reachability.build(self.store, func_names, max_depth)
+        return self.reachability.stats()
+
+    def transitive(self, func_name, max_depth, incoming):
+        #reachability index first, then a bounded BFS through the cache
+        rows = self.reachability.lookup(func_name, max_depth, incoming, self.graph_version())
+        if rows is not None:
+            return rows
+        return self.cached('transitive_callers' if incoming else 'transitive_callees', func_name, max_depth)
     
     def query_functions_in_file(self, filename):
         ##find total no.of functions in file
-        with self.neo4j.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (f:File {name: $filename})-[:CONTAINS]->(func:Function)
-                RETURN func.name as function_name, func.line_number as line
-                """,
-                filename=filename
-            )
-            
-            functions = [(record['function_name'], record['line']) for record in result]
-            if functions:
-                for func_name, line in functions:
-                    print(f"#{func_name} (line {line})")
-                print(f"\nTotal: {len(functions)} functions")
-            else:
-                print(f"No functions found")  
-            return functions
+        functions = self.cached('functions_in_file', filename)
+        if functions:
+            for func_name, line in functions:
+                print(f"#{func_name} (line {line})")
+            print(f"\nTotal: {len(functions)} functions")
+        else:
+            print(f"No functions found")  
+        return functions
     
     def query_files_with_variable(self, var_name):
         ##Find files where var x is used 
-        with self.neo4j.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (f:File)-[:CONTAINS]->(v:Variable {name: $var_name})
-                RETURN DISTINCT f.name as file_name, f.path as file_path
-                """,
-                var_name=var_name
-            )
-            files = [(record['file_name'], record['file_path']) for record in result]
-            if files:
-                for file_name, file_path in files:
-                    print(f"File name:{file_name}")
-                    print(f"File path:({file_path})")
-            else:
-                print(f"Variable '{var_name}' not found")
-            
-            return files
+        files = self.cached('files_with_variable', var_name)
+        if files:
+            for file_name, file_path in files:
+                print(f"File name:{file_name}")
+                print(f"File path:({file_path})")
+        else:
+            print(f"Variable '{var_name}' not found")
+        
+        return files
     
     def query_function_callers(self, func_name):
        ##which function calls function x 
-        with self.neo4j.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (caller:Function)-[:CALLS]->(callee:Function {name: $func_name})
-                RETURN caller.name as caller_name, caller.file_path as caller_file
-                """,
-                func_name=func_name
-            ) 
-            callers = [(record['caller_name'], record['caller_file']) for record in result]
+        callers = self.cached('function_callers', func_name)
 
-            if callers:
-                for caller_name, caller_file in callers:
-                    print(f"{caller_name}")
-                    print(f"(in {caller_file})")
-            else:
-                print(f"No callers found")
-            
-            return callers
+        if callers:
+            for caller_name, caller_file in callers:
+                print(f"{caller_name}")
+                print(f"(in {caller_file})")
+        else:
+            print(f"No callers found")
+        
+        return callers
     
     def query_function_calls(self, func_name):
         #which function does x call
-        with self.neo4j.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (caller:Function {name: $func_name})-[:CALLS]->(callee:Function)
-                RETURN callee.name as callee_name, callee.file_path as callee_file
-                """,
-                func_name=func_name
-            )
-            
-            callees = [(record['callee_name'], record['callee_file']) for record in result]
-            if callees:
-                for callee_name, callee_file in callees:
-                    print(f"{callee_name}")
-                    print(f"(in {callee_file})")
-            else:
-                print(f"function doesn't call any other functions")
-            return callees
+        callees = self.cached('function_calls', func_name)
+        if callees:
+            for callee_name, callee_file in callees:
+                print(f"{callee_name}")
+                print(f"(in {callee_file})")
+        else:
+            print(f"function doesn't call any other functions")
+        return callees
     
     def query_class_methods(self, class_name):
         ##what methods are in class x
-        with self.neo4j.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (c:Class {name: $class_name})-[:HAS_METHOD]->(m:Function)
-                RETURN m.name as method_name, m.line_number as line
-                """,
-                class_name=class_name
-            )           
-            methods = [(record['method_name'], record['line']) for record in result]
-            if methods:
-                for method_name, line in methods:
-                    print(f"{method_name} (line {line})")
-            else:
-                print(f"no methods found")
-            return methods
+        methods = self.cached('class_methods', class_name)
+        if methods:
+            for method_name, line in methods:
+                print(f"{method_name} (line {line})")
+        else:
+            print(f"no methods found")
+        return methods
     
     def query_file_imports(self, filename):
         ##what does file x import
-        with self.neo4j.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (f:File {name: $filename})-[:IMPORTS]->(i:Import)
-                RETURN i.module_name as module, i.import_type as import_type
-                """,
-                filename=filename
-            )            
-            imports = [(record['module'], record['import_type']) for record in result]
-            if imports:
-                for module, import_type in imports:
-                    print(f"   - {module} ({import_type})")
-            else:
-                print(f"No imports found")
-            
-            return imports
+        imports = self.cached('file_imports', filename)
+        if imports:
+            for module, import_type in imports:
+                print(f"   - {module} ({import_type})")
+        else:
+            print(f"No imports found")
+        
+        return imports
     
     def query_all_files(self):
         ##list of all files
-        with self.neo4j.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (f:File)
-                RETURN f.name as name, f.path as path
-                ORDER BY f.name
-                """
-            )
-            
-            files = [(record['name'], record['path']) for record in result]
-            for name in files:
-                print(f"{name}")
-            print(f"\nTotal: {len(files)} files")
-            
-            return files
+        files = self.cached('all_files')
+        for name in files:
+            print(f"{name}")
+        print(f"\nTotal: {len(files)} files")
+        
+        return files
     
     def query_all_functions(self):
         """List all functions in the knowledge graph"""
-        with self.neo4j.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (func:Function)
-                RETURN func.name as name, func.file_path as file
-                ORDER BY func.name
-                """
-            )
-            
-            functions = [(record['name'], record['file']) for record in result]
-            
-            print(f"\n⚙️  All functions:")
-            for name, file in functions:
-                print(f"   - {name} (in {file})")
-            print(f"\nTotal: {len(functions)} functions")
-            
-            return functions
+        functions = self.cached('all_functions')
+        
+        print(f"\n⚙️  All functions:")
+        for name, file in functions:
+            print(f"   - {name} (in {file})")
+        print(f"\nTotal: {len(functions)} functions")
+        
+        return functions
     
+    def query_transitive_callers(self, func_name, max_depth=5):
+        ##everything that reaches function x within max_depth calls -> impact of changing x
+        callers = self.transitive(func_name, max_depth, incoming=True)
+        if callers:
+            for name, file, line, depth in callers:
+                print(f"{'  ' * (depth - 1)}{name} (in {file}, line {line}) depth {depth}")
+            print(f"\nTotal: {len(callers)} functions")
+        else:
+            print(f"No callers found")
+        return callers
+
+    def query_transitive_callees(self, func_name, max_depth=5):
+        ##everything function x reaches within max_depth calls
+        callees = self.transitive(func_name, max_depth, incoming=False)
+        if callees:
+            for name, file, line, depth in callees:
+                print(f"{'  ' * (depth - 1)}{name} (in {file}, line {line}) depth {depth}")
+            print(f"\nTotal: {len(callees)} functions")
+        else:
+            print(f"function doesn't call any other functions")
+        return callees
+
+    def query_call_path(self, source, target, max_depth=10):
+        ##shortest chain of calls from x to y
+        path = self.cached('shortest_call_path', source, target, max_depth)
+        if path:
+            for name, file, line in path:
+                print(f"-> {name} (in {file}, line {line})")
+            print(f"\nLength: {len(path) - 1} calls")
+        else:
+            print(f"No call path within {max_depth} calls")
+        return path
+
+    def query_call_cycles(self):
+        ##recursion: groups of functions that call each other in a cycle
+        cycles = self.cached('call_cycles')
+        for cycle in cycles:
+            print(" <-> ".join(f"{name} ({file})" for name, file, line in cycle))
+        print(f"\nTotal: {len(cycles)} cycles")
+        return cycles
+
     def custom_query(self, cypher_query):
-        with self.neo4j.driver.session() as session:
-            result = session.run(cypher_query)
-            records = [dict(record) for record in result]
-            for record in records:
-                print(f"{record}")
-            print(f"\nTotal: {len(records)} results")
-            
-            return records
+        #not cached -> any cypher, may write
+        records = self.store.custom_query(cypher_query)
+        if WRITE_CLAUSES.search(cypher_query):
+            #graph may have changed -> bump the version so every GraphQuery (this one + other processes) drops its cache
+            self.store.write_batches(GRAPH_VERSION, [{}])
+            self.graph_version(refresh=True)
+        for record in records:
+            print(f"{record}")
+        print(f"\nTotal: {len(records)} results")
+        
+        return records
     
     def close(self):
-        self.neo4j.close()
+        self.store.close()
 
 def query():
-    queryer = GraphQuery() 
+    arg_parser = argparse.ArgumentParser(description="Query the knowledge graph")
+    arg_parser.add_argument("--sqlite", metavar="PATH", help="query a graph saved by main.py --sqlite instead of neo4j")
+    arg_parser.add_argument("--cache-size", type=int, default=256, help="query results kept, 0 turns caching off")
+    arg_parser.add_argument("--cache-ttl", type=float, default=60.0, help="seconds a cached result stays valid")
+    arg_parser.add_argument("--version-interval", type=float, default=1.0, help="seconds between graph version checks (neo4j round trip)")
+    args = arg_parser.parse_args()
+    store = MemoryStore(args.sqlite) if args.sqlite else None
+    queryer = GraphQuery(
+        store, cache_size=args.cache_size, cache_ttl=args.cache_ttl, version_interval=args.version_interval
+    )
     print("==KG QUERY==")
     while True:
         print("1.Find all functions in the file")
@@ -186,6 +225,11 @@ def query():
         print("7.List all files")
         print("8.List all functions")
         print("9.Custom Cypher query")
+        print("10.Cache stats")
+        print("11.Everything that reaches function x (impact)")
+        print("12.Everything function x reaches")
+        print("13.Shortest call path from x to y")
+        print("14.Recursion cycles")
         print("0.Exit")
         
         choice = input("\noption: ").strip()
@@ -221,6 +265,31 @@ def query():
                 queryer.custom_query(query)
             except Exception as e:
                 print(f"Query error: {e}")
+        elif choice == '10':
+            for name, value in queryer.cache_stats().items():
+                print(f"{name}: {value}")
+        elif choice in ('11', '12'):
+            func_name = input("Enter function: ").strip()
+            #not a number -> ask again instead of ending the session
+            while True:
+                try:
+                    max_depth = int(input("Max depth [5]: ").strip() or 5)
+                except ValueError:
+                    print("Max depth must be a whole number")
+                    continue
+                if max_depth >= 1:
+                    break
+                print("Max depth must be at least 1")
+            if choice == '11':
+                queryer.query_transitive_callers(func_name, max_depth)
+            else:
+                queryer.query_transitive_callees(func_name, max_depth)
+        elif choice == '13':
+            source = input("From function: ").strip()
+            target = input("To function: ").strip()
+            queryer.query_call_path(source, target)
+        elif choice == '14':
+            queryer.query_call_cycles()
         else:
             print("Invalid option")
     
@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from array import array
+import numpy as np
+from graph_store import NODE_KEYS
+
+##read only copy of the call graph for whole graph analytics
+##nodes are ints, every relation in CSR form (offsets + targets, both directions) as numpy arrays
+##names / paths interned once in a sorted string table -> lookups are a binary search
+##saved as one .npy per array -> loaded with mmap, nothing read until touched
+
+#relations in a snapshot, every function / class / var is CONTAINed by its file -> all of them are nodes
+#CALLS_UNRESOLVED -> UnresolvedCall nodes too (name only), dead code analysis matches functions on them
+RELATIONS = ('CALLS', 'CONTAINS', 'HAS_METHOD', 'CALLS_UNRESOLVED')
+LABELS = list(NODE_KEYS)
+FORMAT_VERSION = 1
+
+
+class GraphSnapshot:
+    def __init__(self, arrays, meta):
+        #array name -> numpy array (in memory or memory mapped)
+        self.arrays = arrays
+        self.meta = meta
+        self.node_count = meta['nodes']
+
+    def edge_count(self, rel_type):
+        return self.meta['edges'][rel_type]
+
+    def string(self, string_id):
+        if string_id < 0:
+            return None
+        offsets = self.arrays['string_offsets']
+        return bytes(self.arrays['string_data'][offsets[string_id]:offsets[string_id + 1]]).decode('utf-8')
+
+    def string_id(self, text):
+        ##binary search of the sorted table -> id or -1
+        target = text.encode('utf-8')
+        offsets, data = self.arrays['string_offsets'], self.arrays['string_data']
+        low, high = 0, len(offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            value = bytes(data[offsets[middle]:offsets[middle + 1]])
+            if value < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(offsets) - 1 and bytes(data[offsets[low]:offsets[low + 1]]) == target:
+            return low
+        return -1
+
+    def node(self, node_id):
+        #-> (label, name, file path, line number) like GraphStore.relationship_edges
+        line = int(self.arrays['node_line'][node_id])
+        return (
+            LABELS[self.arrays['node_label'][node_id]],
+            self.string(int(self.arrays['node_name'][node_id])),
+            self.string(int(self.arrays['node_file'][node_id])),
+            None if line < 0 else line
+        )
+
+    def label_ids(self, label):
+        #-> node ids with that label
+        return np.flatnonzero(self.arrays['node_label'] == LABELS.index(label))
+
+    def find(self, name, label=None):
+        #-> node ids called name (optionally only of one label)
+        string_id = self.string_id(name)
+        if string_id < 0:
+            return np.empty(0, dtype=np.int64)
+        mask = self.arrays['node_name'] == string_id
+        if label is not None:
+            mask &= self.arrays['node_label'] == LABELS.index(label)
+        return np.flatnonzero(mask)
+
+    def csr(self, rel_type, incoming=False):
+        #-> (offsets, targets): neighbours of node i = targets[offsets[i]:offsets[i + 1]]
+        prefix = f"{rel_type.lower()}_{'in' if incoming else 'out'}"
+        return self.arrays[prefix + '_offsets'], self.arrays[prefix + '_targets']
+
+    def neighbours(self, rel_type, node_id, incoming=False):
+        offsets, targets = self.csr(rel_type, incoming)
+        return targets[offsets[node_id]:offsets[node_id + 1]]
+
+    def degrees(self, rel_type, incoming=False):
+        #-> out (or in) degree of every node, one vector op
+        return np.diff(self.csr(rel_type, incoming)[0])
+
+    def save(self, path):
+        #one .npy per array + meta.json, written next to path then swapped in
+        tmp_path = path + '.tmp'
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        for name, values in self.arrays.items():
+            np.save(os.path.join(tmp_path, name + '.npy'), values)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+
+def build_snapshot(store, relations=RELATIONS):
+    ##one pass over the store's relationships -> GraphSnapshot
+    #nodes / strings interned while streaming, edges kept as int arrays, never as records
+    node_ids = {}
+    strings = {}
+    node_label, node_name, node_file, node_line = array('B'), array('i'), array('i'), array('i')
+
+    def intern(text):
+        if text is None:
+            return -1
+        string_id = strings.get(text)
+        if string_id is None:
+            string_id = strings[text] = len(strings)
+        return string_id
+
+    def node_id(record):
+        found = node_ids.get(record)
+        if found is None:
+            found = node_ids[record] = len(node_ids)
+            label, name, file_path, line_number = record
+            node_label.append(LABELS.index(label))
+            node_name.append(intern(name))
+            node_file.append(intern(file_path))
+            node_line.append(-1 if line_number is None else line_number)
+        return found
+
+    edges = {}
+    for rel_type in relations:
+        sources, targets = array('i'), array('i')
+        for src, dst in store.relationship_edges(rel_type):
+            sources.append(node_id(src))
+            targets.append(node_id(dst))
+        edges[rel_type] = (sources, targets)
+
+    #string table sorted by utf-8 bytes -> ids remapped to sorted order
+    encoded = [text.encode('utf-8') for text in strings]
+    order = sorted(range(len(encoded)), key=encoded.__getitem__)
+    remap = np.empty(len(order) + 1, dtype=np.int32)
+    remap[np.array(order, dtype=np.int64)] = np.arange(len(order), dtype=np.int32)
+    #-1 (no string) stays -1
+    remap[-1] = -1
+    lengths = np.array([len(encoded[i]) for i in order], dtype=np.int64)
+    string_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=string_offsets[1:])
+
+    node_count = len(node_ids)
+    arrays = {
+        'node_label': np.frombuffer(node_label, dtype=np.uint8).copy(),
+        'node_name': remap[np.frombuffer(node_name, dtype=np.int32)],
+        'node_file': remap[np.frombuffer(node_file, dtype=np.int32)],
+        'node_line': np.frombuffer(node_line, dtype=np.int32).copy(),
+        'string_offsets': string_offsets,
+        'string_data': np.frombuffer(b''.join(encoded[i] for i in order), dtype=np.uint8).copy()
+    }
+    for rel_type, (sources, targets) in edges.items():
+        sources = np.frombuffer(sources, dtype=np.int32)
+        targets = np.frombuffer(targets, dtype=np.int32)
+        prefix = rel_type.lower()
+        arrays[prefix + '_out_offsets'], arrays[prefix + '_out_targets'] = csr(sources, targets, node_count)
+        arrays[prefix + '_in_offsets'], arrays[prefix + '_in_targets'] = csr(targets, sources, node_count)
+
+    meta = {
+        'format': FORMAT_VERSION,
+        'graph_version': store.graph_version(),
+        'labels': LABELS,
+        'relations': list(relations),
+        'nodes': node_count,
+        'strings': len(order),
+        'edges': {rel_type: len(sources) for rel_type, (sources, _) in edges.items()}
+    }
+    return GraphSnapshot(arrays, meta)
+
+def csr(sources, targets, node_count):
+    ##edge list -> (offsets int64 [node_count + 1], targets int32 grouped by source)
+    order = np.argsort(sources, kind='stable')
+    offsets = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=node_count), out=offsets[1:])
+    return offsets, targets[order]
+
+def load_snapshot(path, mmap=True):
+    ##saved snapshot -> GraphSnapshot, arrays memory mapped unless mmap=False
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('format') != FORMAT_VERSION:
+        raise ValueError(f"snapshot {path} has format {meta.get('format')}, expected {FORMAT_VERSION}")
+    arrays = {}
+    for name in os.listdir(path):
+        if name.endswith('.npy'):
+            arrays[name[:-4]] = np.load(os.path.join(path, name), mmap_mode='r' if mmap else None)
+    return GraphSnapshot(arrays, meta)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Save a CSR snapshot of the call graph")
+    arg_parser.add_argument("output_dir")
+    arg_parser.add_argument("--sqlite", metavar="PATH", help="snapshot a graph saved by main.py --sqlite instead of neo4j")
+    args = arg_parser.parse_args()
+    if args.sqlite:
+        from memory_store import MemoryStore
+        store = MemoryStore(args.sqlite)
+    else:
+        from neo4j_client import Neo4jClient
+        store = Neo4jClient()
+    start = time.perf_counter()
+    snapshot = build_snapshot(store)
+    store.close()
+    snapshot.save(args.output_dir)
+    print(f"Snapshot written to {args.output_dir} in {time.perf_counter() - start:.2f}s")
+    print("Nodes:", snapshot.node_count)
+    for rel_type in RELATIONS:
+        print(f"{rel_type}:", snapshot.edge_count(rel_type))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,687 @@
+from call_resolver import CallResolver, PendingCalls, import_targets, module_suffixes, module_names, relative_targets
+from call_graph import reachable, reach_rows, shortest_path, strongly_connected_components
+
+##node key of every label = the properties its MERGE matches on
+##each gets a uniqueness constraint -> MERGE is an index lookup, not a label scan
+NODE_KEYS = {
+    'File': ('path',),
+    'Function': ('name', 'file_path', 'line_number'),
+    'Class': ('name', 'file_path'),
+    'Variable': ('name', 'file_path'),
+    'Import': ('module_name',),
+    'UnresolvedCall': ('name',),
+    'GraphVersion': ('name',)
+}
+
+#keys of CodeParser all_data / per file results
+ENTITY_KEYS = ['files', 'functions', 'classes', 'variables', 'imports', 'calls']
+
+##write ops, written as the cypher Neo4jClient / AsyncNeo4jClient send (one UNWIND $rows per batch)
+##MemoryStore applies the same ops in python -> every backend builds the same graph
+##each op has a *_rows function turning parsed records into its rows
+
+#create/update file node w file path
+FILE_NODES = """
+UNWIND $rows AS row
+MERGE (f:File {path: row.path})
+SET f.name = row.name
+"""
+
+##create function node on name, file path n line (same name twice in a file = 2 functions)
+##link function to params -> func DEFINES param
+##link function to file that has it -> file CONTAINS func
+FUNCTION_NODES = """
+UNWIND $rows AS row
+MERGE (func:Function {name: row.name, file_path: row.file_path, line_number: row.line_number})
+SET func.parent_class = row.parent_class
+FOREACH (param IN row.parameters |
+    MERGE (v:Variable {name: param, file_path: row.file_path})
+    MERGE (func)-[:DEFINES]->(v)
+)
+WITH func, row
+MATCH (f:File {path: row.file_path})
+MERGE (f)-[:CONTAINS]->(func)
+"""
+
+#create class node on name and file path, file CONTAINS class
+CLASS_NODES = """
+UNWIND $rows AS row
+MERGE (c:Class {name: row.name, file_path: row.file_path})
+SET c.line_number = row.line_number
+WITH c, row
+MATCH (f:File {path: row.file_path})
+MERGE (f)-[:CONTAINS]->(c)
+"""
+
+#create var node on name and file path -- same var in diff files, file CONTAINS var
+VARIABLE_NODES = """
+UNWIND $rows AS row
+MERGE (v:Variable {name: row.name, file_path: row.file_path})
+SET v.line_number = row.line_number
+WITH v, row
+MATCH (f:File {path: row.file_path})
+MERGE (f)-[:CONTAINS]->(v)
+"""
+
+#link method to parent class
+HAS_METHOD = """
+UNWIND $rows AS row
+MATCH (c:Class {name: row.class_name, file_path: row.file_path})
+MATCH (m:Function {name: row.method_name, file_path: row.file_path, line_number: row.line_number})
+MERGE (c)-[:HAS_METHOD]->(m)
+"""
+
+#import node on module name, shared by all files -> created once, then linked
+IMPORT_NODES = """
+UNWIND $rows AS row
+MERGE (i:Import {module_name: row.module_name})
+SET i.import_type = row.import_type
+"""
+
+FILE_IMPORTS = """
+UNWIND $rows AS row
+MATCH (f:File {path: row.file_path})
+MATCH (i:Import {module_name: row.module_name})
+MERGE (f)-[:IMPORTS]->(i)
+"""
+
+#caller CALLS callee, both matched on their node key
+CALLS = """
+UNWIND $rows AS row
+MATCH (caller:Function {name: row.caller, file_path: row.caller_file, line_number: row.caller_line})
+MATCH (callee:Function {name: row.callee, file_path: row.callee_file, line_number: row.callee_line})
+MERGE (caller)-[:CALLS]->(callee)
+"""
+
+#callee not found in codebase -> one UnresolvedCall node per name
+UNRESOLVED_CALL_NODES = """
+UNWIND $rows AS row
+MERGE (u:UnresolvedCall {name: row.name})
+"""
+
+UNRESOLVED_CALLS = """
+UNWIND $rows AS row
+MATCH (caller:Function {name: row.caller, file_path: row.caller_file, line_number: row.caller_line})
+MATCH (u:UnresolvedCall {name: row.callee})
+MERGE (caller)-[:CALLS_UNRESOLVED]->(u)
+"""
+
+##per file sync ops -> nodes addressed by the id GraphStore.file_subgraph returned (elementId in neo4j)
+DELETE_RELATIONSHIPS = """
+UNWIND $rows AS row
+MATCH (a)-[r]->(b)
+WHERE elementId(a) = row.src AND elementId(b) = row.dst AND type(r) = row.type
+DELETE r
+"""
+
+DELETE_NODES = """
+UNWIND $rows AS row
+MATCH (n)
+WHERE elementId(n) = row.id
+DETACH DELETE n
+"""
+
+#null value -> property removed
+SET_NODE_PROPS = """
+UNWIND $rows AS row
+MATCH (n)
+WHERE elementId(n) = row.id
+SET n += row.props
+"""
+
+#imports / unresolved calls are shared by name -> removed once nothing points to them
+DELETE_ORPHANS = """
+UNWIND $rows AS row
+MATCH (n)
+WHERE elementId(n) = row.id AND NOT ()-->(n)
+DELETE n
+"""
+
+#one node holding a counter, bumped after every ingestion -> readers know cached results are stale
+GRAPH_VERSION = """
+UNWIND $rows AS row
+MERGE (g:GraphVersion {name: 'graph'})
+SET g.version = coalesce(g.version, 0) + 1
+"""
+
+#short name of every write op -> metrics labels
+OP_NAMES = {
+    FILE_NODES: 'file_nodes', FUNCTION_NODES: 'function_nodes', CLASS_NODES: 'class_nodes',
+    VARIABLE_NODES: 'variable_nodes', HAS_METHOD: 'has_method', IMPORT_NODES: 'import_nodes',
+    FILE_IMPORTS: 'file_imports', CALLS: 'calls', UNRESOLVED_CALL_NODES: 'unresolved_call_nodes',
+    UNRESOLVED_CALLS: 'unresolved_calls', DELETE_RELATIONSHIPS: 'delete_relationships',
+    DELETE_NODES: 'delete_nodes', SET_NODE_PROPS: 'set_node_props', DELETE_ORPHANS: 'delete_orphans',
+    GRAPH_VERSION: 'graph_version'
+}
+
+def op_name(query):
+    return OP_NAMES.get(query, 'other')
+
+
+def file_rows(files):
+    return [{'path': file['path'], 'name': file['name']} for file in files]
+
+def function_rows(functions):
+    return [
+        {
+            'name': func['name'],
+            'file_path': func['file_path'],
+            'line_number': func['line_number'],
+            'parent_class': func.get('parent_class'),
+            'parameters': func.get('parameters', [])
+        }
+        for func in functions
+    ]
+
+def class_rows(classes):
+    return [{'name': c['name'], 'file_path': c['file_path'], 'line_number': c['line_number']} for c in classes]
+
+def variable_rows(variables):
+    return [{'name': var['name'], 'file_path': var['file_path'], 'line_number': var['line_number']} for var in variables]
+
+def method_rows(functions):
+    #only funcs that have a parent class
+    return [
+        {
+            'class_name': func['parent_class'],
+            'method_name': func['name'],
+            'file_path': func['file_path'],
+            'line_number': func['line_number']
+        }
+        for func in functions if func.get('parent_class')
+    ]
+
+def import_node_rows(imports):
+    #one row per module, last import_type wins like repeated MERGE + SET
+    import_types = {imp['module_name']: imp['import_type'] for imp in imports}
+    return [{'module_name': module, 'import_type': import_type} for module, import_type in import_types.items()]
+
+def file_import_rows(imports):
+    pairs = {(imp['file_path'], imp['module_name']) for imp in imports}
+    return [{'file_path': file_path, 'module_name': module} for file_path, module in sorted(pairs)]
+
+def call_rows(resolved):
+    #same pair from many call sites -> one edge, so send each pair once
+    pairs = {
+        (caller['name'], caller['file_path'], caller['line_number'], callee['name'], callee['file_path'], callee['line_number'])
+        for caller, callee in resolved
+    }
+    return [
+        {
+            'caller': caller, 'caller_file': caller_file, 'caller_line': caller_line,
+            'callee': callee, 'callee_file': callee_file, 'callee_line': callee_line
+        }
+        for caller, caller_file, caller_line, callee, callee_file, callee_line in sorted(pairs)
+    ]
+
+def unresolved_call_node_rows(unresolved):
+    return [{'name': name} for name in sorted({callee for _, callee in unresolved})]
+
+def unresolved_call_rows(unresolved):
+    pairs = {(caller['name'], caller['file_path'], caller['line_number'], callee) for caller, callee in unresolved}
+    return [
+        {'caller': caller, 'caller_file': caller_file, 'caller_line': caller_line, 'callee': callee}
+        for caller, caller_file, caller_line, callee in sorted(pairs)
+    ]
+
+def node_ref(label, props):
+    #(label, node key) -> one node whatever backend it lives in
+    return (label, tuple(props[key] for key in NODE_KEYS[label]))
+
+def subgraph_facts(parsed_data, resolved, unresolved):
+    ##what the graph should hold for the parsed files, same result as the full build writes
+    #-> (nodes {ref: props outside the key}, edges {(src ref, rel type, dst ref)}, imports {module: import type})
+    nodes, edges, imports = {}, set(), {}
+    for row in file_rows(parsed_data['files']):
+        nodes[node_ref('File', row)] = {'name': row['name']}
+    for row in function_rows(parsed_data['functions']):
+        ref = node_ref('Function', row)
+        nodes[ref] = {'parent_class': row['parent_class']}
+        edges.add((('File', (row['file_path'],)), 'CONTAINS', ref))
+        for param in row['parameters']:
+            var = ('Variable', (param, row['file_path']))
+            #parameter only variables never get a line number
+            nodes.setdefault(var, {'line_number': None})
+            edges.add((ref, 'DEFINES', var))
+    for label, rows in (('Class', class_rows(parsed_data['classes'])), ('Variable', variable_rows(parsed_data['variables']))):
+        for row in rows:
+            ref = node_ref(label, row)
+            nodes[ref] = {'line_number': row['line_number']}
+            edges.add((('File', (row['file_path'],)), 'CONTAINS', ref))
+    for row in method_rows(parsed_data['functions']):
+        class_ref = ('Class', (row['class_name'], row['file_path']))
+        if class_ref in nodes:
+            edges.add((class_ref, 'HAS_METHOD', ('Function', (row['method_name'], row['file_path'], row['line_number']))))
+    for row in import_node_rows(parsed_data['imports']):
+        imports[row['module_name']] = row['import_type']
+    for row in file_import_rows(parsed_data['imports']):
+        edges.add((('File', (row['file_path'],)), 'IMPORTS', ('Import', (row['module_name'],))))
+    for row in call_rows(resolved):
+        edges.add((
+            ('Function', (row['caller'], row['caller_file'], row['caller_line'])),
+            'CALLS',
+            ('Function', (row['callee'], row['callee_file'], row['callee_line']))
+        ))
+    for row in unresolved_call_rows(unresolved):
+        edges.add((
+            ('Function', (row['caller'], row['caller_file'], row['caller_line'])), 'CALLS_UNRESOLVED', ('UnresolvedCall', (row['callee'],))
+        ))
+    return nodes, edges, imports
+
+def subgraph_diff(current, nodes, edges, imports):
+    ##current subgraph of some files (GraphStore.file_subgraph) vs subgraph_facts of their new parse
+    #-> (ops [(query, rows)] in the order they have to run, counts)
+    #functions are matched on (name, file, class) in line order -> code added above a function moves it
+    #instead of deleting + recreating it, calls from other files into it survive
+    owned, current_edges, shared_props, owned_callers = {}, {}, {}, {}
+    for record in current:
+        owned[node_ref(record['label'], record['props'])] = (record['id'], record['props'])
+        owned_callers[record['id']] = record['callers']
+    subgraph_files = {ref[1][0] for ref in owned if ref[0] == 'File'}
+    for record in current:
+        src = node_ref(record['label'], record['props'])
+        for rel_type, dst_id, dst_label, dst_props in record['out']:
+            dst = node_ref(dst_label, dst_props)
+            current_edges[(src, rel_type, dst)] = (record['id'], dst_id)
+            shared_props[dst] = dst_props
+
+    old_functions, new_functions = {}, {}
+    for ref, (_, props) in owned.items():
+        if ref[0] == 'Function':
+            old_functions.setdefault((ref[1][0], ref[1][1], props.get('parent_class')), []).append(ref)
+    for ref, props in nodes.items():
+        if ref[0] == 'Function':
+            new_functions.setdefault((ref[1][0], ref[1][1], props['parent_class']), []).append(ref)
+    moves = {}
+    for group, old_refs in old_functions.items():
+        for old, new in zip(sorted(old_refs), sorted(new_functions.get(group, []))):
+            if old != new:
+                moves[old] = new
+
+    def rename(ref):
+        return moves.get(ref, ref)
+
+    owned = {rename(ref): value for ref, value in owned.items()}
+    current_edges = {(rename(src), rel_type, rename(dst)): ids for (src, rel_type, dst), ids in current_edges.items()}
+
+    removed_nodes = [ref for ref in owned if ref not in nodes]
+    removed = set(removed_nodes)
+    #calls from other files into a removed function -> unresolved, like a full build would leave them
+    orphaned_calls = {
+        (node_ref('Function', caller_props), ref[1][0])
+        for ref in removed_nodes if ref[0] == 'Function'
+        for _, caller_props in owned_callers.get(owned[ref][0], [])
+        if caller_props['file_path'] not in subgraph_files
+    }
+    removed_edges = [edge for edge in current_edges if edge not in edges]
+    added_edges = sorted(edge for edge in edges if edge not in current_edges)
+
+    #line is part of the function key -> moved functions park on -line first,
+    #so no function ever takes a line another one still holds (two swapped functions included)
+    prop_rows = [{'id': owned[new][0], 'props': {'line_number': -new[1][2]}} for new in moves.values()]
+    prop_rows += [{'id': owned[new][0], 'props': {'line_number': new[1][2]}} for new in moves.values()]
+    for ref, props in nodes.items():
+        if ref in owned:
+            old_props = owned[ref][1]
+            changed = {key: value for key, value in props.items() if old_props.get(key) != value}
+            if changed:
+                prop_rows.append({'id': owned[ref][0], 'props': changed})
+
+    #rows for the usual write ops, only for what is missing
+    parameters = {}
+    for src, rel_type, dst in edges:
+        if rel_type == 'DEFINES':
+            parameters.setdefault(src, []).append(dst[1][0])
+    file_rows_added, function_rows_added, class_rows_added, variable_rows_added = {}, {}, {}, {}
+    writes = {query: [] for query in (HAS_METHOD, FILE_IMPORTS, CALLS, UNRESOLVED_CALLS)}
+    import_rows, unresolved_rows = {}, {}
+    for ref, props in nodes.items():
+        if ref[0] == 'File' and ref not in owned:
+            file_rows_added[ref] = {'path': ref[1][0], 'name': props['name']}
+    for src, rel_type, dst in added_edges:
+        if rel_type == 'CONTAINS' or rel_type == 'DEFINES':
+            #node op MERGEs the node and the edge, DEFINES comes with the function
+            ref = dst if rel_type == 'CONTAINS' else src
+            label, key = ref
+            if label == 'Function':
+                function_rows_added[ref] = {
+                    'name': key[0], 'file_path': key[1], 'line_number': key[2], 'parent_class': nodes[ref]['parent_class'],
+                    'parameters': sorted(parameters.get(ref, []))
+                }
+            else:
+                rows = class_rows_added if label == 'Class' else variable_rows_added
+                rows[ref] = {'name': key[0], 'file_path': key[1], 'line_number': nodes[ref]['line_number']}
+        elif rel_type == 'HAS_METHOD':
+            writes[HAS_METHOD].append({
+                'class_name': src[1][0], 'method_name': dst[1][0], 'file_path': dst[1][1], 'line_number': dst[1][2]
+            })
+        elif rel_type == 'IMPORTS':
+            writes[FILE_IMPORTS].append({'file_path': src[1][0], 'module_name': dst[1][0]})
+            import_rows[dst[1][0]] = {'module_name': dst[1][0], 'import_type': imports[dst[1][0]]}
+        elif rel_type == 'CALLS':
+            writes[CALLS].append({
+                'caller': src[1][0], 'caller_file': src[1][1], 'caller_line': src[1][2],
+                'callee': dst[1][0], 'callee_file': dst[1][1], 'callee_line': dst[1][2]
+            })
+        elif rel_type == 'CALLS_UNRESOLVED':
+            writes[UNRESOLVED_CALLS].append({
+                'caller': src[1][0], 'caller_file': src[1][1], 'caller_line': src[1][2], 'callee': dst[1][0]
+            })
+            unresolved_rows[dst[1][0]] = {'name': dst[1][0]}
+    for caller, callee in sorted(orphaned_calls):
+        writes[UNRESOLVED_CALLS].append({'caller': caller[1][0], 'caller_file': caller[1][1], 'caller_line': caller[1][2], 'callee': callee})
+        unresolved_rows[callee] = {'name': callee}
+    for module, import_type in imports.items():
+        old_props = shared_props.get(('Import', (module,)))
+        if old_props is not None and old_props.get('import_type') != import_type:
+            import_rows[module] = {'module_name': module, 'import_type': import_type}
+
+    #shared nodes an edge was taken from -> deleted if that was the last one
+    orphan_rows = [
+        {'id': current_edges[edge][1]} for edge in removed_edges if edge[2][0] in ('Import', 'UnresolvedCall')
+    ]
+    #deleted nodes take their edges along
+    edge_rows = [
+        {'src': current_edges[edge][0], 'type': edge[1], 'dst': current_edges[edge][1]}
+        for edge in removed_edges if edge[0] not in removed and edge[2] not in removed
+    ]
+    ops = [
+        (DELETE_RELATIONSHIPS, edge_rows),
+        (DELETE_NODES, [{'id': owned[ref][0]} for ref in removed_nodes]),
+        (SET_NODE_PROPS, prop_rows),
+        (FILE_NODES, list(file_rows_added.values())),
+        (FUNCTION_NODES, list(function_rows_added.values())),
+        (CLASS_NODES, list(class_rows_added.values())),
+        (VARIABLE_NODES, list(variable_rows_added.values())),
+        (HAS_METHOD, writes[HAS_METHOD]),
+        (IMPORT_NODES, list(import_rows.values())),
+        (FILE_IMPORTS, writes[FILE_IMPORTS]),
+        (CALLS, writes[CALLS]),
+        (UNRESOLVED_CALL_NODES, list(unresolved_rows.values())),
+        (UNRESOLVED_CALLS, writes[UNRESOLVED_CALLS]),
+        (DELETE_ORPHANS, orphan_rows)
+    ]
+    counts = {
+        'nodes_added': sum(1 for ref in nodes if ref not in owned),
+        'nodes_removed': len(removed_nodes),
+        'nodes_moved': len(moves),
+        'nodes_updated': len(prop_rows) - 2 * len(moves),
+        'edges_added': len(added_edges) + len(orphaned_calls),
+        'edges_removed': len(removed_edges)
+    }
+    return [(query, rows) for query, rows in ops if rows], counts
+
+def file_writes(parsed_data):
+    ##(query, rows) for everything keyed on a single file, in dependency order
+    ##-> batches of different files never MERGE the same node, safe to run at once
+    return [
+        (FILE_NODES, file_rows(parsed_data['files'])),
+        (FUNCTION_NODES, function_rows(parsed_data['functions'])),
+        (CLASS_NODES, class_rows(parsed_data['classes'])),
+        (VARIABLE_NODES, variable_rows(parsed_data['variables'])),
+        (HAS_METHOD, method_rows(parsed_data['functions']))
+    ]
+
+
+##storage backend interface
+##write side: a backend only implements write_batches(op, rows), build_graph/write_stream are shared
+##read side: one method per GraphQuery.query_* -> lists of tuples
+class GraphStore:
+    #rows per write_batches call
+    batch_size = 1000
+    #True -> graph_version is an in process lookup, cheap enough for GraphQuery to read on every cached query
+    version_is_local = False
+
+    def write_batches(self, query, rows, **params):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def create_file_nodes(self, files):
+        #create/update file node w file path
+        self.write_batches(FILE_NODES, file_rows(files))
+    
+    def create_function_nodes(self, functions):
+        ##create function node, link to params + file
+        self.write_batches(FUNCTION_NODES, function_rows(functions))
+    
+    def create_class_nodes(self, classes):
+        #create class node, link to file
+        self.write_batches(CLASS_NODES, class_rows(classes))
+    
+    def create_call_relationships(self, calls, resolver):
+        #calls resolved client side (file, class, imports) -> only exact caller CALLS callee pairs written
+        resolved, unresolved = resolver.resolve(calls)
+        self.write_calls(resolved, unresolved)
+
+    def write_calls(self, resolved, unresolved):
+        ##resolved (caller, callee) pairs + unresolved (caller, callee name) from CallResolver
+        self.write_batches(CALLS, call_rows(resolved))
+        #builtins, libraries, dynamic calls -> one UnresolvedCall node per callee name
+        self.write_batches(UNRESOLVED_CALL_NODES, unresolved_call_node_rows(unresolved))
+        self.write_batches(UNRESOLVED_CALLS, unresolved_call_rows(unresolved))
+    
+    def create_import_nodes(self, imports):
+        ##create import node on module name, file IMPORTS import
+        self.write_batches(IMPORT_NODES, import_node_rows(imports))
+        self.write_batches(FILE_IMPORTS, file_import_rows(imports))
+        
+    def create_variable_nodes(self, variables):
+        #create var node, link to file
+        self.write_batches(VARIABLE_NODES, variable_rows(variables))
+
+    def link_methods_to_classes(self, functions):
+        #link method to parent class
+        self.write_batches(HAS_METHOD, method_rows(functions))
+
+    def build_graph(self, parsed_data, resolver=None):
+        #create nodes + relationships
+        #resolver -> symbol table for calls, built from parsed_data when not given
+        if resolver is None:
+            resolver = CallResolver(parsed_data)
+        self.write_nodes(parsed_data)
+        self.create_call_relationships(parsed_data['calls'], resolver)
+        self.bump_version()
+
+    def write_nodes(self, parsed_data):
+        ##everything except calls -> only needs the files in parsed_data
+        for query, rows in file_writes(parsed_data):
+            self.write_batches(query, rows)
+        self.create_import_nodes(parsed_data['imports'])
+
+    def write_stream(self, file_results, resolver=None):
+        ##sink for CodeParser.iter_parse_codebase -> write while parsing, memory bounded by batch_size
+        ##nodes are flushed every ~batch_size entities, calls parked on disk until all symbols are known
+        #-> totals of what was written, all_data keys
+        resolver = resolver or CallResolver({})
+        pending_calls = PendingCalls()
+        totals = {key: 0 for key in ENTITY_KEYS}
+        batch = {key: [] for key in ENTITY_KEYS}
+        batch_rows = 0
+
+        for result in file_results:
+            for key in ENTITY_KEYS:
+                values = result.get(key, [])
+                batch[key].extend(values)
+                totals[key] += len(values)
+                batch_rows += len(values)
+            #whole files per batch -> class + its methods always flushed together
+            if batch_rows >= self.batch_size:
+                self.flush_stream_batch(batch, resolver, pending_calls)
+                batch = {key: [] for key in ENTITY_KEYS}
+                batch_rows = 0
+        self.flush_stream_batch(batch, resolver, pending_calls)
+
+        for resolved, unresolved in pending_calls.resolve(resolver):
+            self.write_calls(resolved, unresolved)
+        self.bump_version()
+        return totals
+
+    def flush_stream_batch(self, batch, resolver, pending_calls):
+        self.write_nodes(batch)
+        resolver.add_symbols(batch, slim=True)
+        pending_calls.add(batch['calls'])
+
+    def update_files(self, parsed_data, changed_files, deleted_files, parse_files=None):
+        ##incremental update: sync subgraph of changed files with their new parse, remove deleted files
+        ##parsed_data only holds changed files -> cost follows the size of the change, not of the repo
+        ##current subgraph diffed against the new one, only adds / removes written, all in one transaction
+        ##parse_files(paths) -> all_data of those files: unchanged files importing a changed one are parsed again
+        ##+ synced too, their calls may resolve differently now (g added to b -> a's g() is no longer unresolved)
+        #-> counts of what changed
+        file_paths = list(changed_files) + list(deleted_files)
+        if not file_paths:
+            return {}
+
+        if parse_files is not None:
+            dependents = sorted(self.dependent_files(file_paths))
+            if dependents:
+                extra = parse_files(dependents)
+                parsed_data = {
+                    key: list(parsed_data.get(key, [])) + list(extra.get(key, []))
+                    for key in set(parsed_data) | set(extra)
+                }
+                #a dependent that failed to parse keeps its old subgraph
+                file_paths += [file['path'] for file in extra['files']]
+
+        #calls from changed files can target unchanged files -> resolver needs the symbols of what they import
+        resolver = CallResolver(parsed_data)
+        excluded = set(file_paths)
+        #only files the imports can point to are looked up, not the File list of the whole repo
+        imported = self.imported_files(parsed_data['imports'])
+        resolver.add_symbols({'files': [{'path': path} for path in imported if path not in excluded]})
+        resolver.add_symbols(self.fetch_symbols(resolver.imported_files(parsed_data['imports']) - excluded))
+        resolved, unresolved = resolver.resolve(parsed_data['calls'])
+
+        ops, counts = subgraph_diff(self.file_subgraph(file_paths), *subgraph_facts(parsed_data, resolved, unresolved))
+        if ops:
+            self.write_transaction(ops + [(GRAPH_VERSION, [{}])])
+        return counts
+
+    def dependent_files(self, file_paths):
+        ##files outside file_paths with an import that can point to one of them
+        ##(same matching as CallResolver.module_files) -> the only files whose calls can resolve into them
+        targets = set(file_paths)
+        names = {name for path in targets for name in module_names(path)}
+        #relative imports end like the module (.b, ..pkg.b) or are only dots (from . import x -> __init__.py)
+        endings = {'.' + name.rsplit('.', 1)[-1] for name in names}
+        found = set()
+        for file_path, module_name in self.files_importing(names, endings):
+            if file_path in targets:
+                continue
+            if not module_name.startswith('.') or targets.intersection(relative_targets(module_name, file_path)):
+                found.add(file_path)
+        return found
+
+    def imported_files(self, imports):
+        ##files in the graph import records can point to (CallResolver.module_files candidates)
+        #relative imports -> exact paths, dotted names -> every file whose path ends like the module
+        paths, names = import_targets(imports)
+        suffixes = [suffix for name in names for suffix in module_suffixes(name)]
+        return [
+            path for path in self.files_ending_with(list(paths) + suffixes)
+            if path in paths or names.intersection(module_names(path))
+        ]
+
+    def write_transaction(self, ops):
+        #[(query, rows)] applied in order, backends with transactions make it all or nothing
+        for query, rows in ops:
+            self.write_batches(query, rows)
+
+    def file_subgraph(self, file_paths):
+        #-> [{'id', 'label', 'props', 'out': [[rel type, dst id, dst label, dst props]], 'callers': [[id, props]]}]
+        #for the file nodes + everything defined in them, callers = functions with CALLS into the node
+        raise NotImplementedError
+
+    def fetch_symbols(self, file_paths):
+        #-> {'functions', 'classes'} already in the graph for file_paths (CallResolver input)
+        raise NotImplementedError
+
+    def files_ending_with(self, suffixes):
+        #-> paths of File nodes ending with one of suffixes (a/b.py), looked up through the file name
+        raise NotImplementedError
+
+    def files_importing(self, module_names, endings):
+        #-> [(file path, module name)] of IMPORTS edges to module_names,
+        #or to relative modules (leading dot) ending with one of endings / made of dots only
+        raise NotImplementedError
+
+    def bump_version(self):
+        #graph changed -> GraphQuery caches drop what they hold
+        self.write_batches(GRAPH_VERSION, [{}])
+
+    ##queries
+    def graph_version(self):
+        #-> counter bumped by every ingestion, 0 for a graph never written
+        raise NotImplementedError
+
+    def functions_in_file(self, filename):
+        #-> [(function name, line)] of functions in files named filename
+        raise NotImplementedError
+
+    def files_with_variable(self, var_name):
+        #-> [(file name, file path)] of files containing variable var_name
+        raise NotImplementedError
+
+    def function_callers(self, func_name):
+        #-> [(caller name, caller file)] of functions calling func_name
+        raise NotImplementedError
+
+    def function_calls(self, func_name):
+        #-> [(callee name, callee file)] of functions func_name calls
+        raise NotImplementedError
+
+    def class_methods(self, class_name):
+        #-> [(method name, line)] of methods of class_name
+        raise NotImplementedError
+
+    def file_imports(self, filename):
+        #-> [(module, import type)] imported by files named filename
+        raise NotImplementedError
+
+    def all_files(self):
+        #-> [(file name, path)] ordered by name
+        raise NotImplementedError
+
+    def all_functions(self):
+        #-> [(function name, file)] ordered by name
+        raise NotImplementedError
+
+    ##call graph, backend answers function_keys / call_neighbours / call_edges, walks are shared
+    def function_keys(self, func_name):
+        #-> [(name, file_path, line_number)] of functions named func_name
+        raise NotImplementedError
+
+    def call_neighbours(self, keys, incoming=False):
+        #-> {key: [keys it calls]} (incoming -> [keys calling it]) for a BFS frontier
+        raise NotImplementedError
+
+    def call_edges(self):
+        #-> [(caller key, callee key)] of every CALLS relationship
+        raise NotImplementedError
+
+    def relationship_edges(self, rel_type):
+        #-> iterator of (src node, dst node) for every rel_type relationship
+        #node = (label, name, file path, line number), File -> (File, name, path, None)
+        raise NotImplementedError
+
+    def transitive_callers(self, func_name, max_depth=5):
+        #-> [(name, file, line, depth)] of functions reaching func_name in at most max_depth calls
+        return reach_rows(reachable(self.call_neighbours, self.function_keys(func_name), max_depth, incoming=True))
+
+    def transitive_callees(self, func_name, max_depth=5):
+        #-> [(name, file, line, depth)] of functions func_name reaches in at most max_depth calls
+        return reach_rows(reachable(self.call_neighbours, self.function_keys(func_name), max_depth))
+
+    def shortest_call_path(self, source, target, max_depth=10):
+        #-> [(name, file, line)] from a function named source to one named target, [] if none within max_depth
+        path = shortest_path(self.call_neighbours, self.function_keys(source), self.function_keys(target), max_depth)
+        return path or []
+
+    def call_cycles(self):
+        #-> strongly connected components of CALLS (recursion), biggest first
+        return strongly_connected_components(self.call_edges())
+
+    def custom_query(self, cypher_query):
+        raise NotImplementedError(f"{type(self).__name__} does not run cypher, use the neo4j backend")
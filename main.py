@@ -1,32 +1,230 @@
-import sys
+import argparse
+import asyncio
 import os
-from code_parser import CodeParser
+import time
+from code_parser import CodeParser, LARGE_FILE_POLICIES
+from discovery import FileDiscovery, DEFAULT_THREADS
 from neo4j_client import Neo4jClient
+from async_neo4j_client import AsyncNeo4jClient
+from manifest import Manifest
+from csv_export import CsvExporter
+from memory_store import MemoryStore
+from graph_store import ENTITY_KEYS
+from watcher import make_watcher, debounced
+from metrics import metrics
+
+#parsed files allowed to wait for the graph writer
+PREFETCH_FILES = 64
 
 def main():
-    #get codebase path 
-    codebase_path = sys.argv[1]
+    #get codebase path + options
+    arg_parser = argparse.ArgumentParser(description="Build a knowledge graph of a python codebase")
+    arg_parser.add_argument("codebase_path")
+    arg_parser.add_argument("--workers", type=int, default=1, help="parse files in N processes")
+    arg_parser.add_argument("--manifest", help="manifest file -> only re-index files changed since last run")
+    arg_parser.add_argument("--batch-size", type=int, default=1000, help="rows per UNWIND write transaction")
+    arg_parser.add_argument("--concurrency", type=int, default=1, help="write transactions in flight at once (async driver)")
+    arg_parser.add_argument("--clear", action="store_true", help="delete this codebase's nodes from neo4j before the full build, other codebases are kept")
+    arg_parser.add_argument("--export-csv", metavar="DIR", help="write csv files for neo4j-admin import instead of writing to neo4j")
+    arg_parser.add_argument("--sqlite", metavar="PATH", help="build the graph in process and save it to a sqlite file instead of neo4j")
+    arg_parser.add_argument("--parse-cache", metavar="DIR", help="cache of extracted entities by file content, can be shared between CI jobs")
+    arg_parser.add_argument("--parse-cache-size", type=int, default=256, metavar="MB", help="least recently used entries evicted above this size")
+    arg_parser.add_argument("--large-files", choices=LARGE_FILE_POLICIES, default='full', help="files over --large-file-size or marked generated: parse fully, extract definitions only (shallow) or skip them")
+    arg_parser.add_argument("--large-file-size", type=float, default=10, metavar="MB", help="size from which a file counts as large")
+    arg_parser.add_argument("--include", action="append", default=[], metavar="GLOB", help="only index files matching GLOB (.gitignore syntax, relative to codebase_path), repeatable")
+    arg_parser.add_argument("--exclude", action="append", default=[], metavar="GLOB", help="skip files / dirs matching GLOB (.gitignore syntax, relative to codebase_path), repeatable")
+    arg_parser.add_argument("--no-gitignore", action="store_true", help="index files ignored by .gitignore too")
+    arg_parser.add_argument("--git-files", action="store_true", help="take the file list from git ls-files instead of walking the directory")
+    arg_parser.add_argument("--discovery-threads", type=int, default=DEFAULT_THREADS, help="directory listings run in parallel while looking for files")
+    arg_parser.add_argument("--watch", action="store_true", help="after indexing keep running, re-index files as they are edited")
+    arg_parser.add_argument("--debounce", type=float, default=0.5, help="seconds without file events before a batch of edits is indexed")
+    arg_parser.add_argument("--metrics", metavar="PATH", help="time every stage, count writes per op, write the report to PATH (.prom -> prometheus text, else json)")
+    arg_parser.add_argument("--profile", metavar="PATH", help="cProfile entity extraction (in process parsing only, use --workers 1), stats dumped to PATH")
+    args = arg_parser.parse_args()
+    if args.clear and args.manifest:
+        arg_parser.error("--clear rebuilds the whole codebase, it cannot be combined with --manifest")
+    #--manifest only drives the incremental neo4j update, the other outputs are always full builds
+    if args.manifest and args.sqlite:
+        arg_parser.error("--sqlite always builds the whole codebase, it cannot be combined with --manifest")
+    if args.manifest and args.export_csv:
+        arg_parser.error("--export-csv always writes the whole codebase, it cannot be combined with --manifest")
+    if args.manifest and args.concurrency > 1:
+        arg_parser.error("--concurrency is for full builds, it cannot be combined with --manifest")
+
+    if args.metrics:
+        metrics.enable()
+    if args.profile:
+        metrics.start_profile()
+    try:
+        with metrics.timer('total'):
+            index_codebase(args)
+    finally:
+        if args.metrics:
+            metrics.print_summary()
+            metrics.save(args.metrics)
+            print(f"Metrics written to {args.metrics}")
+        if args.profile:
+            print(metrics.profile_report(args.profile))
+
+def index_codebase(args):
+    codebase_path = args.codebase_path
+    manifest = Manifest(args.manifest) if args.manifest else None
     #parse codebase
     print("\nParsing codebase")
-    parser = CodeParser()
-    parsed_data = parser.parse_codebase(codebase_path)
+    cache = None
+    if args.parse_cache:
+        from parse_cache import ParseCache
+        cache = ParseCache(args.parse_cache, args.parse_cache_size << 20)
+    discovery = FileDiscovery(args.include, args.exclude, not args.no_gitignore, args.git_files, args.discovery_threads)
+    parser = CodeParser(cache, args.large_files, int(args.large_file_size * (1 << 20)), discovery)
 
-    print("\nNumber of")
-    print("Files:", len(parsed_data['files']))
-    print("Functions:", len(parsed_data['functions']))
-    print("Classes:", len(parsed_data['classes']))
-    print("Variables:", len(parsed_data['variables']))
-    print("Imports:", len(parsed_data['imports']))
-    print("Function Calls:", len(parsed_data['calls']))
+    #offline bulk import -> no database connection, csv written file by file while parsing
+    if args.export_csv:
+        exporter = CsvExporter(args.export_csv)
+        counts = {}
+        for result in count_entities(parser.iter_parse_codebase(codebase_path, workers=args.workers), counts):
+            exporter.add(result)
+        exporter.finish()
+        print_counts(counts)
+        print(f"\nCSV files written to {args.export_csv}, load with:")
+        print(exporter.import_command())
+        return
+
+    #in process graph, no database server -> query with graph_query.py --sqlite PATH
+    if args.sqlite:
+        print("Building knowledge graph...")
+        store = MemoryStore(batch_size=args.batch_size)
+        file_results = parser.iter_parse_codebase(codebase_path, workers=args.workers, prefetch=PREFETCH_FILES)
+        counts = store.write_stream(file_results)
+        store.save(args.sqlite)
+        print_counts(counts)
+        print(f"\nGraph saved to {args.sqlite}")
+        if args.watch:
+            watch_codebase(parser, store, codebase_path, args.debounce, save=lambda: store.save(args.sqlite))
+        return
+
+    #full build over the async driver -> several write transactions at once
+    if args.concurrency > 1 and manifest is None and not args.watch:
+        print("Building knowledge graph...")
+        file_results = parser.iter_parse_codebase(codebase_path, workers=args.workers)
+        counts = asyncio.run(build_async(file_results, args.batch_size, args.concurrency, args.clear and codebase_path))
+        print_counts(counts)
+        return
 
     #connect to Neo4j
-    neo4j = Neo4jClient()
+    neo4j = Neo4jClient(batch_size=args.batch_size)
+    neo4j.create_indexes()
+    if args.clear:
+        #trailing separator -> /repo does not also clear /repo2
+        neo4j.clear_database(path_prefix=os.path.join(codebase_path, ''))
 
     #build kg
-    print("Building knowledge graph...")
+    if manifest is None:
+        #parsing + writing overlap, graph written in batches while later files are parsed
+        print("Building knowledge graph...")
+        file_results = parser.iter_parse_codebase(codebase_path, workers=args.workers, prefetch=PREFETCH_FILES)
+        counts = neo4j.write_stream(file_results)
+    else:
+        #only changed files are parsed -> small, kept in memory for the subgraph replace
+        parsed_data = parser.parse_codebase(codebase_path, workers=args.workers, manifest=manifest)
+        counts = {key: len(values) for key, values in parsed_data.items()}
+        print("Building knowledge graph...")
+        changes = neo4j.update_files(
+            parsed_data, manifest.changed_files(), manifest.deleted_files(), parse_files=parser.parse_files
+        )
+        manifest.commit([f['path'] for f in parsed_data['files']])
+        print_changes(changes)
+    print_counts(counts)
+    if args.watch:
+        watch_codebase(parser, neo4j, codebase_path, args.debounce, manifest=manifest)
+    neo4j.close()
+
+def watch_codebase(parser, store, codebase_path, debounce, manifest=None, save=None):
+    ##re-index edited files until interrupted
+    ##only files whose content changed are re-parsed (incrementally when their old tree is cached)
+    ##and only their subgraph is replaced
+    watcher = make_watcher(codebase_path, discovery=parser.discovery)
+    print(f"\nWatching {codebase_path} for changes (Ctrl+C to stop)")
+    try:
+        for changed in debounced(watcher, debounce):
+            start = time.perf_counter()
+            parsed_data = {key: [] for key in ENTITY_KEYS}
+            indexed, deleted, incremental = [], [], 0
+            for file_path in sorted(changed):
+                if not os.path.exists(file_path):
+                    parser.forget_file(file_path)
+                    deleted.append(file_path)
+                    continue
+                try:
+                    parsed = parser.reparse_file(file_path)
+                    if parsed is None:
+                        #saved without changes
+                        continue
+                    tree, source_code, reused = parsed
+                    #same large file policy as the initial build
+                    handling = parser.large_file_handling(source_code)
+                    if handling == 'skip':
+                        continue
+                    entities = parser.extract_entities(tree, source_code, file_path, handling == 'shallow')
+                except Exception as e:
+                    print(f"Error while parsing {file_path}: {e}")
+                    continue
+                for key, values in entities.items():
+                    parsed_data.setdefault(key, []).extend(values)
+                parsed_data['files'].append({'path': file_path, 'name': os.path.basename(file_path)})
+                indexed.append(file_path)
+                incremental += reused
+            if not indexed and not deleted:
+                continue
+
+            changes = store.update_files(parsed_data, indexed, deleted, parse_files=parser.parse_files)
+            if manifest is not None:
+                manifest.update(indexed, deleted)
+            if save is not None:
+                save()
+            print(f"Re-indexed {len(indexed)} files ({incremental} incremental), "
+                  f"removed {len(deleted)} in {time.perf_counter() - start:.2f}s")
+            print_changes(changes)
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        watcher.close()
+
+async def build_async(file_results, batch_size, concurrency, clear_path=None):
+    #indexes + clear first (sync client), then stream into the async client
+    neo4j = Neo4jClient(batch_size=batch_size)
     neo4j.create_indexes()
-    neo4j.build_graph(parsed_data)
+    if clear_path:
+        neo4j.clear_database(path_prefix=os.path.join(clear_path, ''))
     neo4j.close()
+    client = AsyncNeo4jClient(batch_size=batch_size, concurrency=concurrency)
+    try:
+        return await client.write_stream(file_results)
+    finally:
+        await client.close()
+
+def count_entities(file_results, counts):
+    ##pass per file results through, adding up entity counts
+    for result in file_results:
+        for key, values in result.items():
+            counts[key] = counts.get(key, 0) + len(values)
+        yield result
+
+def print_counts(counts):
+    print("\nNumber of")
+    print("Files:", counts.get('files', 0))
+    print("Functions:", counts.get('functions', 0))
+    print("Classes:", counts.get('classes', 0))
+    print("Variables:", counts.get('variables', 0))
+    print("Imports:", counts.get('imports', 0))
+    print("Function Calls:", counts.get('calls', 0))
+
+def print_changes(changes):
+    #what a per file sync wrote
+    if changes:
+        print(f"Nodes: +{changes['nodes_added']} -{changes['nodes_removed']} "
+              f"({changes['nodes_moved']} moved, {changes['nodes_updated']} updated), "
+              f"relationships: +{changes['edges_added']} -{changes['edges_removed']}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+
+##remember what every indexed file looked like -> next run only re-indexes what changed
+class Manifest:
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        #file path -> {'hash', 'mtime', 'size'} of last successful index
+        self.entries = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.entries = json.load(f).get('files', {})
+        #state of the current run
+        self.pending = {}
+        self.seen = set()
+        self.unchanged = 0
+
+    def is_unchanged(self, file_path):
+        ##cheap mtime+size check first, hash content only when those moved
+        stat = os.stat(file_path)
+        self.seen.add(file_path)
+        entry = self.entries.get(file_path)
+        if entry and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            self.unchanged += 1
+            return True
+
+        digest = file_hash(file_path)
+        if entry and entry['hash'] == digest:
+            #touched but same content -> just refresh stat
+            entry['mtime'] = stat.st_mtime_ns
+            entry['size'] = stat.st_size
+            self.unchanged += 1
+            return True
+
+        self.pending[file_path] = {'hash': digest, 'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+        return False
+
+    def changed_files(self):
+        ##new or edited files seen this run
+        return sorted(self.pending)
+
+    def deleted_files(self):
+        ##files in last index that were not seen this run
+        return sorted(set(self.entries) - self.seen)
+
+    def commit(self, indexed_files):
+        ##call after graph is written -> record new state
+        #files that failed to parse are dropped so next run retries them
+        indexed_files = set(indexed_files)
+        for file_path, entry in self.pending.items():
+            if file_path in indexed_files:
+                self.entries[file_path] = entry
+            else:
+                self.entries.pop(file_path, None)
+        for file_path in self.deleted_files():
+            self.entries.pop(file_path, None)
+        self.pending = {}
+        self.save()
+
+    def update(self, indexed_files, deleted_files):
+        ##watch mode: record files re-indexed one batch at a time, rest of the manifest untouched
+        for file_path in indexed_files:
+            stat = os.stat(file_path)
+            self.entries[file_path] = {'hash': file_hash(file_path), 'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+        for file_path in deleted_files:
+            self.entries.pop(file_path, None)
+        self.save()
+
+    def save(self):
+        #write to tmp file then swap -> crash never leaves half a manifest
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 1, 'files': self.entries}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def file_hash(file_path):
+    ##content hash, read in chunks so big files dont load at once
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
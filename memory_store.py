@@ -0,0 +1,415 @@
+import json
+import os
+import sqlite3
+import time
+from metrics import metrics
+from graph_store import (
+    GraphStore, NODE_KEYS, op_name, FILE_NODES, FUNCTION_NODES, CLASS_NODES, VARIABLE_NODES, HAS_METHOD,
+    IMPORT_NODES, FILE_IMPORTS, CALLS, UNRESOLVED_CALL_NODES, UNRESOLVED_CALLS, GRAPH_VERSION,
+    DELETE_RELATIONSHIPS, DELETE_NODES, SET_NODE_PROPS, DELETE_ORPHANS
+)
+
+##in process graph store -> no database server needed
+##nodes in a list (id = position), adjacency lists per relationship type both ways
+##node key index (same keys as the neo4j constraints) + name index for the query lookups
+##optionally saved to / loaded from a sqlite file
+class MemoryStore(GraphStore):
+    version_is_local = True
+
+    def __init__(self, path=None, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        #node id -> label / properties, None once deleted (ids are never reused)
+        self.labels = []
+        self.props = []
+        #label -> node key tuple -> node id
+        self.keys = {label: {} for label in NODE_KEYS}
+        #label -> name -> [node ids], Import indexed on module_name
+        self.names = {label: {} for label in NODE_KEYS}
+        #file path -> {node id: None} of the file node + everything defined in it
+        self.file_nodes = {}
+        #rel type -> node id -> {node id: None} (dict = ordered set, edges kept in insert order)
+        self.out_edges = {}
+        self.in_edges = {}
+        #write op -> python version of its cypher
+        self.ops = {
+            FILE_NODES: self.merge_files,
+            FUNCTION_NODES: self.merge_functions,
+            CLASS_NODES: self.merge_classes,
+            VARIABLE_NODES: self.merge_variables,
+            HAS_METHOD: self.merge_methods,
+            IMPORT_NODES: self.merge_imports,
+            FILE_IMPORTS: self.merge_file_imports,
+            CALLS: self.merge_calls,
+            UNRESOLVED_CALL_NODES: self.merge_unresolved_calls,
+            UNRESOLVED_CALLS: self.merge_unresolved_call_edges,
+            GRAPH_VERSION: self.merge_graph_version,
+            DELETE_RELATIONSHIPS: self.delete_relationships,
+            DELETE_NODES: self.delete_nodes,
+            SET_NODE_PROPS: self.update_node_props,
+            DELETE_ORPHANS: self.delete_orphans
+        }
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def write_batches(self, query, rows, **params):
+        op = self.ops.get(query)
+        if op is None:
+            raise NotImplementedError(f"MemoryStore has no python version of query:\n{query}")
+        if not metrics.enabled:
+            op(rows)
+            return
+        began = time.perf_counter()
+        op(rows)
+        if rows:
+            metrics.record_query(op_name(query), len(rows), time.perf_counter() - began)
+
+    ##graph primitives
+    def merge_node(self, label, props):
+        #MERGE on the label's node key -> existing node id or a new node
+        key = tuple(props[name] for name in NODE_KEYS[label])
+        node_id = self.keys[label].get(key)
+        if node_id is None:
+            node_id = len(self.labels)
+            self.labels.append(label)
+            self.props.append(dict(props))
+            self.keys[label][key] = node_id
+            self.names[label].setdefault(node_name(label, props), []).append(node_id)
+            file_path = props.get('file_path', props.get('path'))
+            if file_path is not None:
+                self.file_nodes.setdefault(file_path, {})[node_id] = None
+        return node_id
+
+    def remove_node(self, node_id):
+        #DETACH DELETE
+        label, props = self.labels[node_id], self.props[node_id]
+        del self.keys[label][tuple(props[name] for name in NODE_KEYS[label])]
+        self.names[label][node_name(label, props)].remove(node_id)
+        file_path = props.get('file_path', props.get('path'))
+        if file_path in self.file_nodes:
+            self.file_nodes[file_path].pop(node_id, None)
+        for edges, reverse in ((self.out_edges, self.in_edges), (self.in_edges, self.out_edges)):
+            for rel_type, adjacency in edges.items():
+                for other in adjacency.pop(node_id, {}):
+                    reverse[rel_type][other].pop(node_id, None)
+        self.labels[node_id] = None
+        self.props[node_id] = None
+
+    def match_node(self, label, *key):
+        #MATCH on the node key -> node id or None
+        return self.keys[label].get(key)
+
+    def set_props(self, node_id, **props):
+        label = self.labels[node_id]
+        old_name = node_name(label, self.props[node_id])
+        self.props[node_id].update(props)
+        new_name = node_name(label, self.props[node_id])
+        if new_name != old_name:
+            self.names[label][old_name].remove(node_id)
+            self.names[label].setdefault(new_name, []).append(node_id)
+
+    def merge_edge(self, src, rel_type, dst):
+        if src is None or dst is None:
+            #MATCH found nothing -> no edge, like the cypher version
+            return
+        self.out_edges.setdefault(rel_type, {}).setdefault(src, {})[dst] = None
+        self.in_edges.setdefault(rel_type, {}).setdefault(dst, {})[src] = None
+
+    def nodes_named(self, label, name):
+        return self.names[label].get(name, [])
+
+    def neighbours(self, node_id, rel_type, label, incoming=False):
+        edges = self.in_edges if incoming else self.out_edges
+        return [n for n in edges.get(rel_type, {}).get(node_id, {}) if self.labels[n] == label]
+
+    ##write ops, one per cypher constant in graph_store
+    def merge_files(self, rows):
+        for row in rows:
+            file_id = self.merge_node('File', {'path': row['path']})
+            self.set_props(file_id, name=row['name'])
+
+    def merge_functions(self, rows):
+        for row in rows:
+            func_id = self.merge_node('Function', {
+                'name': row['name'], 'file_path': row['file_path'], 'line_number': row['line_number']
+            })
+            self.set_props(func_id, parent_class=row['parent_class'])
+            for param in row['parameters']:
+                var_id = self.merge_node('Variable', {'name': param, 'file_path': row['file_path']})
+                self.merge_edge(func_id, 'DEFINES', var_id)
+            self.merge_edge(self.match_node('File', row['file_path']), 'CONTAINS', func_id)
+
+    def merge_classes(self, rows):
+        for row in rows:
+            class_id = self.merge_node('Class', {'name': row['name'], 'file_path': row['file_path']})
+            self.set_props(class_id, line_number=row['line_number'])
+            self.merge_edge(self.match_node('File', row['file_path']), 'CONTAINS', class_id)
+
+    def merge_variables(self, rows):
+        for row in rows:
+            var_id = self.merge_node('Variable', {'name': row['name'], 'file_path': row['file_path']})
+            self.set_props(var_id, line_number=row['line_number'])
+            self.merge_edge(self.match_node('File', row['file_path']), 'CONTAINS', var_id)
+
+    def merge_methods(self, rows):
+        for row in rows:
+            self.merge_edge(
+                self.match_node('Class', row['class_name'], row['file_path']),
+                'HAS_METHOD',
+                self.match_node('Function', row['method_name'], row['file_path'], row['line_number'])
+            )
+
+    def merge_imports(self, rows):
+        for row in rows:
+            import_id = self.merge_node('Import', {'module_name': row['module_name']})
+            self.set_props(import_id, import_type=row['import_type'])
+
+    def merge_file_imports(self, rows):
+        for row in rows:
+            self.merge_edge(
+                self.match_node('File', row['file_path']), 'IMPORTS', self.match_node('Import', row['module_name'])
+            )
+
+    def merge_calls(self, rows):
+        for row in rows:
+            self.merge_edge(
+                self.match_node('Function', row['caller'], row['caller_file'], row['caller_line']),
+                'CALLS',
+                self.match_node('Function', row['callee'], row['callee_file'], row['callee_line'])
+            )
+
+    def merge_unresolved_calls(self, rows):
+        for row in rows:
+            self.merge_node('UnresolvedCall', {'name': row['name']})
+
+    def merge_unresolved_call_edges(self, rows):
+        for row in rows:
+            self.merge_edge(
+                self.match_node('Function', row['caller'], row['caller_file'], row['caller_line']),
+                'CALLS_UNRESOLVED',
+                self.match_node('UnresolvedCall', row['callee'])
+            )
+
+    def merge_graph_version(self, rows):
+        for row in rows:
+            version_id = self.merge_node('GraphVersion', {'name': 'graph'})
+            self.set_props(version_id, version=self.props[version_id].get('version', 0) + 1)
+
+    ##per file sync (GraphStore.update_files), rows carry node ids from file_subgraph
+    def delete_relationships(self, rows):
+        for row in rows:
+            self.out_edges.get(row['type'], {}).get(row['src'], {}).pop(row['dst'], None)
+            self.in_edges.get(row['type'], {}).get(row['dst'], {}).pop(row['src'], None)
+
+    def delete_nodes(self, rows):
+        for row in rows:
+            if self.labels[row['id']] is not None:
+                self.remove_node(row['id'])
+
+    def update_node_props(self, rows):
+        for row in rows:
+            node_id = row['id']
+            label = self.labels[node_id]
+            old_key = tuple(self.props[node_id][name] for name in NODE_KEYS[label])
+            self.set_props(node_id, **row['props'])
+            #moved function -> new node key
+            new_key = tuple(self.props[node_id][name] for name in NODE_KEYS[label])
+            if new_key != old_key:
+                del self.keys[label][old_key]
+                self.keys[label][new_key] = node_id
+
+    def delete_orphans(self, rows):
+        for row in rows:
+            node_id = row['id']
+            if self.labels[node_id] is not None and not any(edges.get(node_id) for edges in self.in_edges.values()):
+                self.remove_node(node_id)
+
+    def file_subgraph(self, file_paths):
+        subgraph = []
+        for file_path in file_paths:
+            for node_id in self.file_nodes.get(file_path, {}):
+                out = [
+                    [rel_type, dst, self.labels[dst], self.props[dst]]
+                    for rel_type, adjacency in self.out_edges.items()
+                    for dst in adjacency.get(node_id, {})
+                ]
+                callers = [[caller, self.props[caller]] for caller in self.in_edges.get('CALLS', {}).get(node_id, {})]
+                subgraph.append({
+                    'id': node_id, 'label': self.labels[node_id], 'props': self.props[node_id], 'out': out, 'callers': callers
+                })
+        return subgraph
+
+    def fetch_symbols(self, file_paths):
+        functions, classes = [], []
+        for file_path in file_paths:
+            for node_id in self.file_nodes.get(file_path, {}):
+                props = self.props[node_id]
+                if self.labels[node_id] == 'Function':
+                    functions.append({
+                        'name': props['name'], 'file_path': props['file_path'],
+                        'parent_class': props.get('parent_class'), 'line_number': props['line_number']
+                    })
+                elif self.labels[node_id] == 'Class':
+                    classes.append({'name': props['name'], 'file_path': props['file_path']})
+        return {'functions': functions, 'classes': classes}
+
+    def files_ending_with(self, suffixes):
+        found = {}
+        for suffix in suffixes:
+            for node_id in self.nodes_named('File', os.path.basename(suffix)):
+                path = self.props[node_id]['path']
+                if path.endswith(suffix):
+                    found[path] = None
+        return list(found)
+
+    def files_importing(self, module_names, endings):
+        found = []
+        for module_name, import_ids in self.names['Import'].items():
+            if module_name not in module_names:
+                if not module_name.startswith('.'):
+                    continue
+                if module_name.strip('.') and not module_name.endswith(tuple(endings)):
+                    continue
+            for import_id in import_ids:
+                for file_id in self.neighbours(import_id, 'IMPORTS', 'File', incoming=True):
+                    found.append((self.props[file_id]['path'], module_name))
+        return found
+
+    ##queries
+    def graph_version(self):
+        version_id = self.match_node('GraphVersion', 'graph')
+        return 0 if version_id is None else self.props[version_id]['version']
+
+    def functions_in_file(self, filename):
+        return [
+            (self.props[func]['name'], self.props[func]['line_number'])
+            for file in self.nodes_named('File', filename)
+            for func in self.neighbours(file, 'CONTAINS', 'Function')
+        ]
+
+    def files_with_variable(self, var_name):
+        files = {}
+        for var in self.nodes_named('Variable', var_name):
+            for file in self.neighbours(var, 'CONTAINS', 'File', incoming=True):
+                files[(self.props[file]['name'], self.props[file]['path'])] = None
+        return list(files)
+
+    def function_callers(self, func_name):
+        return [
+            (self.props[caller]['name'], self.props[caller]['file_path'])
+            for callee in self.nodes_named('Function', func_name)
+            for caller in self.neighbours(callee, 'CALLS', 'Function', incoming=True)
+        ]
+
+    def function_calls(self, func_name):
+        return [
+            (self.props[callee]['name'], self.props[callee]['file_path'])
+            for caller in self.nodes_named('Function', func_name)
+            for callee in self.neighbours(caller, 'CALLS', 'Function')
+        ]
+
+    def class_methods(self, class_name):
+        return [
+            (self.props[method]['name'], self.props[method]['line_number'])
+            for c in self.nodes_named('Class', class_name)
+            for method in self.neighbours(c, 'HAS_METHOD', 'Function')
+        ]
+
+    def file_imports(self, filename):
+        return [
+            (self.props[imp]['module_name'], self.props[imp].get('import_type'))
+            for file in self.nodes_named('File', filename)
+            for imp in self.neighbours(file, 'IMPORTS', 'Import')
+        ]
+
+    def all_files(self):
+        files = [(self.props[n].get('name'), self.props[n]['path']) for n in self.keys['File'].values()]
+        return sorted(files, key=lambda file: file[0] or '')
+
+    def all_functions(self):
+        functions = [(self.props[n]['name'], self.props[n]['file_path']) for n in self.keys['Function'].values()]
+        return sorted(functions, key=lambda func: func[0])
+
+    def function_keys(self, func_name):
+        return [function_key(self.props[func]) for func in self.nodes_named('Function', func_name)]
+
+    def call_neighbours(self, keys, incoming=False):
+        found = {}
+        for key in keys:
+            func = self.keys['Function'].get(key)
+            if func is not None:
+                found[key] = [
+                    function_key(self.props[n]) for n in self.neighbours(func, 'CALLS', 'Function', incoming)
+                ]
+        return found
+
+    def call_edges(self):
+        return [
+            (function_key(self.props[caller]), function_key(self.props[callee]))
+            for caller, callees in self.out_edges.get('CALLS', {}).items()
+            for callee in callees
+        ]
+
+    def relationship_edges(self, rel_type):
+        for src, dsts in self.out_edges.get(rel_type, {}).items():
+            for dst in dsts:
+                yield self.node_record(src), self.node_record(dst)
+
+    def node_record(self, node_id):
+        props = self.props[node_id]
+        return (
+            self.labels[node_id], props.get('name'), props.get('file_path', props.get('path')), props.get('line_number')
+        )
+
+    ##persistence
+    def save(self, path=None):
+        #whole graph -> sqlite file, written to tmp then swapped like the manifest
+        path = path or self.path
+        tmp_path = path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute("CREATE TABLE nodes (id INTEGER PRIMARY KEY, label TEXT, props TEXT)")
+            conn.execute("CREATE TABLE edges (src INTEGER, type TEXT, dst INTEGER)")
+            conn.executemany(
+                "INSERT INTO nodes VALUES (?, ?, ?)",
+                (
+                    (node_id, label, json.dumps(self.props[node_id]))
+                    for node_id, label in enumerate(self.labels) if label is not None
+                )
+            )
+            conn.executemany(
+                "INSERT INTO edges VALUES (?, ?, ?)",
+                (
+                    (src, rel_type, dst)
+                    for rel_type, adjacency in self.out_edges.items()
+                    for src, dsts in adjacency.items()
+                    for dst in dsts
+                )
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        #sqlite file -> nodes, indexes and adjacency rebuilt in memory
+        conn = sqlite3.connect(path)
+        try:
+            #saved ids can have gaps (deleted nodes) -> renumbered
+            ids = {}
+            for node_id, label, props in conn.execute("SELECT id, label, props FROM nodes ORDER BY id"):
+                ids[node_id] = self.merge_node(label, json.loads(props))
+            for src, rel_type, dst in conn.execute("SELECT src, type, dst FROM edges ORDER BY rowid"):
+                self.merge_edge(ids[src], rel_type, ids[dst])
+        finally:
+            conn.close()
+
+
+def function_key(props):
+    return (props['name'], props['file_path'], props['line_number'])
+
+def node_name(label, props):
+    #value the name index uses for a node
+    return props.get('module_name') if label == 'Import' else props.get('name')
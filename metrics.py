@@ -0,0 +1,183 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+##run instrumentation: stage timers, counters, latency histograms
+##off by default -> every record call is one attribute check, nothing is timed or stored
+##report() -> json friendly dict, prometheus() -> prometheus text exposition format
+##
+##metrics recorded by the pipeline:
+##  stage_seconds_total{stage}       read / parse / extract / cache / resolve / write / total
+##  file_parse_seconds               histogram, read + parse + extract of one file
+##  parse_cache_total{result}        hit / miss
+##  large_files_total{policy}        large / generated files parsed full / shallow / skipped
+##  db_queries_total{op}             write queries sent per op (one UNWIND batch each)
+##  db_rows_total{op}                rows sent per op
+##  db_round_trip_seconds{op}        histogram, one write transaction (or query inside one)
+
+#histogram upper bounds in seconds
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = 'codegraph_'
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        #(name, ((label, value), ..)) -> value
+        self.counters = {}
+        #(name, labels) -> [count per bucket.., +Inf count, sum]
+        self.histograms = {}
+        #prefetch thread records too
+        self.lock = threading.Lock()
+        self.profiler = None
+
+    def enable(self):
+        self.enabled = True
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(BUCKETS)] += 1
+            histogram[-1] += seconds
+
+    def add_stages(self, timings):
+        #{stage: seconds} of one file
+        for stage, seconds in timings.items():
+            self.count('stage_seconds_total', seconds, stage=stage)
+
+    def record_query(self, op, rows, seconds):
+        self.count('db_queries_total', op=op)
+        self.count('db_rows_total', rows, op=op)
+        self.count('stage_seconds_total', seconds, stage='write')
+        self.observe('db_round_trip_seconds', seconds, op=op)
+
+    @contextmanager
+    def timer(self, stage):
+        ##coarse stages only (whole build, call resolution), per file / batch code checks enabled itself
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.count('stage_seconds_total', time.perf_counter() - start, stage=stage)
+
+    ##cProfile of the extraction functions, opt in
+    def start_profile(self):
+        self.profiler = cProfile.Profile()
+
+    @contextmanager
+    def profiled(self):
+        if self.profiler is None:
+            yield
+            return
+        self.profiler.enable()
+        try:
+            yield
+        finally:
+            self.profiler.disable()
+
+    def profile_report(self, path=None, top=20):
+        ##-> text of the top functions by cumulative time, pstats dump written to path
+        if self.profiler is None:
+            return ''
+        if path:
+            self.profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(top)
+        return out.getvalue()
+
+    ##reports
+    def report(self):
+        counters = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            counters.setdefault(name, []).append({'labels': dict(labels), 'value': round(value, 6)})
+        histograms = {}
+        for (name, labels), values in sorted(self.histograms.items()):
+            count = sum(values[:-1])
+            histograms.setdefault(name, []).append({
+                'labels': dict(labels),
+                'count': count,
+                'sum': round(values[-1], 6),
+                'buckets': dict(zip([str(b) for b in BUCKETS] + ['+Inf'], cumulative(values[:-1])))
+            })
+        return {'counters': counters, 'histograms': histograms}
+
+    def prometheus(self):
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+            lines.append(f"{PREFIX}{name}{label_text(labels)} {value:g}")
+        for (name, labels), values in sorted(self.histograms.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+            counts = cumulative(values[:-1])
+            for bound, count in zip([f"{b:g}" for b in BUCKETS] + ['+Inf'], counts):
+                lines.append(f"{PREFIX}{name}_bucket{label_text(labels + (('le', bound),))} {count}")
+            lines.append(f"{PREFIX}{name}_sum{label_text(labels)} {values[-1]:g}")
+            lines.append(f"{PREFIX}{name}_count{label_text(labels)} {counts[-1]}")
+        return '\n'.join(lines) + '\n'
+
+    def save(self, path):
+        #.prom / .txt -> prometheus text, anything else json
+        with open(path, 'w') as f:
+            if path.endswith(('.prom', '.txt')):
+                f.write(self.prometheus())
+            else:
+                json.dump(self.report(), f, indent=2)
+
+    def print_summary(self):
+        ##where the time went, one line per stage + per write op
+        stages = {dict(labels)['stage']: value for (name, labels), value in self.counters.items() if name == 'stage_seconds_total'}
+        print("\nTime per stage:")
+        for stage, seconds in sorted(stages.items(), key=lambda item: -item[1]):
+            print(f"   {stage}: {seconds:.2f}s")
+        queries = {dict(labels)['op']: value for (name, labels), value in self.counters.items() if name == 'db_queries_total'}
+        rows = {dict(labels)['op']: value for (name, labels), value in self.counters.items() if name == 'db_rows_total'}
+        if queries:
+            print("Writes per op (queries, rows):")
+            for op in sorted(queries):
+                print(f"   {op}: {queries[op]} {rows.get(op, 0)}")
+
+
+def cumulative(counts):
+    total, result = 0, []
+    for count in counts:
+        total += count
+        result.append(total)
+    return result
+
+def label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+#one per process, enabled by main.py --metrics
+metrics = Metrics()
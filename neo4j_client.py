@@ -1,201 +1,421 @@
+import os
+import re
+import time
 from neo4j import GraphDatabase
+import graph_store
+from graph_store import GraphStore, NODE_KEYS, op_name
+from metrics import metrics
+
+#nodes deleted per transaction by clear_database
+CLEAR_CHUNK_SIZE = 10000
+#labels whose nodes belong to one file (file_path property)
+FILE_LABELS = ['Function', 'Class', 'Variable']
 
 ##create connection -> create nodes , relationships -> querying
-class Neo4jClient:
-    def __init__(self):
+class Neo4jClient(GraphStore):
+    def __init__(self, batch_size=1000, driver=None):
         ##init connection
+        #driver -> use an existing driver (or a stand-in for benchmarks) instead of connecting
         NEO4J_URI = "bolt://localhost:7687"
         NEO4J_USER = "neo4j"
         NEO4J_PASSWORD = "sample123"
-        self.driver = GraphDatabase.driver(NEO4J_URI,auth=(NEO4J_USER, NEO4J_PASSWORD))
+        self.driver = driver or GraphDatabase.driver(NEO4J_URI,auth=(NEO4J_USER, NEO4J_PASSWORD))
+        #rows sent per UNWIND query / write transaction
+        self.batch_size = batch_size
         print(f"**Connected to Neo4j**")
     
     def close(self):
         self.driver.close()
     
-    def clear_database(self):
-        ##match and delete all nodes + relationships
+    def clear_database(self, path_prefix=None, labels=None, chunk_size=CLEAR_CHUNK_SIZE):
+        ##delete nodes + relationships chunk_size at a time -> no transaction holds the whole graph
+        ##path_prefix -> only files under it + what they define (one repository in a shared graph)
+        ##labels -> only nodes with those labels
+        #imports / unresolved calls are shared by repositories -> with a prefix only the ones nothing uses anymore
+        #version node kept + bumped -> a rebuilt graph never reuses a version cached results were taken at
+        labels = labels or [label for label in NODE_KEYS if label != 'GraphVersion']
+        for label in labels:
+            if label not in NODE_KEYS or label == 'GraphVersion':
+                raise ValueError(f"cannot clear label {label}")
+        #shared labels last -> their orphans are known once the files are gone
+        labels = sorted(labels, key=lambda label: label != 'File' and label not in FILE_LABELS)
+        start = time.perf_counter()
+        deleted = 0
         with self.driver.session() as session:
-            session.run("MATCH (n) DETACH DELETE n")
+            for label in labels:
+                if path_prefix is None:
+                    scope = "true"
+                elif label == 'File':
+                    scope = "n.path STARTS WITH $prefix"
+                elif label in FILE_LABELS:
+                    scope = "n.file_path STARTS WITH $prefix"
+                else:
+                    scope = "NOT ()-->(n)"
+                total = session.run(f"MATCH (n:{label}) WHERE {scope} RETURN count(n) AS total", prefix=path_prefix).single()['total']
+                if not total:
+                    continue
+                #relationships first -> a node with millions of them (UnresolvedCall len) never goes in one transaction
+                delete_chunks(
+                    session,
+                    f"MATCH (n:{label})-[r]-() WHERE {scope} WITH DISTINCT r LIMIT $limit DELETE r RETURN count(r) AS deleted",
+                    f"{label} relationships", None, chunk_size, path_prefix
+                )
+                deleted += delete_chunks(
+                    session,
+                    f"MATCH (n:{label}) WHERE {scope} WITH n LIMIT $limit DETACH DELETE n RETURN count(n) AS deleted",
+                    f"{label} nodes", total, chunk_size, path_prefix
+                )
+        print(f"Cleared {deleted} nodes in {time.perf_counter() - start:.1f}s")
+        self.bump_version()
     
     def create_indexes(self):
         ##faster lookup
-        #index file nodes by name, path
-        #index function, class, variable nodes by name
+        #uniqueness constraints on every MERGE key (backed by an index)
+        #extra name indexes for queries that look up by name only
+        self.create_constraints()
         with self.driver.session() as session:
             session.run("CREATE INDEX file_name IF NOT EXISTS FOR (f:File) ON (f.name)")
-            session.run("CREATE INDEX file_path IF NOT EXISTS FOR (f:File) ON (f.path)")
             session.run("CREATE INDEX function_name IF NOT EXISTS FOR (func:Function) ON (func.name)")
             session.run("CREATE INDEX class_name IF NOT EXISTS FOR (c:Class) ON (c.name)")
             session.run("CREATE INDEX variable_name IF NOT EXISTS FOR (v:Variable) ON (v.name)")
-    
-    def create_file_nodes(self, files):
-        #start session ,loop through each file
-        #create/update file node
+            #file_path alone is not a prefix of the node keys -> scoped clear / sync need their own index
+            for label in FILE_LABELS:
+                session.run(f"CREATE INDEX {label.lower()}_file_path IF NOT EXISTS FOR (n:{label}) ON (n.file_path)")
+        for query_name, label, keys in unbacked_merges():
+            print(f"Warning: {query_name} MERGEs {label} on {keys}, no constraint for that key")
+
+    def create_constraints(self):
+        ##one uniqueness constraint per NODE_KEYS entry
         with self.driver.session() as session:
-            #create file node w file path
-            for file in files:
+            #old single property indexes on a constraint key block the constraint -> drop them
+            session.run("DROP INDEX file_path IF EXISTS")
+            session.run("DROP INDEX unresolved_call_name IF EXISTS")
+            for label, keys in NODE_KEYS.items():
+                properties = ", ".join(f"n.{key}" for key in keys)
                 session.run(
-                    """
-                    MERGE (f:File {path: $path})
-                    SET f.name = $name
-                    """,
-                    path=file['path'],#filepath
-                    name=file['name']#filename
+                    f"CREATE CONSTRAINT {constraint_name(label)} IF NOT EXISTS "
+                    f"FOR (n:{label}) REQUIRE ({properties}) IS UNIQUE"
                 )
-    
-    def create_function_nodes(self, functions):
-        ##create function node 
-        ##link function to file
-        ##link function to params
+
+    def check_constraints(self):
+        ##compare MERGE keys of the client with constraints that exist in the database
+        #-> [(query name, label, keys)] not backed by a constraint
         with self.driver.session() as session:
-            for func in functions:
-                ##crete functn node on name n file path
-                session.run(
+            existing = {
+                (record['labels'][0], tuple(record['properties']))
+                for record in session.run(
                     """
-                    MERGE (func:Function {name: $name, file_path: $file_path})
-                    SET func.line_number = $line_number
-                    """,
-                    name=func['name'],#function name
-                    file_path=func['file_path'],#function in which file
-                    line_number=func['line_number'] #function line no.
-                )
-                ##link functn to file that has it 
-                #find file node -> find functn node -> file CONTAINS func
-                session.run(
+                    SHOW CONSTRAINTS YIELD entityType, labelsOrTypes AS labels, properties, type
+                    WHERE entityType = 'NODE' AND (type CONTAINS 'UNIQUENESS' OR type = 'NODE_KEY')
+                    RETURN labels, properties
                     """
-                    MATCH (f:File {path: $file_path})
-                    MATCH (func:Function {name: $name, file_path: $file_path})
-                    MERGE (f)-[:CONTAINS]->(func)
-                    """,
-                    file_path=func['file_path'],
-                    name=func['name']
                 )
-                
-                #find functn node -> find/create var node -> func DEFINES param
-                for param in func.get('parameters', []):
-                    session.run(
-                        """
-                        MATCH (func:Function {name: $func_name, file_path: $file_path})
-                        MERGE (v:Variable {name: $param, file_path: $file_path})
-                        MERGE (func)-[:DEFINES]->(v)
-                        """,
-                        func_name=func['name'],
-                        file_path=func['file_path'],
-                        param=param
-                    )
+            }
+        missing = []
+        for query_name, label, keys in merge_keys():
+            #constraint has to be on exactly the merged properties (order does not matter)
+            if not any(l == label and sorted(p) == sorted(keys) for l, p in existing):
+                missing.append((query_name, label, keys))
+                print(f"No constraint backs {query_name}: MERGE ({label} {keys})")
+        return missing
     
-    def create_class_nodes(self, classes):
-        #create class node, link to file
+    def write_batches(self, query, rows, **params):
+        ##send rows in chunks of batch_size -> each chunk is one UNWIND query in one write transaction
+        ##params -> extra query parameters shared by all rows
         with self.driver.session() as session:
-            #class node on name and file path
-            for c in classes:
-                session.run(
-                    """
-                    MERGE (c:Class {name: $name, file_path: $file_path})
-                    SET c.line_number = $line_number
-                    """,
-                    name=c['name'],
-                    file_path=c['file_path'],
-                    line_number=c['line_number']
-                )
-                #find file -> find class -> file CONTAINS class
-                session.run(
-                    """
-                    MATCH (f:File {path: $file_path})
-                    MATCH (c:Class {name: $name, file_path: $file_path})
-                    MERGE (f)-[:CONTAINS]->(c)
-                    """,
-                    file_path=c['file_path'],
-                    name=c['name']
-                )
-    
-    def create_call_relationships(self, calls):
-        #loop thru functn calls and link caller to callee by name.caller CALLS calllee
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                began = time.perf_counter()
+                session.execute_write(_run_batch, query, batch, params)
+                if metrics.enabled:
+                    metrics.record_query(op_name(query), len(batch), time.perf_counter() - began)
+
+    def write_transaction(self, ops):
+        ##all ops in one managed write transaction -> a file sync is applied whole or not at all
         with self.driver.session() as session:
-            for call in calls:
-                session.run(
-                    """
-                    MATCH (caller:Function {name: $caller})
-                    MATCH (callee:Function {name: $callee})
-                    MERGE (caller)-[:CALLS]->(callee)
-                    """,
-                    caller=call['caller'],
-                    callee=call['callee']
-                )
-    
-    def create_import_nodes(self, imports):
-        ##create import node on module name
+            session.execute_write(_run_ops, ops, self.batch_size)
+
+    def file_subgraph(self, file_paths):
+        ##file nodes, what they CONTAIN + function parameters, each with its outgoing relationships + callers
         with self.driver.session() as session:
-            for imp in imports:
-                session.run(
-                    """
-                    MERGE (i:Import {module_name: $module_name})
-                    SET i.import_type = $import_type
-                    """,
-                    module_name=imp['module_name'],
-                    import_type=imp['import_type']
-                )
-                #find file with import -> find import node -> file IMPORTS import
-                session.run(
-                    """
-                    MATCH (f:File {path: $file_path})
-                    MATCH (i:Import {module_name: $module_name})
-                    MERGE (f)-[:IMPORTS]->(i)
-                    """,
-                    file_path=imp['file_path'],
-                    module_name=imp['module_name']
-                )
-        
-    def create_variable_nodes(self, variables):
-        #create var node on name and file path -- same var in diff files
+            return session.run(
+                """
+                MATCH (f:File)
+                WHERE f.path IN $paths
+                OPTIONAL MATCH (f)-[:CONTAINS]->(n)
+                OPTIONAL MATCH (n)-[:DEFINES]->(param:Variable)
+                WITH f, collect(n) + collect(param) AS defined
+                UNWIND [f] + defined AS n
+                WITH DISTINCT n
+                OPTIONAL MATCH (n)-[r]->(m)
+                WITH n, collect(CASE WHEN r IS NOT NULL THEN [type(r), elementId(m), labels(m)[0], properties(m)] END) AS out
+                OPTIONAL MATCH (caller:Function)-[:CALLS]->(n)
+                RETURN elementId(n) AS id, labels(n)[0] AS label, properties(n) AS props, out,
+                       collect(CASE WHEN caller IS NOT NULL THEN [elementId(caller), properties(caller)] END) AS callers
+                """,
+                paths=file_paths
+            ).data()
+
+    def fetch_symbols(self, file_paths):
+        ##functions/classes of files already in the graph -> symbol table for resolving calls into them
         with self.driver.session() as session:
-            for var in variables:
-                session.run(
-                    """
-                    MERGE (v:Variable {name: $name, file_path: $file_path})
-                    SET v.line_number = $line_number
-                    """,
-                    name=var['name'],
-                    file_path=var['file_path'],
-                    line_number=var['line_number']
-                )
-                
-                # find file -> find var node -> file CONTAINS var
-                session.run(
-                    """
-                    MATCH (f:File {path: $file_path})
-                    MATCH (v:Variable {name: $name, file_path: $file_path})
-                    MERGE (f)-[:CONTAINS]->(v)
-                    """,
-                    file_path=var['file_path'],
-                    name=var['name']
+            functions = session.run(
+                """
+                MATCH (f:File)-[:CONTAINS]->(func:Function)
+                WHERE f.path IN $paths
+                RETURN func.name AS name, func.file_path AS file_path, func.parent_class AS parent_class,
+                       func.line_number AS line_number
+                """,
+                paths=list(file_paths)
+            ).data()
+            classes = session.run(
+                """
+                MATCH (f:File)-[:CONTAINS]->(c:Class)
+                WHERE f.path IN $paths
+                RETURN c.name AS name, c.file_path AS file_path
+                """,
+                paths=list(file_paths)
+            ).data()
+        return {'functions': functions, 'classes': classes}
+
+    def files_ending_with(self, suffixes):
+        #file_name index narrows it to files named like the module, path ending checked on those
+        records = self.read(
+            """
+            MATCH (f:File)
+            WHERE f.name IN $names AND any(suffix IN $suffixes WHERE f.path ENDS WITH suffix)
+            RETURN DISTINCT f.path AS path
+            """,
+            names=list({os.path.basename(suffix) for suffix in suffixes}),
+            suffixes=list(suffixes)
+        )
+        return [record['path'] for record in records]
+
+    def files_importing(self, module_names, endings):
+        records = self.read(
+            """
+            MATCH (f:File)-[:IMPORTS]->(i:Import)
+            WHERE i.module_name IN $names
+               OR (i.module_name STARTS WITH '.'
+                   AND (replace(i.module_name, '.', '') = '' OR any(ending IN $endings WHERE i.module_name ENDS WITH ending)))
+            RETURN f.path AS path, i.module_name AS module_name
+            """,
+            names=list(module_names),
+            endings=list(endings)
+        )
+        return [(record['path'], record['module_name']) for record in records]
+
+    ##queries (GraphQuery backend)
+    def read(self, query, **params):
+        ##run read query -> list of records
+        with self.driver.session() as session:
+            return list(session.run(query, **params))
+
+    def graph_version(self):
+        records = self.read("MATCH (g:GraphVersion {name: 'graph'}) RETURN g.version AS version")
+        return records[0]['version'] if records else 0
+
+    def functions_in_file(self, filename):
+        records = self.read(
+            """
+            MATCH (f:File {name: $filename})-[:CONTAINS]->(func:Function)
+            RETURN func.name as function_name, func.line_number as line
+            """,
+            filename=filename
+        )
+        return [(record['function_name'], record['line']) for record in records]
+
+    def files_with_variable(self, var_name):
+        records = self.read(
+            """
+            MATCH (f:File)-[:CONTAINS]->(v:Variable {name: $var_name})
+            RETURN DISTINCT f.name as file_name, f.path as file_path
+            """,
+            var_name=var_name
+        )
+        return [(record['file_name'], record['file_path']) for record in records]
+
+    def function_callers(self, func_name):
+        records = self.read(
+            """
+            MATCH (caller:Function)-[:CALLS]->(callee:Function {name: $func_name})
+            RETURN caller.name as caller_name, caller.file_path as caller_file
+            """,
+            func_name=func_name
+        )
+        return [(record['caller_name'], record['caller_file']) for record in records]
+
+    def function_calls(self, func_name):
+        records = self.read(
+            """
+            MATCH (caller:Function {name: $func_name})-[:CALLS]->(callee:Function)
+            RETURN callee.name as callee_name, callee.file_path as callee_file
+            """,
+            func_name=func_name
+        )
+        return [(record['callee_name'], record['callee_file']) for record in records]
+
+    def class_methods(self, class_name):
+        records = self.read(
+            """
+            MATCH (c:Class {name: $class_name})-[:HAS_METHOD]->(m:Function)
+            RETURN m.name as method_name, m.line_number as line
+            """,
+            class_name=class_name
+        )
+        return [(record['method_name'], record['line']) for record in records]
+
+    def file_imports(self, filename):
+        records = self.read(
+            """
+            MATCH (f:File {name: $filename})-[:IMPORTS]->(i:Import)
+            RETURN i.module_name as module, i.import_type as import_type
+            """,
+            filename=filename
+        )
+        return [(record['module'], record['import_type']) for record in records]
+
+    def all_files(self):
+        records = self.read(
+            """
+            MATCH (f:File)
+            RETURN f.name as name, f.path as path
+            ORDER BY f.name
+            """
+        )
+        return [(record['name'], record['path']) for record in records]
+
+    def all_functions(self):
+        records = self.read(
+            """
+            MATCH (func:Function)
+            RETURN func.name as name, func.file_path as file
+            ORDER BY func.name
+            """
+        )
+        return [(record['name'], record['file']) for record in records]
+
+    def function_keys(self, func_name):
+        records = self.read(
+            """
+            MATCH (func:Function {name: $func_name})
+            RETURN func.name as name, func.file_path as file_path, func.line_number as line_number
+            """,
+            func_name=func_name
+        )
+        return [(record['name'], record['file_path'], record['line_number']) for record in records]
+
+    def call_neighbours(self, keys, incoming=False):
+        ##one BFS level: frontier sent as rows, each function found through its node key constraint
+        pattern = "(f)<-[:CALLS]-(n:Function)" if incoming else "(f)-[:CALLS]->(n:Function)"
+        query = f"""
+            UNWIND $rows AS row
+            MATCH (f:Function {{name: row.name, file_path: row.file_path, line_number: row.line_number}})
+            MATCH {pattern}
+            RETURN row.name as name, row.file_path as file_path, row.line_number as line_number,
+                   n.name as n_name, n.file_path as n_file_path, n.line_number as n_line_number
+            """
+        found = {}
+        for start in range(0, len(keys), self.batch_size):
+            rows = [
+                {'name': name, 'file_path': file_path, 'line_number': line_number}
+                for name, file_path, line_number in keys[start:start + self.batch_size]
+            ]
+            for record in self.read(query, rows=rows):
+                found.setdefault((record['name'], record['file_path'], record['line_number']), []).append(
+                    (record['n_name'], record['n_file_path'], record['n_line_number'])
                 )
+        return found
+
+    def call_edges(self):
+        #whole CALLS graph in one read -> cycles need every edge anyway
+        records = self.read(
+            """
+            MATCH (caller:Function)-[:CALLS]->(callee:Function)
+            RETURN caller.name as caller, caller.file_path as caller_file, caller.line_number as caller_line,
+                   callee.name as callee, callee.file_path as callee_file, callee.line_number as callee_line
+            """
+        )
+        return [
+            (
+                (record['caller'], record['caller_file'], record['caller_line']),
+                (record['callee'], record['callee_file'], record['callee_line'])
+            )
+            for record in records
+        ]
 
-    def link_methods_to_classes(self, functions):
-        #link method to parent class
+    def relationship_edges(self, rel_type):
+        ##streamed, records never held all at once -> snapshot of millions of edges
         with self.driver.session() as session:
-            for func in functions:
-                ##only if func has parent class 
-                if func.get('parent_class'):
-                    session.run(
-                        """
-                        MATCH (c:Class {name: $class_name, file_path: $file_path})
-                        MATCH (m:Function {name: $method_name, file_path: $file_path})
-                        MERGE (c)-[:HAS_METHOD]->(m)
-                        """,
-                        class_name=func['parent_class'],
-                        method_name=func['name'],
-                        file_path=func['file_path']
-                    )
-                
-    def build_graph(self, parsed_data):
-        #create nodes + relationships
-        self.create_file_nodes(parsed_data['files'])
-        self.create_function_nodes(parsed_data['functions'])
-        self.create_class_nodes(parsed_data['classes'])
-        self.create_variable_nodes(parsed_data['variables'])
-        self.create_import_nodes(parsed_data['imports'])
-        self.create_call_relationships(parsed_data['calls'])
-        self.link_methods_to_classes(parsed_data['functions'])
-    
\ No newline at end of file
+            result = session.run(
+                f"""
+                MATCH (a)-[:{rel_type}]->(b)
+                RETURN labels(a)[0] as a_label, a.name as a_name, coalesce(a.file_path, a.path) as a_file,
+                       a.line_number as a_line,
+                       labels(b)[0] as b_label, b.name as b_name, coalesce(b.file_path, b.path) as b_file,
+                       b.line_number as b_line
+                """
+            )
+            for record in result:
+                yield (
+                    (record['a_label'], record['a_name'], record['a_file'], record['a_line']),
+                    (record['b_label'], record['b_name'], record['b_file'], record['b_line'])
+                )
+
+    def custom_query(self, cypher_query):
+        return [dict(record) for record in self.read(cypher_query)]
+
+
+def constraint_name(label):
+    #UnresolvedCall -> unresolved_call_key
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', label).lower() + '_key'
+
+#MERGE (var:Label {key: ..., key2: ...})
+MERGE_PATTERN = re.compile(r'MERGE\s*\(\s*\w*\s*:\s*(\w+)\s*\{([^}]*)\}\s*\)')
+
+def merge_keys():
+    ##every node MERGE in the write queries sent by the client -> [(query name, label, keys)]
+    found = []
+    for query_name, query in sorted(vars(graph_store).items()):
+        if not (query_name.isupper() and isinstance(query, str)):
+            continue
+        for label, properties in MERGE_PATTERN.findall(query):
+            keys = tuple(prop.split(':')[0].strip() for prop in properties.split(','))
+            found.append((query_name, label, keys))
+    return found
+
+def unbacked_merges():
+    ##MERGEs whose key is not a NODE_KEYS constraint (checked offline, no database)
+    return [
+        (query_name, label, keys) for query_name, label, keys in merge_keys()
+        if sorted(NODE_KEYS.get(label, ())) != sorted(keys)
+    ]
+
+def delete_chunks(session, query, what, total, chunk_size, prefix):
+    ##run a LIMIT $limit delete query until it deletes nothing, one transaction per chunk
+    #-> number deleted, progress printed per chunk
+    deleted = 0
+    while True:
+        count = session.execute_write(_count_deleted, query, chunk_size, prefix)
+        if not count:
+            return deleted
+        deleted += count
+        progress = f"{deleted}/{total}" if total else f"{deleted}"
+        print(f"Deleted {progress} {what}")
+
+def _count_deleted(tx, query, chunk_size, prefix):
+    return tx.run(query, limit=chunk_size, prefix=prefix).single()['deleted']
+
+def _run_batch(tx, query, rows, params):
+    ##one batch inside a managed write transaction (retried by driver on transient errors)
+    tx.run(query, rows=rows, **params).consume()
+
+def _run_ops(tx, ops, batch_size):
+    #several ops in one transaction, still sent batch_size rows at a time
+    for query, rows in ops:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            began = time.perf_counter()
+            tx.run(query, rows=batch).consume()
+            if metrics.enabled:
+                metrics.record_query(op_name(query), len(batch), time.perf_counter() - began)
@@ -0,0 +1,104 @@
+import hashlib
+import os
+from importlib import metadata
+import msgpack
+from extractor import QUERY_DIR
+
+##content addressed cache of extracted entities -> unchanged files are neither parsed nor walked
+##key = sha256(parser version + file bytes), so the same content under another path is a hit too
+##file bytes may be an mmap (large files), hashed in place
+##value = packed entities (field names + value rows, no file_path) as msgpack
+##one file per entry under <dir>/<2 hex>/ -> the dir can be copied between CI jobs as an artifact,
+##entries are written to a tmp file then swapped in so concurrent jobs never read half an entry
+
+#bump when the packed layout changes
+CACHE_FORMAT = 2
+DEFAULT_MAX_BYTES = 256 << 20
+#pruning goes down to this share of max_bytes -> not every run has to prune again
+PRUNE_TARGET = 0.9
+
+
+class ParseCache:
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, query_dir=QUERY_DIR):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.version = parser_version(query_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, source_code, shallow=False):
+        #shallow extraction (large file policy) of the same content -> its own entry
+        digest = hashlib.sha256(self.version)
+        if shallow:
+            digest.update(b'shallow\n')
+        digest.update(source_code)
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.msgpack')
+
+    def get(self, key):
+        ##-> packed entities or None
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                packed = msgpack.unpackb(f.read(), raw=False)
+            #touched on every hit -> pruning drops the least recently used entries
+            os.utime(path)
+        except (OSError, ValueError):
+            #missing, truncated or foreign file -> a miss, put() replaces it
+            return None
+        return packed
+
+    def put(self, key, packed):
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(msgpack.packb(packed, use_bin_type=True))
+        os.replace(tmp_path, path)
+
+    def prune(self):
+        ##over max_bytes -> delete least recently used entries -> (entries removed, bytes left)
+        entries = []
+        total = 0
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    #pruned by another job
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return 0, total
+        removed = 0
+        target = self.max_bytes * PRUNE_TARGET
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed, total
+
+
+def parser_version(query_dir=QUERY_DIR):
+    ##anything that changes what gets extracted -> new keys, old entries age out through pruning
+    digest = hashlib.sha256(f"format {CACHE_FORMAT}\n".encode())
+    for package in ('tree_sitter', 'tree_sitter_languages'):
+        try:
+            digest.update(f"{package} {metadata.version(package)}\n".encode())
+        except metadata.PackageNotFoundError:
+            pass
+    for name in sorted(os.listdir(query_dir)):
+        if name.endswith('.scm'):
+            digest.update(name.encode() + b'\n')
+            with open(os.path.join(query_dir, name), 'rb') as f:
+                digest.update(f.read())
+    return digest.digest()
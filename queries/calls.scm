@@ -0,0 +1,16 @@
+; only calls inside a function are kept -> caller / caller_class / caller_line from the enclosing def
+; receiver: None for f(), object text for x.f() / a.b.f(), '' for other objects
+
+((call
+  function: (identifier) @call.callee) @call
+ (#set! context "caller"))
+
+((call
+  function: (attribute
+    attribute: (identifier) @call.callee)) @call
+ (#set! context "caller")
+ (#set! receiver ""))
+
+(call
+  function: (attribute
+    object: [(identifier) (attribute)] @call.receiver)) @call
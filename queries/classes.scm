@@ -0,0 +1,5 @@
+; class Name: ... -> opens a class scope, defs inside are its methods
+((class_definition
+  name: (identifier) @class.name) @class
+ (#set! scope "class")
+ (#set! context "class"))
@@ -0,0 +1,10 @@
+; def name(params): ... -> opens a function scope, calls inside belong to it
+; parent_class = class the def sits in (also for functions nested in methods)
+((function_definition
+  name: (identifier) @function.name) @function
+ (#set! scope "function")
+ (#set! context "class"))
+
+; plain identifier params only (no defaults / annotations / *args)
+(function_definition
+  parameters: (parameters (identifier) @function.parameters.item)) @function
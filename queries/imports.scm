@@ -0,0 +1,9 @@
+; import a, b.c -> one record per dotted name (aliased imports skipped)
+((import_statement
+  name: (dotted_name) @import @import.module_name)
+ (#set! import_type "import"))
+
+; from module import x -> module, relative ones keep their dots
+((import_from_statement
+  module_name: (_) @import @import.module_name)
+ (#set! import_type "from_import"))
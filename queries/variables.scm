@@ -0,0 +1,5 @@
+; top level `name = ...` only
+(module
+  (expression_statement
+    (assignment
+      left: (identifier) @variable.name) @variable))
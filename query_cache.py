@@ -0,0 +1,66 @@
+import time
+from collections import OrderedDict
+
+##LRU cache of query results, bounded in size and age
+##whole cache dropped when the graph version moves (ingestion bumps it)
+class QueryCache:
+    def __init__(self, max_size=256, ttl=60.0):
+        #max_size 0 -> caching off, ttl None -> entries only leave by LRU / version
+        self.max_size = max_size
+        self.ttl = ttl
+        #(query name, params) -> (time stored, result), oldest use first
+        self.entries = OrderedDict()
+        #graph version the entries were read at
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    def get(self, key, version):
+        ##-> (True, result) or (False, None)
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.version = version
+        entry = self.entries.get(key)
+        if entry is not None:
+            stored, result = entry
+            if self.ttl is None or time.monotonic() - stored < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, result
+            del self.entries[key]
+            self.expired += 1
+        self.misses += 1
+        return False, None
+
+    def put(self, key, result):
+        if self.max_size <= 0:
+            return
+        self.entries[key] = (time.monotonic(), result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.version = None
+
+    def stats(self):
+        ##numbers for tuning max_size / ttl
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'evictions': self.evictions,
+            'expired': self.expired,
+            'invalidations': self.invalidations,
+            'version': self.version
+        }
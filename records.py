@@ -0,0 +1,200 @@
+import sys
+from operator import attrgetter
+
+##compact entity records -> one slotted object per function / class / call / import / variable
+##instead of a dict: no per record hash table, names + paths interned so repeats share one string
+##reads like the dict it replaces (record['name'], record.get('parent_class'), dict(record))
+##-> row builders, CallResolver, CsvExporter and the stores take either
+
+#(kind, fields) -> record class, made once per distinct field layout
+_record_types = {}
+
+def record_type(kind, fields, read_only=False):
+    #read_only -> rows handed out by RecordTable (see ReadOnlyRecord)
+    fields = tuple(fields)
+    key = (kind, fields, read_only)
+    cls = _record_types.get(key)
+    if cls is None:
+        name = ''.join(part.title() for part in kind.split('_')) + ('View' if read_only else 'Record')
+        cls = type(name, (ReadOnlyRecord if read_only else Record,), {'__slots__': fields, '_kind': kind})
+        cls.__init__ = make_init(cls, fields, read_only)
+        _record_types[key] = cls
+    return cls
+
+def make_init(cls, fields, read_only=False):
+    ##__init__(self, a, b, ..) assigning each slot directly -> records are made per entity, a zip + setattr loop doubles parse time
+    #read only classes refuse setattr -> slots filled through their descriptors instead
+    args = ''.join(f', _{i}' for i in range(len(fields)))
+    namespace = {}
+    if read_only:
+        namespace.update((f'_set_{i}', getattr(cls, field).__set__) for i, field in enumerate(fields))
+        body = ''.join(f'\n    _set_{i}(self, _{i})' for i in range(len(fields)))
+    else:
+        body = ''.join(f'\n    self.{field} = _{i}' for i, field in enumerate(fields))
+    exec(f"def __init__(self{args}):{body or chr(10) + '    pass'}", namespace)
+    return namespace['__init__']
+
+def make_record(kind, fields, values):
+    #pickle / copy helper, record classes are made at runtime
+    return record_type(kind, fields)(*values)
+
+#line numbers past the small int cache -> one int object per distinct value
+_ints = {}
+
+def intern(value):
+    ##strings interned, ints shared, lists -> tuples of interned strings
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, int):
+        return _ints.setdefault(value, value)
+    if isinstance(value, list):
+        return tuple(intern(item) for item in value)
+    return value
+
+
+class Record:
+    __slots__ = ()
+
+    ##dict compatible view
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def keys(self):
+        return self.__slots__
+
+    def values(self):
+        return [getattr(self, field) for field in self.__slots__]
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.__slots__]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    #equal to a dict -> cannot be hashed like one either
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()})"
+
+    def __reduce__(self):
+        return make_record, (self._kind, self.__slots__, tuple(self.values()))
+
+
+##row of a RecordTable -> made on the fly from the table's columns, not stored anywhere
+##writing to it would be lost silently -> raises instead, dict(record) / record.to_dict() gives a copy to change
+##pickles / copies back as a plain (writable) Record
+class ReadOnlyRecord(Record):
+    __slots__ = ()
+
+    def __setattr__(self, key, value):
+        raise TypeError(f"{type(self).__name__} is a read only view of a RecordTable row, change a copy (record.to_dict()) instead")
+
+    def __delattr__(self, key):
+        raise TypeError(f"{type(self).__name__} is a read only view of a RecordTable row")
+
+
+##all records of one kind for a whole codebase (CodeParser.parse_codebase)
+##stored column by column -> one list slot per field per record, no object per record
+##read only dict compatible view: iterating / indexing hands out ReadOnlyRecord rows made on the fly
+##-> record['name'], record.get(..), dict(record) work as on the old list of dicts, assigning raises TypeError
+##table + list / list + table -> plain list of rows, to_dicts() -> list of plain dicts (json.dump, changing rows)
+class RecordTable:
+    def __init__(self, kind, records=()):
+        self.kind = kind
+        self.fields = []
+        #one list per field, same order as fields
+        self.columns = []
+        self.length = 0
+        self.extend(records)
+
+    def add_fields(self, fields):
+        for field in fields:
+            if field not in self.fields:
+                #field first seen now -> earlier records did not have it
+                self.fields.append(field)
+                self.columns.append([None] * self.length)
+
+    def append(self, record):
+        self.add_fields(record.keys())
+        get = record.get
+        for field, column in zip(self.fields, self.columns):
+            column.append(get(field))
+        self.length += 1
+
+    def extend(self, records):
+        ##one file's records share one record class -> filled column by column
+        records = list(records)
+        if not records:
+            return
+        cls = type(records[0])
+        if not issubclass(cls, Record) or any(type(record) is not cls for record in records):
+            for record in records:
+                self.append(record)
+            return
+        self.add_fields(cls.__slots__)
+        for field, column in zip(self.fields, self.columns):
+            if field in cls.__slots__:
+                column.extend(map(attrgetter(field), records))
+            else:
+                column.extend([None] * len(records))
+        self.length += len(records)
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        make = record_type(self.kind, self.fields, read_only=True)
+        for values in zip(*self.columns):
+            yield make(*values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        return record_type(self.kind, self.fields, read_only=True)(*(column[index] for column in self.columns))
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def to_dicts(self):
+        fields = self.fields
+        return [dict(zip(fields, values)) for values in zip(*self.columns)]
+
+    def column(self, field):
+        #values of one field, no records made
+        if field not in self.fields:
+            return [None] * self.length
+        return self.columns[self.fields.index(field)]
+
+    def __repr__(self):
+        return f"RecordTable({self.kind!r}, {self.length} records)"
@@ -0,0 +1,75 @@
+import os
+import random
+
+##generate a fake python codebase of a chosen size -> input for benchmark.py
+##deterministic for a given seed so runs are comparable
+
+BUILTINS = ['print', 'len', 'sorted', 'isinstance', 'range']
+
+def generate_repo(output_dir, files=100, classes_per_file=3, methods_per_class=4, functions_per_file=4,
+                  calls_per_function=4, nesting_depth=2, packages=10, seed=0):
+    ##write files under output_dir/pkg<N>/mod<N>.py -> counts of what was generated
+    rng = random.Random(seed)
+    counts = {'files': 0, 'functions': 0, 'classes': 0, 'calls': 0, 'imports': 0}
+
+    for p in range(packages):
+        package_dir = os.path.join(output_dir, f"pkg{p}")
+        os.makedirs(package_dir, exist_ok=True)
+        open(os.path.join(package_dir, '__init__.py'), 'w').close()
+
+    for i in range(files):
+        lines = []
+        #import a couple of earlier modules -> cross file calls for the resolver
+        imported = []
+        for j in rng.sample(range(i), min(2, i)):
+            lines.append(f"from {module_name(j, packages)} import func_{j}_0")
+            lines.append(f"import {module_name(j, packages)}")
+            imported.append(j)
+            counts['imports'] += 2
+        lines.append("")
+        lines.append(f"LIMIT_{i} = {i}")
+        lines.append("")
+
+        local_functions = [f"func_{i}_{k}" for k in range(functions_per_file)]
+        for name in local_functions:
+            callees = [rng.choice(local_functions + BUILTINS) for _ in range(calls_per_function)]
+            callees += [f"func_{j}_0" for j in imported[:1]]
+            lines += function_source(name, ['a', 'b'], callees, nesting_depth, indent=0)
+            counts['functions'] += 1
+            counts['calls'] += len(callees)
+
+        for c in range(classes_per_file):
+            lines.append(f"class Class_{i}_{c}:")
+            methods = [f"method_{m}" for m in range(methods_per_class)]
+            for name in methods:
+                callees = [f"self.{rng.choice(methods)}" for _ in range(calls_per_function // 2)]
+                callees += [rng.choice(local_functions) for _ in range(calls_per_function - calls_per_function // 2)]
+                if imported:
+                    callees.append(f"{module_name(imported[0], packages)}.func_{imported[0]}_0")
+                lines += function_source(name, ['self', 'x'], callees, nesting_depth, indent=1)
+                counts['functions'] += 1
+                counts['calls'] += len(callees)
+            counts['classes'] += 1
+
+        path = os.path.join(output_dir, *module_name(i, packages).split('.')) + '.py'
+        with open(path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        counts['files'] += 1
+    return counts
+
+def module_name(i, packages):
+    return f"pkg{i % packages}.mod{i}"
+
+def function_source(name, params, callees, nesting_depth, indent):
+    ##def with calls buried nesting_depth blocks deep
+    pad = "    " * indent
+    lines = [f"{pad}def {name}({', '.join(params)}):"]
+    for level in range(nesting_depth):
+        pad_inner = "    " * (indent + 1 + level)
+        lines.append(f"{pad_inner}{'if' if level % 2 == 0 else 'for _ in'} {'a' if level % 2 == 0 else 'range(2)'}:")
+    body_pad = "    " * (indent + 1 + nesting_depth)
+    for callee in callees:
+        lines.append(f"{body_pad}{callee}({params[-1]})")
+    lines.append(f"{body_pad}return None")
+    lines.append("")
+    return lines
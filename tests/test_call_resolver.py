@@ -0,0 +1,40 @@
+import contextlib
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_parser import CodeParser
+from memory_store import MemoryStore
+
+##same name defined twice in one file -> calls belong to the def they sit in, callees bind to the last def
+
+SOURCE = (
+    "class A:\n"
+    "    @property\n"
+    "    def x(self):\n"
+    "        return 1\n"
+    "    @x.setter\n"
+    "    def x(self, v):\n"
+    "        self.validate()\n"
+    "    def validate(self):\n"
+    "        pass\n"
+    "\n"
+    "def f():\n"
+    "    pass\n"
+    "def f():\n"
+    "    helper()\n"
+    "def helper():\n"
+    "    f()\n"
+)
+
+
+def test_calls_follow_redefined_functions(tmp_path):
+    with open(tmp_path / 'm.py', 'w') as f:
+        f.write(SOURCE)
+    with contextlib.redirect_stdout(io.StringIO()):
+        store = MemoryStore()
+        store.build_graph(CodeParser().parse_codebase(str(tmp_path)))
+    calls = {(src[1], src[3], dst[1], dst[3]) for src, dst in store.relationship_edges('CALLS')}
+    assert calls == {('x', 6, 'validate', 8), ('f', 13, 'helper', 15), ('helper', 15, 'f', 13)}
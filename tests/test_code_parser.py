@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_parser import CodeParser, is_generated
+
+##generated file detection (large file policy) + parse_file source handling
+
+
+def test_generated_header_detected():
+    assert is_generated(b"# -*- coding: utf-8 -*-\n# Generated by the protocol buffer compiler.  DO NOT EDIT!\nimport x\n")
+    assert is_generated(b"#!/usr/bin/env python\n\n# @generated\n\nimport x\n")
+    assert is_generated(b"# This file was automatically generated, do not edit\nX = 1\n")
+
+
+def test_marker_outside_comment_header_ignored():
+    #docstring / code / comments after the first statement are hand written text
+    assert not is_generated(b'"""Return an auto-generated id for the row."""\n')
+    assert not is_generated(b'def new_id():\n    # auto-generated ids, do not edit by hand\n    return 1\n')
+    assert not is_generated(b'import os\n# Generated by hand\n')
+    assert not is_generated(b'')
+
+
+def test_parse_file_returns_plain_bytes(tmp_path, monkeypatch):
+    #large files too -> no mmap left open for the caller to forget
+    monkeypatch.setattr('code_parser.MMAP_MIN_BYTES', 0)
+    path = tmp_path / 'm.py'
+    path.write_text("def f():\n    pass\n")
+    tree, source_code = CodeParser().parse_file(str(path))
+    assert type(source_code) is bytes
+    assert tree.root_node.type == 'module'
+
+
+def test_parse_codebase_rows_are_read_only(tmp_path):
+    #rows are made on the fly from the table -> a write would be lost, so it raises
+    (tmp_path / 'm.py').write_text("def f():\n    g()\n")
+    all_data = CodeParser().parse_codebase(str(tmp_path))
+    function = all_data['functions'][0]
+    with pytest.raises(TypeError):
+        function['name'] = 'h'
+    functions = all_data['functions'].to_dicts()
+    functions[0]['name'] = 'h'
+    assert all_data['functions'][0]['name'] == 'f'
+    assert json.loads(json.dumps(functions))[0]['name'] == 'h'
+    assert len(all_data['functions'] + all_data['calls']) == 2
@@ -0,0 +1,122 @@
+import csv
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_parser import CodeParser
+from csv_export import CsvExporter, NODE_FILES, RELATIONSHIP_FILES
+from memory_store import MemoryStore
+
+##csv export vs MemoryStore for the same corpus -> same number of nodes per label + edges per type
+
+SAMPLE_CODE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sample_code')
+
+#param shared by 2 functions + top level variable of the same name, class defined twice,
+#imports + unresolved calls shared between files, same call made twice
+CORPUS = {
+    'pkg/__init__.py': "",
+    'pkg/a.py': (
+        "import os\n"
+        "from pkg.b import helper\n"
+        "path = os.getcwd()\n"
+        "def first(path, name):\n"
+        "    helper(path)\n"
+        "    helper(path)\n"
+        "    print(name)\n"
+        "def second(path):\n"
+        "    return os.path.join(path, 'x')\n"
+        "class Node:\n"
+        "    def run(self, name):\n"
+        "        self.stop()\n"
+        "        print(name)\n"
+        "    def stop(self):\n"
+        "        pass\n"
+        "class Node:\n"
+        "    def walk(self):\n"
+        "        return first(1, 2)\n"
+    ),
+    'pkg/b.py': (
+        "import os\n"
+        "def helper(value):\n"
+        "    print(value)\n"
+        "    return os.getcwd()\n"
+        "value = 3\n"
+    ),
+}
+
+
+def write_corpus(root):
+    for rel, source in CORPUS.items():
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(source)
+
+
+def csv_rows(output_dir, name):
+    with open(os.path.join(output_dir, name + '.csv'), newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))[1:]
+
+
+def build_both(codebase, output_dir):
+    store = MemoryStore()
+    store.write_stream(CodeParser().iter_parse_codebase(codebase))
+    exporter = CsvExporter(output_dir)
+    for result in CodeParser().iter_parse_codebase(codebase):
+        exporter.add(result)
+    exporter.finish()
+    return store
+
+
+def store_counts(store):
+    nodes = Counter(label for label in store.labels if label is not None)
+    edges = Counter({
+        rel_type: sum(len(dsts) for dsts in by_src.values()) for rel_type, by_src in store.out_edges.items()
+    })
+    return nodes, edges
+
+
+def csv_counts(output_dir):
+    nodes = Counter()
+    for name in NODE_FILES:
+        for row in csv_rows(output_dir, name):
+            nodes[row[-1]] += 1
+    edges = Counter()
+    for name, rel_type in RELATIONSHIP_FILES.items():
+        rows = csv_rows(output_dir, name)
+        #every edge once
+        assert len(rows) == len(set(map(tuple, rows))), name
+        edges[rel_type] += len(rows)
+    return nodes, edges
+
+
+def check_same_counts(codebase, output_dir):
+    store = build_both(codebase, output_dir)
+    store_nodes, store_edges = store_counts(store)
+    nodes, edges = csv_counts(output_dir)
+    #GraphVersion is a store bookkeeping node, not part of the import
+    store_nodes.pop('GraphVersion', None)
+    assert nodes == store_nodes
+    assert +edges == +store_edges
+
+
+def test_row_counts_match_memory_store(tmp_path):
+    write_corpus(tmp_path / 'src')
+    check_same_counts(str(tmp_path / 'src'), str(tmp_path / 'csv'))
+
+
+def test_row_counts_match_memory_store_sample_code(tmp_path):
+    check_same_counts(SAMPLE_CODE, str(tmp_path / 'csv'))
+
+
+def test_top_level_variable_wins_over_param(tmp_path):
+    write_corpus(tmp_path / 'src')
+    build_both(str(tmp_path / 'src'), str(tmp_path / 'csv'))
+    variables = {row[0]: row for row in csv_rows(str(tmp_path / 'csv'), 'variables')}
+    a_path = str(tmp_path / 'src' / 'pkg' / 'a.py')
+    #path is a param of first / second and a top level variable on line 3
+    assert variables[f"Variable:{a_path}:path"][3] == '3'
+    #name is only ever a param -> no line
+    assert variables[f"Variable:{a_path}:name"][3] == ''
@@ -0,0 +1,144 @@
+import contextlib
+import io
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_parser import CodeParser
+from graph_store import NODE_KEYS
+from memory_store import MemoryStore
+from synthetic_repo import generate_repo
+
+##GraphStore.update_files after edits == full rebuild of the edited codebase
+
+
+def graph_state(store):
+    ##nodes (label + props) and edges by node key -> comparable across stores, ids ignored
+    nodes = set()
+    for node_id, label in enumerate(store.labels):
+        if label is None or label == 'GraphVersion':
+            continue
+        props = store.props[node_id]
+        if label == 'Import':
+            #one Import node per module shared by every file, import_type is whichever file wrote it last
+            #-> depends on write order, not on the code
+            props = {'module_name': props['module_name']}
+        nodes.add((label, tuple(sorted((k, v) for k, v in props.items() if v is not None))))
+
+    def ref(node_id):
+        label = store.labels[node_id]
+        return label, tuple(store.props[node_id][key] for key in NODE_KEYS[label])
+
+    edges = {
+        (ref(src), rel_type, ref(dst))
+        for rel_type, by_src in store.out_edges.items() for src, dsts in by_src.items() for dst in dsts
+    }
+    return nodes, edges
+
+
+def full_build(parser, root):
+    store = MemoryStore()
+    store.build_graph(parser.parse_codebase(root))
+    return store
+
+
+def sync(parser, store, changed, deleted):
+    store.update_files(parser.parse_files(sorted(changed)), sorted(changed), sorted(deleted), parse_files=parser.parse_files)
+
+
+def write(path, source):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(source)
+
+
+def test_importer_resolves_function_added_later(tmp_path):
+    root = str(tmp_path)
+    a, b = os.path.join(root, 'a.py'), os.path.join(root, 'b.py')
+    write(a, "from b import g\n\ndef f():\n    g()\n")
+    write(b, "def h():\n    pass\n")
+    parser = CodeParser()
+    with contextlib.redirect_stdout(io.StringIO()):
+        store = full_build(parser, root)
+        write(b, "def h():\n    pass\n\ndef g():\n    pass\n")
+        sync(parser, store, [b], [])
+        assert graph_state(store) == graph_state(full_build(parser, root))
+        #and back: g removed -> f's call unresolved again
+        write(b, "def h():\n    pass\n")
+        sync(parser, store, [b], [])
+        assert graph_state(store) == graph_state(full_build(parser, root))
+
+
+def test_random_edits_match_full_rebuild(tmp_path):
+    rng = random.Random(7)
+    root = str(tmp_path / 'repo')
+    generate_repo(root, files=20, packages=4, seed=3)
+    parser = CodeParser()
+    with contextlib.redirect_stdout(io.StringIO()):
+        store = full_build(parser, root)
+    files = sorted(path for path, _ in parser.iter_source_files(root) if not path.endswith('__init__.py'))
+    #names called from one file before / after they exist in another
+    ghosts = [f"ghost_{i}" for i in range(4)]
+
+    for step in range(30):
+        changed, deleted = set(), set()
+        for _ in range(rng.randint(1, 3)):
+            path = rng.choice(files)
+            with open(path) as f:
+                source = f.read()
+            op = rng.random()
+            if op < 0.25:
+                #call a ghost through a from import of another module
+                target = rng.choice(files)
+                module = os.path.relpath(target, root)[:-3].replace(os.sep, '.')
+                ghost = rng.choice(ghosts)
+                source = f"from {module} import {ghost}\n" + source + f"\ndef caller_{step}(x):\n    {ghost}(x)\n"
+            elif op < 0.5:
+                #define a ghost -> calls into this module may resolve, or become ambiguous
+                source += f"\ndef {rng.choice(ghosts)}(x):\n    return x\n"
+            elif op < 0.65:
+                #drop a ghost definition again
+                lines = source.split('\n')
+                defs = [i for i, line in enumerate(lines) if line.startswith('def ghost_')]
+                if defs:
+                    i = rng.choice(defs)
+                    del lines[i:i + 2]
+                source = '\n'.join(lines)
+            elif op < 0.75:
+                #code added on top -> every function moves
+                source = "\n\n# moved\n" + source
+            elif op < 0.85 and len(files) > 8:
+                os.remove(path)
+                files.remove(path)
+                deleted.add(path)
+                changed.discard(path)
+                continue
+            else:
+                new = os.path.join(os.path.dirname(path), f"new_{step}.py")
+                write(new, f"def {rng.choice(ghosts)}(x):\n    return x\n")
+                files.append(new)
+                changed.add(new)
+                continue
+            write(path, source)
+            changed.add(path)
+        changed -= deleted
+        with contextlib.redirect_stdout(io.StringIO()):
+            sync(parser, store, changed, deleted)
+            full = full_build(parser, root)
+        assert graph_state(store) == graph_state(full), f"step {step}"
+
+
+def test_relative_importer_resolves_function_added_later(tmp_path):
+    root = str(tmp_path)
+    a, b = os.path.join(root, 'pkg', 'a.py'), os.path.join(root, 'pkg', 'b.py')
+    write(os.path.join(root, 'pkg', '__init__.py'), "")
+    write(a, "from .b import g\nfrom . import b\n\ndef f():\n    g()\n    b.g()\n")
+    write(b, "def h():\n    pass\n")
+    parser = CodeParser()
+    with contextlib.redirect_stdout(io.StringIO()):
+        store = full_build(parser, root)
+        write(b, "def h():\n    pass\n\ndef g():\n    pass\n")
+        sync(parser, store, [b], [])
+        assert graph_state(store) == graph_state(full_build(parser, root))
@@ -0,0 +1,168 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from discovery import FileDiscovery
+
+##watch a codebase for edited / new / deleted source files
+##inotify on linux (through libc, no extra package), polling mtime + size anywhere else
+##both give wait(timeout) -> set of changed file paths (paths built like CodeParser.iter_source_files)
+##files kept / left out by the same FileDiscovery filters as the initial build
+
+#inotify event bits
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+#struct inotify_event header: wd, mask, cookie, len (name follows)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def make_watcher(root, poll_interval=1.0, discovery=None):
+    ##inotify when the kernel has it, else polling
+    discovery = discovery or FileDiscovery()
+    try:
+        return InotifyWatcher(root, discovery)
+    except OSError as e:
+        print(f"inotify not available ({e}), polling every {poll_interval}s")
+        return PollingWatcher(root, poll_interval, discovery)
+
+def debounced(watcher, debounce=0.5):
+    ##bursts of events (save all, git checkout) -> one batch once nothing changed for debounce seconds
+    while True:
+        changed = set()
+        while not changed:
+            changed = watcher.wait(None)
+        while True:
+            more = watcher.wait(debounce)
+            if not more:
+                break
+            changed |= more
+        yield changed
+
+
+class InotifyWatcher:
+    def __init__(self, root, discovery=None):
+        self.root = root
+        self.discovery = discovery or FileDiscovery()
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("libc not found")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init'):
+            raise OSError("libc has no inotify")
+        self.fd = self.libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        #watch descriptor -> directory
+        self.dirs = {}
+        #source files seen so far -> what a moved away / deleted dir took with it
+        self.files = set()
+        self.add_tree(root)
+
+    def add_tree(self, top):
+        ##watch every dir under top -> source files already there (new dir moved in)
+        found = set()
+        for dir_path, files in self.discovery.walk(self.root, top):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), WATCH_MASK)
+            if wd >= 0:
+                self.dirs[wd] = dir_path
+            found.update(files)
+        self.files |= found
+        return found
+
+    def wait(self, timeout):
+        ##block up to timeout seconds (None = until something happens) -> changed source files
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        data = os.read(self.fd, 1 << 16)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                #kernel dropped events -> everything may have changed
+                changed |= self.all_files()
+                continue
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            dir_path = self.dirs.get(wd)
+            if dir_path is None or not name:
+                continue
+            path = os.path.join(dir_path, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and self.discovery.is_included(self.root, path, is_dir=True):
+                    changed |= self.add_tree(path)
+                elif mask & (IN_MOVED_FROM | IN_DELETE):
+                    #whole dir gone from the tree -> its files count as deleted
+                    gone = self.files_under(path)
+                    self.files -= gone
+                    changed |= gone
+            elif path in self.files or self.discovery.is_included(self.root, path):
+                if mask & (IN_MOVED_FROM | IN_DELETE):
+                    self.files.discard(path)
+                else:
+                    self.files.add(path)
+                changed.add(path)
+        return changed
+
+    def all_files(self):
+        return set(self.files) | self.add_tree(self.root)
+
+    def files_under(self, top):
+        #source files seen under top (the dir itself may be gone already)
+        prefix = top.rstrip(os.sep) + os.sep
+        return {path for path in self.files if path.startswith(prefix)}
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    def __init__(self, root, interval=1.0, discovery=None):
+        self.root = root
+        self.interval = interval
+        self.discovery = discovery or FileDiscovery()
+        self.state = self.scan()
+
+    def scan(self):
+        #path -> (mtime, size) of every source file
+        state = {}
+        for _, files in self.discovery.walk(self.root):
+            for path in files:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def wait(self, timeout):
+        ##rescan every interval until something differs or timeout runs out
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            sleep = self.interval if deadline is None else min(self.interval, max(0.0, deadline - time.monotonic()))
+            time.sleep(sleep)
+            state = self.scan()
+            changed = {path for path in state.keys() | self.state.keys() if state.get(path) != self.state.get(path)}
+            self.state = state
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass